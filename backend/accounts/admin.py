@@ -1,13 +1,155 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Customer, Chef, CustomUser, ChatMessage, Notification, Review, Order, Bid, Wallet, Transaction
-# Register your models here.
-admin.site.register((CustomUser, Customer, Chef, Order, Bid, ChatMessage, Notification, Review))
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .models import Customer, Chef, CustomUser, ChatMessage, Notification, Review, Order, Bid, Wallet, Transaction, OutgoingEmail
+
+
+def estimated_row_count(model, using):
+    """The table's size from database statistics, without scanning it, or None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+        elif connection.vendor == 'sqlite':
+            # Both ends of the rowid b-tree; over-counts rows deleted since (e.g. archived)
+            quoted = connection.ops.quote_name(table)
+            cursor.execute(f'SELECT MAX(rowid) - MIN(rowid) + 1 FROM {quoted}')
+        else:
+            return None
+        row = cursor.fetchone()
+    # Postgres reports -1 for a table that was never analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts without COUNT(*) over a whole large table. Unfiltered changelists
+    of tables over ADMIN_EXACT_COUNT_LIMIT rows use the database's row
+    estimate; filtered ones count at most that many rows, so paging stops
+    there until the filters are narrowed.
+    """
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000)
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+            return queryset.count()
+        return queryset.order_by()[:limit].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """For tables that grow with traffic: no COUNT(*) over the whole table on any page."""
+    paginator = EstimatedCountPaginator
+    # Skips the "N results (M total)" count of the whole table on filtered pages
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.register(CustomUser)
+class CustomUserAdmin(LargeTableAdmin):
+    list_display = ('email', 'user_type', 'is_active', 'is_staff', 'date_joined')
+    list_filter = ('user_type', 'is_staff')
+    # Prefix match, so the unique email index can be used
+    search_fields = ('^email',)
+    raw_id_fields = ('profile_image_asset',)
+
+
+@admin.register(Customer)
+class CustomerAdmin(LargeTableAdmin):
+    list_display = ('full_name', 'user', 'phone_number', 'order_count', 'created_at')
+    list_select_related = ('user',)
+    # Also orders the autocomplete results of the FKs pointing here
+    ordering = ('-id',)
+    search_fields = ('^full_name', '^user__email')
+    raw_id_fields = ('user',)
+
+
+@admin.register(Chef)
+class ChefAdmin(LargeTableAdmin):
+    list_display = ('full_name', 'user', 'specialty', 'total_orders', 'delivery_radius_km', 'created_at')
+    list_select_related = ('user',)
+    ordering = ('-id',)
+    search_fields = ('^full_name', '^user__email')
+    raw_id_fields = ('user',)
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ('id', 'title', 'customer', 'accepted_chef', 'status', 'max_budget', 'created_at')
+    list_select_related = ('customer', 'accepted_chef')
+    list_filter = ('status',)
+    date_hierarchy = 'created_at'
+    search_fields = ('=id',)
+    autocomplete_fields = ('customer', 'accepted_chef')
+    raw_id_fields = ('image_asset',)
+
+
+@admin.register(Bid)
+class BidAdmin(LargeTableAdmin):
+    list_display = ('id', 'order', 'chef', 'proposed_price', 'status', 'created_at')
+    list_select_related = ('order', 'chef')
+    list_filter = ('status',)
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+    search_fields = ('=order__id',)
+    raw_id_fields = ('order',)
+    autocomplete_fields = ('chef',)
+
+
+@admin.register(ChatMessage)
+class ChatMessageAdmin(LargeTableAdmin):
+    list_display = ('id', 'order_id', 'sender', 'receiver', 'timestamp', 'is_read')
+    list_select_related = ('sender', 'receiver')
+    date_hierarchy = 'timestamp'
+    ordering = ('-timestamp',)
+    search_fields = ('=order__id',)
+    raw_id_fields = ('order', 'sender', 'receiver')
+
+
+@admin.register(Notification)
+class NotificationAdmin(LargeTableAdmin):
+    list_display = ('user', 'type', 'message', 'is_read', 'created_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(Review)
+class ReviewAdmin(LargeTableAdmin):
+    list_display = ('id', 'order_id', 'chef', 'customer', 'rating', 'created_at')
+    list_select_related = ('chef', 'customer')
+    date_hierarchy = 'created_at'
+    raw_id_fields = ('order',)
+    autocomplete_fields = ('customer', 'chef')
+
 
 @admin.register(Wallet)
-class WalletAdmin(admin.ModelAdmin):
+class WalletAdmin(LargeTableAdmin):
     list_display = ('user', 'balance')
+    list_select_related = ('user',)
+    search_fields = ('^user__email',)
+    raw_id_fields = ('user',)
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdmin):
     list_display = ("wallet", "transaction_type", "amount", "created_at")
-    list_filter = ("transaction_type", )
\ No newline at end of file
+    list_filter = ("transaction_type", )
+    list_select_related = ("wallet__user", )
+    date_hierarchy = "created_at"
+    raw_id_fields = ("wallet", )
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status", )
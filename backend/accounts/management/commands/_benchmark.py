@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from accounts.models import Bid, Chef, CustomUser, Customer, Order, Review, Transaction, Wallet
+
+
+class Rollback(Exception):
+    """Raised at the end of a benchmark's atomic block to discard its fixtures."""
+
+
+def best_of(repeat, func):
+    """Runs func `repeat` times; returns (fastest seconds, last result)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def seed_marketplace(rows):
+    """
+    Orders (a third accepted and reviewed), one bid per order and wallet
+    transactions. Returns (customer, chef wallet).
+    """
+    stamp = time.time_ns()
+    user = CustomUser.objects.create_user(email=f'bench-customer-{stamp}@example.com', user_type='customer')
+    customer = Customer.objects.create(user=user, full_name='Bench Customer')
+    chefs = []
+    for i in range(20):
+        chef_user = CustomUser.objects.create_user(email=f'bench-chef-{stamp}-{i}@example.com', user_type='chef')
+        chefs.append(Chef.objects.create(user=chef_user, full_name=f'Bench Chef {i}'))
+
+    now = timezone.now()
+    orders = Order.objects.bulk_create([
+        Order(
+            customer=customer, title=f'Order {i}', description='Home cooked biryani for four',
+            max_budget=Decimal('1500.00') + i, delivery_address='House 1, Street 2',
+            preferred_delivery_time=now + timedelta(hours=i % 48),
+            accepted_chef=chefs[i % 20] if i % 3 == 0 else None,
+            status='accepted' if i % 3 == 0 else 'open',
+        )
+        for i in range(rows)
+    ])
+    Bid.objects.bulk_create([
+        Bid(order=order, chef=chefs[i % 20], proposed_price=Decimal('1200.50') + i,
+            delivery_estimate=timedelta(hours=2, minutes=i % 60), message='Can deliver on time')
+        for i, order in enumerate(orders)
+    ])
+    Review.objects.bulk_create([
+        Review(order=order, customer=customer, chef=order.accepted_chef, rating=(i % 5) + 0.5, comment='Tasty')
+        for i, order in enumerate(orders) if order.accepted_chef
+    ])
+    wallet = Wallet.objects.get(user=chefs[0].user)
+    Transaction.objects.bulk_create([
+        Transaction(wallet=wallet, transaction_type='credit', amount=Decimal('95.25') + i,
+                    description=f'Earnings from Order #{i}')
+        for i in range(rows)
+    ])
+    return customer, wallet
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_all
+from api.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        'Move old finished orders, chats and read notifications into the archive tables, '
+        'and forget mobile sync tombstones past SYNC_TOMBSTONE_DAYS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        moved = archive_all(options['batch_size'])
+        moved['sync tombstones pruned'] = prune_tombstones()
+        self.stdout.write(', '.join(f'{table}: {count}' for table, count in moved.items()))
@@ -0,0 +1,130 @@
+import asyncio
+import statistics
+import threading
+import time
+
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from rest_framework.authtoken.models import Token
+
+from accounts.models import Chef, CustomUser, Notification, Order
+from ._benchmark import seed_marketplace
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the read endpoints through the ASGI handler in this process (one Daphne '
+        'worker): requests/s, latency and peak threads at each concurrency level. '
+        'Fixtures are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200, help='Orders to seed')
+        parser.add_argument('--requests', type=int, default=400, help='Requests per endpoint and level')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64, 256])
+        parser.add_argument('--db-latency', type=float, default=0.0,
+                            help='Milliseconds added to every query, to stand in for a networked database')
+        parser.add_argument('--warm', action='store_true',
+                            help='Repeat the same URLs so conditional_json serves cached bodies')
+
+    def handle(self, *args, **options):
+        customer, wallet = seed_marketplace(options['rows'])
+        chef = Chef.objects.get(user=wallet.user)
+        Notification.objects.bulk_create([
+            Notification(user=customer.user, type='order', message=f'Bench notification {i}') for i in range(50)
+        ])
+        chef_token = Token.objects.create(user=chef.user).key
+        customer_token = Token.objects.create(user=customer.user).key
+        order_id = Order.objects.filter(customer=customer).values_list('id', flat=True).first()
+        endpoints = [
+            ('open_orders', '/api/orders/open/', chef_token),
+            ('order_detail', f'/api/orders/{order_id}/', chef_token),
+            ('chef_profile', f'/api/chefs/{chef.id}/', chef_token),
+            ('top_chefs', '/api/chefs/top/', chef_token),
+            ('notifications', '/api/notifications/', customer_token),
+        ]
+        self.delay = options['db_latency'] / 1000
+        if self.delay:
+            # Request threads open their own connections
+            connection_created.connect(self.install_latency)
+        try:
+            asyncio.run(self.run(endpoints, options))
+        finally:
+            connection_created.disconnect(self.install_latency)
+            chef_users = Chef.objects.filter(bids__order__customer=customer).values('user')
+            CustomUser.objects.filter(pk__in=chef_users).delete()
+            customer.user.delete()
+
+    def add_latency(self, execute, sql, params, many, context):
+        time.sleep(self.delay)
+        return execute(sql, params, many, context)
+
+    def install_latency(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self.add_latency)
+
+    async def run(self, endpoints, options):
+        application = get_asgi_application()
+        self.stdout.write(
+            f"{options['requests']} requests per cell, {options['db_latency']:g} ms added per query, "
+            f"{'warm' if options['warm'] else 'cold'} cache"
+        )
+        self.stdout.write(f"{'endpoint':<16}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'threads':>9}")
+        for name, path, token in endpoints:
+            for concurrency in options['concurrency']:
+                cache.clear()
+                rate, latencies, threads = await self.load(
+                    application, path, token, concurrency, options['requests'], options['warm'])
+                cuts = statistics.quantiles(latencies, n=100)
+                self.stdout.write(
+                    f'{name:<16}{concurrency:>6}{rate:>10,.0f}{cuts[49] * 1000:>10.1f}'
+                    f'{cuts[98] * 1000:>10.1f}{threads:>9}'
+                )
+
+    async def load(self, application, path, token, concurrency, total, warm):
+        latencies = []
+        peak = threading.active_count()
+        counter = iter(range(total))
+
+        async def worker():
+            nonlocal peak
+            for i in counter:
+                query = b'' if warm else f'bench={i}'.encode()
+                start = time.perf_counter()
+                status = await self.request(application, path, query, token)
+                latencies.append(time.perf_counter() - start)
+                peak = max(peak, threading.active_count())
+                if status != 200:
+                    raise CommandError(f'{path} answered {status}')
+
+        baseline = threading.active_count()
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        return total / elapsed, latencies, peak - baseline
+
+    async def request(self, application, path, query, token):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query,
+            'root_path': '', 'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Token {token}'.encode())],
+        }
+        sent = False
+        status = None
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await application(scope, receive, send)
+        return status
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import Bid, Order, Transaction
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import BidSerializer, OrderSerializer
+from ._benchmark import Rollback, best_of, seed_marketplace
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's JSONRenderer with api.renderers.FastJSONRenderer on real order/bid payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5, help='Best of N runs is reported')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['rows'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, rows, repeat):
+        customer, wallet = seed_marketplace(rows)
+        orders = Order.objects.filter(customer=customer)
+        bids = Bid.objects.filter(order__customer=customer)
+        payloads = [
+            ('orders (serialized)', OrderSerializer(orders, many=True).data),
+            ('bids (serialized)', BidSerializer(bids, many=True).data),
+            # Raw model values: Decimal, datetime and timedelta go through the encoder fallback
+            ('bids (raw values)', list(bids.values())),
+            ('transactions (raw values)', list(Transaction.objects.filter(wallet=wallet).values())),
+        ]
+        stdlib, fast = JSONRenderer(), FastJSONRenderer()
+        self.stdout.write(f"{rows} rows, fast backend: {'orjson ' + orjson.__version__ if orjson else 'stdlib fallback'}")
+        self.stdout.write(f"{'payload':<28}{'size':>10}{'DRF ms':>10}{'fast ms':>10}{'speedup':>10}")
+        for name, data in payloads:
+            stdlib_time, expected = best_of(repeat, lambda: stdlib.render(data))
+            fast_time, body = best_of(repeat, lambda: fast.render(data))
+            if body != expected:
+                raise CommandError(f'FastJSONRenderer output differs for {name}')
+            self.stdout.write(
+                f'{name:<28}{len(body) // 1024:>8}KB{stdlib_time * 1000:>10.1f}'
+                f'{fast_time * 1000:>10.1f}{stdlib_time / fast_time:>9.1f}x'
+            )
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import Bid, Order
+from api.fast_serializers import FastBidSerializer, FastOrderSerializer, FastTransactionSerializer
+from api.serializers import BidSerializer, OrderSerializer, TransactionSerializer
+from ._benchmark import Rollback, best_of, seed_marketplace
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of the DRF list serializers against api.fast_serializers (fixtures are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--repeat', type=int, default=3, help='Best of N runs is reported')
+
+    def handle(self, *args, **options):
+        for rows in options['rows']:
+            try:
+                with transaction.atomic():
+                    self.run(rows, options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def run(self, rows, repeat):
+        customer, wallet = seed_marketplace(rows)
+        cases = [
+            ('orders', OrderSerializer, FastOrderSerializer,
+             lambda: Order.objects.filter(customer=customer).select_related('image_asset')),
+            ('bids', BidSerializer, FastBidSerializer,
+             lambda: Bid.objects.filter(order__customer=customer)),
+            ('transactions', TransactionSerializer, FastTransactionSerializer,
+             lambda: wallet.transactions.all().order_by('-created_at')),
+        ]
+        renderer = JSONRenderer()
+        self.stdout.write(f'\n{rows} rows')
+        self.stdout.write(f"{'serializer':<14}{'DRF rows/s':>14}{'fast rows/s':>14}{'speedup':>10}")
+        for name, drf_class, fast_class, queryset in cases:
+            drf_time, drf_body = best_of(repeat, lambda: renderer.render(drf_class(queryset(), many=True).data))
+            fast_time, fast_body = best_of(repeat, lambda: renderer.render(fast_class().serialize(queryset())))
+            if drf_body != fast_body:
+                raise CommandError(f'{fast_class.__name__} output differs from {drf_class.__name__}')
+            self.stdout.write(
+                f'{name:<14}{rows / drf_time:>14,.0f}{rows / fast_time:>14,.0f}{drf_time / fast_time:>9.1f}x'
+            )
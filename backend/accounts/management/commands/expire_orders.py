@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.expiry import expire_stale_orders
+
+
+class Command(BaseCommand):
+    help = 'Cancel open orders whose preferred delivery time has passed, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep running on a schedule instead of exiting')
+        parser.add_argument('--interval', type=float, default=60.0, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            expired = expire_stale_orders(options['batch_size'])
+            if expired:
+                self.stdout.write(f'Expired {expired} orders')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
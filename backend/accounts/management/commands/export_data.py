@@ -0,0 +1,33 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exports import DATASETS, FORMATS, export_chunks, parse_bound
+
+
+class Command(BaseCommand):
+    help = 'Stream orders, bids or transactions to CSV or NDJSON with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', dest='fmt', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--since', help='Only rows created on/after this date or datetime')
+        parser.add_argument('--until', help='Only rows created up to this date (inclusive) or datetime')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            since = parse_bound(options['since'])
+            until = parse_bound(options['until'], end=True)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks = export_chunks(options['dataset'], options['fmt'], since, until)
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.onboarding import bulk_onboard, parse_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk create chef/customer accounts with profiles, wallets and tokens from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'json'], default=None, help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('json' if path.lower().endswith('.json') else 'csv')
+        try:
+            with open(path, encoding='utf-8-sig') as f:
+                rows = parse_rows(f, fmt)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        result = bulk_onboard(rows, chunk_size=options['chunk_size'], workers=options['workers'])
+        for error in result['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} account(s), skipped {len(result['errors'])} row(s)"
+        ))
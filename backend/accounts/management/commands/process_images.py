@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import CustomUser, Order
+from api.images import process_image_upload
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail/card/full variants for uploads that have none yet'
+
+    def handle(self, *args, **kwargs):
+        targets = [
+            (Order, 'image', 'image_asset'),
+            (CustomUser, 'profile_image', 'profile_image_asset'),
+        ]
+        for model, field_name, asset_field in targets:
+            pks = (
+                model.objects.exclude(**{f'{field_name}__isnull': True})
+                .exclude(**{field_name: ''})
+                .filter(**{f'{asset_field}__isnull': True})
+                .values_list('pk', flat=True)
+            )
+            count = 0
+            for pk in pks.iterator():
+                process_image_upload(model._meta.label, pk, field_name, asset_field)
+                count += 1
+            self.stdout.write(f'{model.__name__}: processed {count} image(s)')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import pricing
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the accepted-price sketches behind suggested bid prices from the full bid history. '
+        'Needed once after deploying them, and after changing pricing segments or accuracy.'
+    )
+
+    def handle(self, *args, **options):
+        total = pricing.rebuild()
+        self.stdout.write(f'Rebuilt price sketches from {total} accepted bids')
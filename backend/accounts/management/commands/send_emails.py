@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.outbox import send_pending_emails
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails from the outbox in batches over a reused connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling instead of exiting when the outbox is empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls when idle')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            sent, failed = send_pending_emails(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue  # drain the backlog before sleeping
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
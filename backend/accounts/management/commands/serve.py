@@ -0,0 +1,309 @@
+import argparse
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from daphne.server import Server
+from daphne.ws_protocol import WebSocketProtocol
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import get_resolver
+from django.utils.module_loading import import_string
+from rest_framework import serializers
+from twisted.internet import reactor
+
+from accounts import serializers as accounts_serializers
+from api import caching, facets, fast_serializers, schedule
+from api import serializers as api_serializers
+
+# WebSocket close code telling clients to reconnect: the 4000 range mirror of
+# RFC 6455's 1012 "Service Restart", which autobahn won't send from a server
+SERVICE_RESTART = 4012
+
+
+class Worker:
+    def __init__(self, slot, process, ready_fd):
+        self.slot = slot
+        self.process = process
+        self.ready_fd = ready_fd
+        self.started = time.monotonic()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def close_ready_fd(self):
+        if self.ready_fd is not None:
+            os.close(self.ready_fd)
+            self.ready_fd = None
+
+    def wait_ready(self, timeout):
+        """True once the worker has warmed up, False if it exits or times out first."""
+        readable, _, _ = select.select([self.ready_fd], [], [], timeout)
+        ready = bool(readable) and os.read(self.ready_fd, 1) == b'.'
+        self.close_ready_fd()
+        return ready
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve the ASGI application from several Daphne worker processes sharing one listening '
+        'socket. SIGHUP restarts the workers one by one, SIGTERM/SIGINT drains them and exits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bind', default='127.0.0.1:8000', help='IPv4 host:port to listen on')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker processes (default: one per CPU with a shared cache, else 1)')
+        parser.add_argument('--backlog', type=int, default=2048)
+        parser.add_argument('--drain-timeout', type=float, default=30.0,
+                            help='Seconds a stopping worker gets to finish its open requests')
+        parser.add_argument('--ready-timeout', type=float, default=60.0,
+                            help='Seconds a new worker gets to warm up')
+        # Set by the supervisor on the worker processes it starts
+        parser.add_argument('--worker-fd', type=int, default=None, help=argparse.SUPPRESS)
+        parser.add_argument('--ready-fd', type=int, default=None, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if os.name != 'posix':
+            raise CommandError('serve needs a POSIX system; use runserver or daphne instead')
+        if options['worker_fd'] is not None:
+            return self.run_worker(options)
+        # Rate limits, rankings and cache invalidation live in the cache, so
+        # with a per-process one each worker would keep its own copy
+        shared = caching.shared_cache()
+        if options['workers'] is None:
+            options['workers'] = (os.cpu_count() or 1) if shared else 1
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        if options['workers'] > 1 and not shared:
+            raise CommandError(
+                'Several workers need a cache they all share (set REDIS_CACHE_URL); '
+                'with the local memory cache serve --workers 1')
+        return self.supervise(options)
+
+    # Supervisor
+
+    def bind(self, address, backlog):
+        host, _, port = address.rpartition(':')
+        try:
+            family, kind, proto, _, sockaddr = socket.getaddrinfo(
+                host or '0.0.0.0', int(port), socket.AF_INET, socket.SOCK_STREAM, 0, socket.AI_PASSIVE)[0]
+            sock = socket.socket(family, kind, proto)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # Lets a second launcher (e.g. the next release) bind the same port while this one drains
+            if hasattr(socket, 'SO_REUSEPORT'):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(sockaddr)
+            sock.listen(backlog)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot listen on {address}: {exc}')
+        return sock
+
+    def spawn(self, slot):
+        ready_read, ready_write = os.pipe()
+        command = [
+            sys.executable, '-m', 'django', 'serve',
+            '--worker-fd', str(self.sock.fileno()), '--ready-fd', str(ready_write),
+            '--drain-timeout', str(self.options['drain_timeout']),
+            '--verbosity', str(self.options['verbosity']),
+        ]
+        # A fresh interpreter per worker: no event loop or database connection is shared
+        # across the fork, and a SIGHUP restart picks up new code
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, pass_fds=(self.sock.fileno(), ready_write))
+        os.close(ready_write)
+        return Worker(slot, process, ready_read)
+
+    def supervise(self, options):
+        self.options = options
+        self.sock = self.bind(options['bind'], options['backlog'])
+        self.workers = {}
+        self.retiring = {}
+        self.failures = {}
+        self.respawn_at = {}
+        self.stopping = False
+        self.reload_requested = False
+
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGHUP, self.request_reload)
+
+        try:
+            for slot in range(options['workers']):
+                self.workers[slot] = self.spawn(slot)
+            for worker in self.workers.values():
+                if not worker.wait_ready(options['ready_timeout']):
+                    raise CommandError(f'Worker {worker.pid} failed to start')
+            host, port = self.sock.getsockname()
+            self.stdout.write(f'Listening on http://{host}:{port} with {len(self.workers)} workers')
+
+            while not self.stopping:
+                if self.reload_requested:
+                    self.reload_requested = False
+                    self.rolling_restart()
+                self.reap()
+                time.sleep(0.2)
+        finally:
+            self.shutdown()
+
+    def request_stop(self, signum, frame):
+        self.stopping = True
+
+    def request_reload(self, signum, frame):
+        self.reload_requested = True
+
+    def reap(self):
+        now = time.monotonic()
+        for slot, worker in list(self.workers.items()):
+            if worker is None:
+                if now >= self.respawn_at[slot]:
+                    self.workers[slot] = self.spawn(slot)
+                continue
+            code = worker.process.poll()
+            if code is None:
+                continue
+            worker.close_ready_fd()
+            # Back off on workers that die straight away (bad config, database down)
+            failures = self.failures.get(slot, 0) + 1 if now - worker.started < 5 else 0
+            self.failures[slot] = failures
+            delay = min(2 ** failures - 1, 30)
+            self.stderr.write(f'Worker {worker.pid} exited with code {code}, restarting in {delay}s')
+            self.workers[slot] = None
+            self.respawn_at[slot] = now + delay
+
+        for pid, (worker, deadline) in list(self.retiring.items()):
+            if worker.process.poll() is not None:
+                del self.retiring[pid]
+            elif now >= deadline:
+                worker.process.kill()
+
+    def retire(self, worker):
+        worker.close_ready_fd()
+        worker.process.terminate()
+        self.retiring[worker.pid] = (worker, time.monotonic() + self.options['drain_timeout'] + 5)
+
+    def rolling_restart(self):
+        """Replaces the workers one at a time, each only once its successor is serving."""
+        self.stdout.write('Restarting workers')
+        for slot, old in list(self.workers.items()):
+            if self.stopping:
+                return
+            new = self.spawn(slot)
+            if not new.wait_ready(self.options['ready_timeout']):
+                self.stderr.write(f'Replacement worker {new.pid} failed to start; keeping the old workers')
+                new.process.kill()
+                new.process.wait()
+                return
+            self.workers[slot] = new
+            self.failures[slot] = 0
+            if old is not None:
+                self.retire(old)
+
+    def shutdown(self):
+        self.stdout.write('Draining workers')
+        workers, self.workers = self.workers, {}
+        for worker in workers.values():
+            if worker is not None:
+                self.retire(worker)
+        while self.retiring:
+            self.reap()
+            time.sleep(0.1)
+        self.sock.close()
+
+    # Worker
+
+    def run_worker(self, options):
+        # The supervisor handles Ctrl-C and terminal hangups for the whole group
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        application = import_string(settings.ASGI_APPLICATION)
+        self.warm_up()
+        server = WorkerServer(
+            application=application,
+            endpoints=[f"fd:fileno={options['worker_fd']}"],
+            signal_handlers=False,
+            verbosity=options['verbosity'],
+            drain_timeout=options['drain_timeout'],
+            ready_callable=lambda: self.report_ready(options['ready_fd']),
+        )
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.request_drain())
+        server.run()
+
+    def warm_up(self):
+        """Does the first-request work before the worker accepts any traffic."""
+        # Imports every view and compiles every URL pattern
+        get_resolver().reverse_dict
+        # Fills the model _meta caches field construction relies on
+        for module in (accounts_serializers, api_serializers):
+            for value in vars(module).values():
+                if isinstance(value, type) and issubclass(value, serializers.Serializer) \
+                        and value.__module__ == module.__name__:
+                    value().fields
+        for value in vars(fast_serializers).values():
+            if isinstance(value, type) and issubclass(value, fast_serializers.FastSerializer) \
+                    and value.serializer_class is not None:
+                value()
+        # Fails the worker before it is marked ready if a database is unreachable
+        for connection in connections.all():
+            connection.ensure_connection()
+        facets.index.refresh(force=True)
+        schedule.index.refresh(force=True)
+        connections.close_all()
+
+    def report_ready(self, ready_fd):
+        os.write(ready_fd, b'.')
+        os.close(ready_fd)
+
+
+class WorkerServer(Server):
+    """A Daphne server that can stop accepting and wait for its connections to close."""
+
+    def __init__(self, *args, drain_timeout, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.drain_timeout = drain_timeout
+        self.ports = []
+        self.draining = False
+        self.parent = os.getppid()
+
+    def run(self):
+        reactor.callLater(1, self.watch_parent)
+        super().run()
+
+    def listen_success(self, port):
+        self.ports.append(port)
+        super().listen_success(port)
+
+    def request_drain(self):
+        # Runs in a signal handler; the drain itself has to happen on the reactor
+        reactor.callFromThread(self.drain)
+
+    def drain(self):
+        if self.draining:
+            return
+        self.draining = True
+        # Connections still queued on the shared socket go to the other workers
+        for port in self.ports:
+            port.stopListening()
+        # Clients reconnect and land on a worker that is still serving
+        for protocol in list(self.connections):
+            if isinstance(protocol, WebSocketProtocol) and protocol.state == protocol.STATE_OPEN:
+                protocol.serverClose(code=SERVICE_RESTART)
+        self.wait_for_connections(time.monotonic() + self.drain_timeout)
+
+    def wait_for_connections(self, deadline):
+        if not self.connections or time.monotonic() >= deadline:
+            self.stop()
+        else:
+            reactor.callLater(0.1, self.wait_for_connections, deadline)
+
+    def watch_parent(self):
+        # Drain rather than keep serving when the supervisor is gone
+        if os.getppid() != self.parent:
+            self.drain()
+        else:
+            reactor.callLater(1, self.watch_parent)
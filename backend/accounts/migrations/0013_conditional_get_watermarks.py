@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_outgoing_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chef',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['updated_at'], name='accounts_bi_updated_1a39bc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['updated_at'], name='accounts_or_updated_3ff531_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'updated_at'], name='accounts_or_status_79f8d7_idx'),
+        ),
+    ]
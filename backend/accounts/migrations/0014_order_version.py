@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0013_conditional_get_watermarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_order_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chef',
+            name='location_lat',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='chef',
+            name='location_lng',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+    ]
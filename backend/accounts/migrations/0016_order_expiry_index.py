@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_chef_location'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'preferred_delivery_time'], name='accounts_or_status_0e8ff7_idx'),
+        ),
+    ]
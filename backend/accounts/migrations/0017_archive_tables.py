@@ -0,0 +1,100 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_order_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='review',
+            name='order',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='review', to='accounts.order'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('max_budget', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('delivery_address', models.TextField()),
+                ('preferred_delivery_time', models.DateTimeField()),
+                ('image', models.ImageField(blank=True, null=True, upload_to='orders/')),
+                ('status', models.CharField(choices=[('open', 'Open'), ('accepted', 'Accepted'), ('preparing', 'Preparing'), ('delivered', 'Delivered'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('accepted_chef', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to='accounts.chef')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='accounts.customer')),
+                ('image_asset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='accounts.imageasset')),
+            ],
+            options={
+                'verbose_name': 'Archived order',
+                'verbose_name_plural': 'Archived orders',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedBid',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('proposed_price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('delivery_estimate', models.DurationField()),
+                ('message', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('declined', 'Declined'), ('withdrawn', 'Withdrawn')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('chef', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bids', to='accounts.chef')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bids', to='accounts.archivedorder')),
+            ],
+            options={
+                'verbose_name': 'Archived bid',
+                'verbose_name_plural': 'Archived bids',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedChatMessage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('order_id', models.BigIntegerField()),
+                ('message', models.TextField()),
+                ('timestamp', models.DateTimeField()),
+                ('is_read', models.BooleanField(default=False)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived chat message',
+                'verbose_name_plural': 'Archived chat messages',
+                'indexes': [models.Index(fields=['order_id', 'timestamp'], name='accounts_ar_order_i_ae8069_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('message', models.CharField(max_length=255)),
+                ('type', models.CharField(blank=True, max_length=50, null=True)),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived notification',
+                'verbose_name_plural': 'Archived notifications',
+                'indexes': [models.Index(fields=['user', 'created_at'], name='accounts_ar_user_id_f2ace6_idx')],
+            },
+        ),
+    ]
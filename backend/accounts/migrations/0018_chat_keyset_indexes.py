@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_archive_tables'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='archivedchatmessage',
+            name='accounts_ar_order_i_ae8069_idx',
+        ),
+        migrations.AddIndex(
+            model_name='archivedchatmessage',
+            index=models.Index(fields=['order_id', 'timestamp', 'id'], name='accounts_ar_order_i_a2bbb0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['order', 'timestamp', 'id'], name='accounts_ch_order_i_c44043_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:40
+
+import re
+
+from django.db import migrations, models
+
+# DIETARY_TAGS as of this migration, in bit order
+DIETARY_TAG_NAMES = [
+    'vegetarian', 'vegan', 'halal', 'gluten_free', 'dairy_free', 'nut_free', 'low_sugar', 'low_spice',
+]
+
+
+def dietary_bits(text):
+    # "Vegan, gluten-free" -> vegan | gluten_free
+    words = re.sub(r'[^a-z]+', ' ', (text or '').lower())
+    bits = 0
+    for position, name in enumerate(DIETARY_TAG_NAMES):
+        if re.search(rf"\b{name.replace('_', ' ')}\b", words):
+            bits |= 1 << position
+    return bits
+
+
+def tag_from_free_text(apps, schema_editor):
+    """Seeds the new dietary tags from what customers and chefs already wrote."""
+    for model_name, source in (('Customer', 'dietary_preferences'), ('Chef', 'specialty')):
+        model = apps.get_model('accounts', model_name)
+        changed = []
+        for row in model.objects.exclude(**{f'{source}__isnull': True}).exclude(**{source: ''}).only('id', source):
+            row.dietary_tags = dietary_bits(getattr(row, source))
+            if row.dietary_tags:
+                changed.append(row)
+        model.objects.bulk_update(changed, ['dietary_tags'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_chat_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='categories',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='dietary_tags',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chef',
+            name='categories',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chef',
+            name='dietary_tags',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='dietary_tags',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='categories',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='dietary_tags',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(tag_from_free_text, migrations.RunPython.noop),
+    ]
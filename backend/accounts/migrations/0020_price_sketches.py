@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_tag_bitsets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('bins', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Price sketch',
+                'verbose_name_plural': 'Price sketches',
+            },
+        ),
+    ]
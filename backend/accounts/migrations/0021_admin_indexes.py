@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_price_sketches'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['status', 'created_at'], name='accounts_bi_status_8695a3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['created_at'], name='accounts_bi_created_b569b9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['timestamp'], name='accounts_ch_timesta_ea2ba9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='accounts_or_created_8b0cae_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['created_at'], name='accounts_tr_created_b2c597_idx'),
+        ),
+    ]
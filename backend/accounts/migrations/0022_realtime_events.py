@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:13
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RealtimeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group', models.CharField(max_length=64)),
+                ('message', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['group', 'id'], name='accounts_re_group_9f9a7f_idx')],
+            },
+        ),
+    ]
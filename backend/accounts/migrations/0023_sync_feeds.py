@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:20
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    # Existing rows were last changed when created, not when this migration ran
+    apps.get_model('accounts', 'ChatMessage').objects.update(updated_at=F('timestamp'))
+    apps.get_model('accounts', 'Notification').objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_realtime_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('scope', models.CharField(max_length=32)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['chef', 'updated_at', 'id'], name='accounts_bi_chef_id_c11d07_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['order', 'updated_at', 'id'], name='accounts_bi_order_i_561f3c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sender', 'updated_at', 'id'], name='accounts_ch_sender__1bf0ce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['receiver', 'updated_at', 'id'], name='accounts_ch_receive_65ca32_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='accounts_no_user_id_0cd4a8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'updated_at', 'id'], name='accounts_or_custome_1ca577_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['accepted_chef', 'updated_at', 'id'], name='accounts_or_accepte_4e1d50_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['wallet', 'created_at', 'id'], name='accounts_tr_wallet__46dea1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['scope', 'deleted_at', 'id'], name='accounts_sy_scope_de85a8_idx'),
+        ),
+    ]
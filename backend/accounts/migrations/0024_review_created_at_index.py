@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0023_sync_feeds'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at'], name='accounts_re_created_cb7589_idx'),
+        ),
+    ]
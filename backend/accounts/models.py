@@ -1,10 +1,63 @@
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 from django.db.models import Avg, Count
+from django.utils import timezone
 # Create your models here.
 
+
+class TagSet:
+    """
+    A fixed list of tags stored as the bits of one integer column, in the
+    order of `choices`. Only ever append to `choices`: a tag's position is
+    its bit in every stored row.
+    """
+
+    def __init__(self, choices):
+        self.choices = choices
+        self.bits = {name: 1 << position for position, (name, _) in enumerate(choices)}
+
+    def encode(self, names):
+        unknown = [name for name in names if name not in self.bits]
+        if unknown:
+            raise ValueError(f"Unknown tags: {', '.join(unknown)}")
+        bits = 0
+        for name in names:
+            bits |= self.bits[name]
+        return bits
+
+    def decode(self, bits):
+        return [name for name, bit in self.bits.items() if bits & bit]
+
+
+FOOD_CATEGORIES = [
+    ('grain',     'Grain'),
+    ('meat',      'Meat'),
+    ('seafood',   'Seafood'),
+    ('vegetable', 'Vegetable'),
+    ('fruit',     'Fruit'),
+    ('dairy',     'Dairy'),
+    ('legume',    'Legume'),
+    ('nut_seed',  'Nuts & Seeds'),
+    ('egg',       'Egg'),
+    ('oil_fat',   'Oils & Fats')
+]
+DIETARY_TAGS = [
+    ('vegetarian',  'Vegetarian'),
+    ('vegan',       'Vegan'),
+    ('halal',       'Halal'),
+    ('gluten_free', 'Gluten free'),
+    ('dairy_free',  'Dairy free'),
+    ('nut_free',    'Nut free'),
+    ('low_sugar',   'Low sugar'),
+    ('low_spice',   'Low spice'),
+]
+CATEGORY_BITS = TagSet(FOOD_CATEGORIES)
+DIETARY_BITS = TagSet(DIETARY_TAGS)
+
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -24,6 +77,22 @@ class CustomUserManager(BaseUserManager):
         if extra_fields.get('is_superuser') is not True:
             raise ValueError(_('Superuser must have is_superuser=True.'))
         return self.create_user(email, password, **extra_fields)
+
+
+class ImageAsset(models.Model):
+    """
+    Resized, metadata-free variants of an uploaded image.
+    One row per distinct upload content, so identical photos share files.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)  # sha256 of the original bytes
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    variants = models.JSONField(default=dict)  # {"thumbnail": {"webp": path, "jpeg": path}, ...}
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Image {self.content_hash[:12]} ({self.width}x{self.height})"
+
     
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     USER_TYPE_CHOICES = (
@@ -37,6 +106,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     profile_image = models.ImageField(upload_to='profiles/', null=True, blank=True)
+    profile_image_asset = models.ForeignKey(
+        ImageAsset, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='+')
     date_joined = models.DateTimeField(auto_now_add=True)
 
     objects = CustomUserManager()
@@ -57,6 +129,7 @@ class Customer(models.Model):
     address = models.TextField(blank=True, null=True)
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     dietary_preferences = models.TextField(blank=True, null=True)  # e.g., vegetarian, allergies
+    dietary_tags = models.PositiveIntegerField(default=0)  # DIETARY_BITS
     location_lat = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     location_lng = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     order_count = models.PositiveBigIntegerField(default=0)
@@ -74,18 +147,29 @@ class Chef(models.Model):
     full_name = models.CharField(max_length=255)
     bio = models.TextField(blank=True, null=True)
     specialty = models.CharField(max_length=255, blank=True, null=True)  # e.g., Italian, Vegan
+    # What the chef cooks and caters for, for customers filtering chefs
+    categories = models.PositiveIntegerField(default=0)  # CATEGORY_BITS
+    dietary_tags = models.PositiveIntegerField(default=0)  # DIETARY_BITS
     years_of_experience = models.PositiveIntegerField(default=0)
     certification = models.CharField(max_length=255, blank=True, null=True)  # e.g., culinary degrees
     total_orders = models.PositiveIntegerField(default=0)
     delivery_radius_km = models.PositiveIntegerField(default=10)
+    location_lat = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    location_lng = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     @property 
     def orders_count(self):
-        return self.accepted_orders.all().count()
+        # BidSerializer(many=True) preloads this and `rating` for a whole list of bids
+        if hasattr(self, 'preloaded_orders_count'):
+            return self.preloaded_orders_count
+        return self.accepted_orders.all().count() + self.archived_orders.all().count()
 
     @property
     def rating(self):
+        if hasattr(self, 'preloaded_rating'):
+            return self.preloaded_rating
         return round(self.reviews.aggregate(Avg("rating"))["rating__avg"] or 0, 1)
 
 
@@ -106,23 +190,13 @@ class Order(models.Model):
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled'),
     ]
-    FOOD_CATEGORIES = [
-        ('grain',     'Grain'),
-        ('meat',      'Meat'),
-        ('seafood',   'Seafood'),
-        ('vegetable', 'Vegetable'),
-        ('fruit',     'Fruit'),
-        ('dairy',     'Dairy'),
-        ('legume',    'Legume'),
-        ('nut_seed',  'Nuts & Seeds'),
-        ('egg',       'Egg'),
-        ('oil_fat',   'Oils & Fats')
-    ]
+    FOOD_CATEGORIES = FOOD_CATEGORIES
     
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
     title = models.CharField(max_length=200)
     description = models.TextField()
-    # category = models.CharField(choices=FOOD_CATEGORIES, default='n/a')
+    categories = models.PositiveIntegerField(default=0)  # CATEGORY_BITS
+    dietary_tags = models.PositiveIntegerField(default=0)  # DIETARY_BITS
     max_budget = models.DecimalField(max_digits=8, decimal_places=2)
     delivery_address = models.TextField()
     preferred_delivery_time = models.DateTimeField()
@@ -130,7 +204,12 @@ class Order(models.Model):
         Chef, on_delete=models.SET_NULL,
         null=True, blank=True, related_name='accepted_orders')
     image = models.ImageField(upload_to='orders/', blank=True, null=True)
+    image_asset = models.ForeignKey(
+        ImageAsset, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='+')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    # Bumped on every status change; see api.order_state
+    version = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -138,6 +217,18 @@ class Order(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Order'
         verbose_name_plural = 'Orders'
+        indexes = [
+            # Watermarks for conditional GETs (max updated_at overall / per status)
+            models.Index(fields=['updated_at']),
+            models.Index(fields=['status', 'updated_at']),
+            # Finding open orders whose delivery time has passed (api/expiry.py)
+            models.Index(fields=['status', 'preferred_delivery_time']),
+            # Admin changelist ordering and date hierarchy
+            models.Index(fields=['created_at']),
+            # Per-user change feeds for mobile sync (api/sync.py)
+            models.Index(fields=['customer', 'updated_at', 'id']),
+            models.Index(fields=['accepted_chef', 'updated_at', 'id']),
+        ]
         
 
     def __str__(self):
@@ -165,6 +256,14 @@ class Transaction(models.Model):
     def __str__(self):
         return f"{self.transaction_type} - {self.amount} ({self.wallet.user.email})"
 
+    class Meta:
+        indexes = [
+            # Admin date hierarchy
+            models.Index(fields=['created_at']),
+            # Mobile sync change feed
+            models.Index(fields=['wallet', 'created_at', 'id']),
+        ]
+
     
 class Bid(models.Model):
     STATUS_CHOICES = [
@@ -188,6 +287,15 @@ class Bid(models.Model):
 
     class Meta:
         unique_together = ('order', 'chef') # A chef can bid once per order
+        indexes = [
+            models.Index(fields=['updated_at']),
+            # Admin status filter and date hierarchy
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['created_at']),
+            # Mobile sync change feeds: a chef's bids, the bids on a customer's orders
+            models.Index(fields=['chef', 'updated_at', 'id']),
+            models.Index(fields=['order', 'updated_at', 'id']),
+        ]
 
 
 class ChatMessage(models.Model):
@@ -197,11 +305,25 @@ class ChatMessage(models.Model):
     message = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Keyset pagination for chat scrollback (api/chat.py)
+        indexes = [
+            models.Index(fields=['order', 'timestamp', 'id']),
+            # Admin date hierarchy
+            models.Index(fields=['timestamp']),
+            # Mobile sync change feeds, one per side of the conversation
+            models.Index(fields=['sender', 'updated_at', 'id']),
+            models.Index(fields=['receiver', 'updated_at', 'id']),
+        ]
 
 
 class Review(models.Model):
-    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='review')
+    # Reviews stay in the hot table when their order is archived (they feed
+    # chef ratings), keeping the order id, which ArchivedOrder preserves.
+    # Deleting the order any other way deletes its review (api.signals).
+    order = models.OneToOneField(Order, on_delete=models.DO_NOTHING, db_constraint=False, related_name='review')
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     chef = models.ForeignKey(Chef, on_delete=models.CASCADE, related_name='reviews')
     rating = models.FloatField(default=0.0, 
@@ -215,6 +337,10 @@ class Review(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Review'
         verbose_name_plural = 'Reviews'
+        indexes = [
+            # Default ordering, admin changelist and date hierarchy
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return f"Review for {self.chef.full_name} ({self.rating})"
@@ -225,7 +351,181 @@ class Notification(models.Model):
     type = models.CharField(max_length=50, blank=True, null=True)  # e.g. "bid", "chat", "order"
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
+        # Mobile sync change feed
+        indexes = [models.Index(fields=['user', 'updated_at', 'id'])]
+
+
+class OutgoingEmail(models.Model):
+    """
+    Outbox row written by request handlers and delivered later by the
+    `send_emails` worker, so requests never wait on the mail server.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True, null=True)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.UUIDField(null=True, blank=True)  # worker batch currently holding the row
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+        verbose_name = 'Outgoing email'
+        verbose_name_plural = 'Outgoing emails'
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+class PriceSketch(models.Model):
+    """
+    Quantile sketch of accepted bid prices for one market segment (see
+    api/pricing.py), updated as bids are accepted.
+    """
+    key = models.CharField(max_length=100, unique=True)  # e.g. "cat:meat|band:1000-2000"
+    count = models.PositiveIntegerField(default=0)
+    bins = models.JSONField(default=dict)  # bucket index -> count
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Price sketch'
+        verbose_name_plural = 'Price sketches'
+
+    def __str__(self):
+        return f"{self.key} ({self.count} prices)"
+
+
+class RealtimeEvent(models.Model):
+    """
+    A socket event as sent to a channel layer group, kept so a client that
+    reconnects can be replayed what it missed (see api/events.py). The id
+    is the event's sequence number.
+    """
+    group = models.CharField(max_length=64)  # "orders" or "user_<id>"
+    message = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['group', 'id'])]
+
+    def __str__(self):
+        return f"#{self.id} {self.message.get('type')} -> {self.group}"
+
+
+class SyncTombstone(models.Model):
+    """
+    A deleted (or archived) order, bid, chat message or notification, kept
+    for SYNC_TOMBSTONE_DAYS so mobile clients can drop their copy (see
+    api/sync.py). One row per party that had the object in its feed.
+    """
+    entity = models.CharField(max_length=16)  # a key of api.sync.FEEDS
+    object_id = models.BigIntegerField()
+    scope = models.CharField(max_length=32)  # "user:<id>", "customer:<id>" or "chef:<id>"
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['scope', 'deleted_at', 'id'])]
+
+    def __str__(self):
+        return f"{self.entity} #{self.object_id} for {self.scope}"
+
+
+# Cold storage. Rows are moved here by the `archive_data` command once they
+# are old enough (see api/archive.py) and keep their original primary keys,
+# so reads can fall through by id. Timestamps are copied, not auto-set.
+
+class ArchivedOrder(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_orders')
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    categories = models.PositiveIntegerField(default=0)
+    dietary_tags = models.PositiveIntegerField(default=0)
+    max_budget = models.DecimalField(max_digits=8, decimal_places=2)
+    delivery_address = models.TextField()
+    preferred_delivery_time = models.DateTimeField()
+    accepted_chef = models.ForeignKey(
+        Chef, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='archived_orders')
+    image = models.ImageField(upload_to='orders/', blank=True, null=True)
+    image_asset = models.ForeignKey(
+        ImageAsset, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    version = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Archived order'
+        verbose_name_plural = 'Archived orders'
+
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+
+class ArchivedBid(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='bids')
+    chef = models.ForeignKey(Chef, on_delete=models.CASCADE, related_name='archived_bids')
+    proposed_price = models.DecimalField(max_digits=8, decimal_places=2)
+    delivery_estimate = models.DurationField()
+    message = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=Bid.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Archived bid'
+        verbose_name_plural = 'Archived bids'
+
+
+class ArchivedChatMessage(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    # Plain id: the order itself may still be hot
+    order_id = models.BigIntegerField()
+    sender = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    receiver = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    message = models.TextField()
+    timestamp = models.DateTimeField()
+    is_read = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['order_id', 'timestamp', 'id'])]
+        verbose_name = 'Archived chat message'
+        verbose_name_plural = 'Archived chat messages'
+
+
+class ArchivedNotification(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='archived_notifications')
+    message = models.CharField(max_length=255)
+    type = models.CharField(max_length=50, blank=True, null=True)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'created_at'])]
+        verbose_name = 'Archived notification'
+        verbose_name_plural = 'Archived notifications'
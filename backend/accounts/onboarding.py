@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from .models import CustomUser, Customer, Chef, Wallet
+from .serializers import RegistrationSerializer
+
+CUSTOMER_FIELDS = ('address', 'phone_number', 'dietary_preferences', 'dietary_tags', 'location_lat', 'location_lng')
+CHEF_FIELDS = (
+    'bio', 'specialty', 'categories', 'dietary_tags', 'years_of_experience', 'certification',
+    'location_lat', 'location_lng',
+)
+
+
+def parse_rows(source, fmt):
+    """
+    Reads onboarding rows from a CSV/JSON file object or string.
+    JSON may be a list of objects or {"users": [...]}.
+    """
+    text = source if isinstance(source, str) else source.read()
+    if isinstance(text, bytes):
+        text = text.decode('utf-8-sig')
+    if fmt == 'json':
+        data = json.loads(text)
+        return data.get('users', []) if isinstance(data, dict) else data
+    # Blank CSV cells mean "not provided" rather than empty strings
+    return [
+        {k: v for k, v in row.items() if v not in (None, '')}
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    PBKDF2 is CPU bound and holds the GIL, so hashing a roster is spread
+    across processes instead of threads. They are spawned, not forked: a
+    fork would copy the server's event loop threads and open connections.
+    Spawned workers start without Django configured, and unpickle nothing
+    from this app (its models can't load before django.setup()).
+    """
+    if len(passwords) < 2 or workers == 1:
+        return [make_password(p) for p in passwords]
+    spawn = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=spawn, initializer=django.setup) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 32)))
+
+
+def validate_rows(rows):
+    """
+    Runs each row through RegistrationSerializer and rejects emails that already
+    exist or repeat within the file. Returns (valid_rows, errors).
+    """
+    valid, errors, seen = [], [], set()
+    for index, row in enumerate(rows, start=1):
+        serializer = RegistrationSerializer(data=row)
+        if not serializer.is_valid():
+            errors.append({'row': index, 'errors': serializer.errors})
+            continue
+        data = serializer.validated_data
+        data['email'] = CustomUser.objects.normalize_email(data['email'])
+        if data['email'].lower() in seen:
+            errors.append({'row': index, 'errors': {'email': ['Duplicate email in import.']}})
+            continue
+        seen.add(data['email'].lower())
+        valid.append((index, data))
+
+    existing = {
+        email.lower() for email in CustomUser.objects.filter(
+            email__in=[data['email'] for _, data in valid]
+        ).values_list('email', flat=True)
+    }
+    if existing:
+        errors.extend(
+            {'row': index, 'errors': {'email': ['A user with this email already exists.']}}
+            for index, data in valid if data['email'].lower() in existing
+        )
+        valid = [(index, data) for index, data in valid if data['email'].lower() not in existing]
+    return valid, errors
+
+
+def _create_chunk(chunk, hashed):
+    """
+    Inserts users, profiles, wallets and tokens for one chunk: one bulk INSERT
+    per table instead of several writes per account. bulk_create skips
+    post_save, so wallets are created here rather than by the signal.
+    """
+    users = CustomUser.objects.bulk_create([
+        CustomUser(email=data['email'], user_type=data['user_type'], password=password, is_active=True)
+        for data, password in zip(chunk, hashed)
+    ])
+    customers, chefs = [], []
+    for user, data in zip(users, chunk):
+        if data['user_type'] == 'customer':
+            customers.append(Customer(
+                user=user, full_name=data['full_name'],
+                **{f: data[f] for f in CUSTOMER_FIELDS if f in data},
+            ))
+        elif data['user_type'] == 'chef':
+            chefs.append(Chef(
+                user=user, full_name=data['full_name'],
+                **{f: data[f] for f in CHEF_FIELDS if f in data},
+            ))
+    Customer.objects.bulk_create(customers)
+    Chef.objects.bulk_create(chefs)
+    Wallet.objects.bulk_create([Wallet(user=user) for user in users])
+    Token.objects.bulk_create([Token(key=Token.generate_key(), user=user) for user in users])
+    return len(users)
+
+
+def bulk_onboard(rows, chunk_size=500, workers=None):
+    """
+    Creates accounts for every valid row, committing each chunk of
+    `chunk_size` in its own transaction to keep locks and memory bounded.
+    Returns {"created": n, "errors": [{"row": i, "errors": {...}}]}.
+    """
+    valid, errors = validate_rows(rows)
+    hashed = hash_passwords([data['password'] for _, data in valid], workers=workers)
+
+    created = 0
+    for start in range(0, len(valid), chunk_size):
+        chunk = [data for _, data in valid[start:start + chunk_size]]
+        with transaction.atomic():
+            created += _create_chunk(chunk, hashed[start:start + chunk_size])
+    return {'created': created, 'errors': errors}
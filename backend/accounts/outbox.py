@@ -0,0 +1,107 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+# How long a worker may hold a claimed batch before another worker can retry it
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def queue_email(subject, body, recipients, from_email=None):
+    """
+    Stores a message in the outbox. This is a single insert, so callers inside a
+    request pay no SMTP cost; delivery happens in `send_pending_emails`.
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        recipients=list(recipients),
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def claim_batch(batch_size):
+    """
+    Marks up to `batch_size` due messages with a fresh claim id and returns them.
+    Moving next_attempt_at forward acts as a lease, so concurrent workers skip
+    the rows and a crashed worker's batch becomes due again once it expires.
+    """
+    now = timezone.now()
+    claim = uuid.uuid4()
+    due_ids = list(
+        OutgoingEmail.objects.filter(status='pending', next_attempt_at__lte=now)
+        .order_by('next_attempt_at')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not due_ids:
+        return []
+    OutgoingEmail.objects.filter(
+        id__in=due_ids, status='pending', next_attempt_at__lte=now
+    ).update(claimed_by=claim, next_attempt_at=now + CLAIM_LEASE)
+    return list(OutgoingEmail.objects.filter(claimed_by=claim))
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2x base, 4x base, ... capped at one hour."""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def send_pending_emails(batch_size=None):
+    """
+    Delivers one batch of due messages over a single backend connection.
+    Returns (sent, failed) counts for the batch.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    messages = claim_batch(batch_size)
+    if not messages:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for outgoing in messages:
+            outgoing.attempts += 1
+            outgoing.claimed_by = None
+            try:
+                EmailMessage(
+                    outgoing.subject, outgoing.body, outgoing.from_email,
+                    outgoing.recipients, connection=connection,
+                ).send()
+            except Exception as e:
+                logger.warning("Email %s attempt %s failed: %s", outgoing.id, outgoing.attempts, e)
+                outgoing.last_error = str(e)
+                if outgoing.attempts >= max_attempts:
+                    outgoing.status = 'failed'
+                else:
+                    outgoing.next_attempt_at = timezone.now() + retry_delay(outgoing.attempts)
+                failed += 1
+            else:
+                outgoing.status = 'sent'
+                outgoing.sent_at = timezone.now()
+                outgoing.last_error = ''
+                sent += 1
+            outgoing.save(update_fields=[
+                'attempts', 'claimed_by', 'status', 'next_attempt_at', 'last_error', 'sent_at'
+            ])
+    except Exception as e:
+        # Could not even open the connection: release the rest of the batch for a retry
+        logger.warning("Email backend unavailable: %s", e)
+        pending = [m.id for m in messages if m.status == 'pending' and m.claimed_by is not None]
+        OutgoingEmail.objects.filter(id__in=pending).update(
+            claimed_by=None, last_error=str(e),
+            next_attempt_at=timezone.now() + retry_delay(1),
+        )
+        failed += len(pending)
+    finally:
+        connection.close()
+    return sent, failed
@@ -1,21 +1,52 @@
 # accounts/serializers.py
 from rest_framework import serializers
-from .models import CustomUser, Customer, Chef
+from .models import CustomUser, Customer, Chef, CATEGORY_BITS, DIETARY_BITS
 from django.contrib.auth import authenticate
-from .utils import send_activation_email
+from .utils import queue_activation_email
+
+
+class TagSetField(serializers.Field):
+    """A TagSet bitset column as a list of tag names. Also accepts "a,b" (form posts)."""
+    default_error_messages = {
+        'not_a_list': 'Expected a list of tags but got "{input_type}".',
+        'unknown': '{message}.',
+    }
+
+    def __init__(self, tags, **kwargs):
+        self.tags = tags
+        kwargs.setdefault('default', 0)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return self.tags.decode(value)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [name.strip() for name in data.split(',') if name.strip()]
+        if not isinstance(data, (list, tuple)):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        try:
+            return self.tags.encode(data)
+        except ValueError as exc:
+            self.fail('unknown', message=exc)
+
 
 class RegistrationSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
     user_type = serializers.ChoiceField(choices=CustomUser.USER_TYPE_CHOICES)
     full_name = serializers.CharField()  # Common for both
+    location_lat = serializers.DecimalField(max_digits=9, decimal_places=6, required=False, allow_null=True)
+    location_lng = serializers.DecimalField(max_digits=9, decimal_places=6, required=False, allow_null=True)
     # Customer-specific
     address = serializers.CharField(required=False, allow_blank=True)
     phone_number = serializers.CharField(required=False, allow_blank=True)
     dietary_preferences = serializers.CharField(required=False, allow_blank=True)
+    dietary_tags = TagSetField(DIETARY_BITS, required=False)  # Both
     # Chef-specific
     bio = serializers.CharField(required=False, allow_blank=True)
     specialty = serializers.CharField(required=False, allow_blank=True)
+    categories = TagSetField(CATEGORY_BITS, required=False)
     years_of_experience = serializers.IntegerField(required=False, default=0)
     certification = serializers.CharField(required=False, allow_blank=True)
 
@@ -48,7 +79,10 @@ class RegistrationSerializer(serializers.Serializer):
                 full_name=full_name,
                 address=validated_data.get('address'),
                 phone_number=validated_data.get('phone_number'),
-                dietary_preferences=validated_data.get('dietary_preferences')
+                dietary_preferences=validated_data.get('dietary_preferences'),
+                dietary_tags=validated_data.get('dietary_tags', 0),
+                location_lat=validated_data.get('location_lat'),
+                location_lng=validated_data.get('location_lng')
             )
         elif user_type == 'chef':
             Chef.objects.create(
@@ -56,16 +90,17 @@ class RegistrationSerializer(serializers.Serializer):
                 full_name=full_name,
                 bio=validated_data.get('bio'),
                 specialty=validated_data.get('specialty'),
+                categories=validated_data.get('categories', 0),
+                dietary_tags=validated_data.get('dietary_tags', 0),
                 years_of_experience=validated_data.get('years_of_experience', 0),
-                certification=validated_data.get('certification')
+                certification=validated_data.get('certification'),
+                location_lat=validated_data.get('location_lat'),
+                location_lng=validated_data.get('location_lng')
             )
         user.is_active = False
         user.save()
-        try:
-            send_activation_email(user)
-            print(f'Activation email sent to {user.email}')
-        except Exception as e:
-            print(f'Failed to send activation email: {e}')
+        # Delivered by the `send_emails` worker, not inside this request
+        queue_activation_email(user)
         return user
 
 class LoginSerializer(serializers.Serializer):
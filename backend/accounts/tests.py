@@ -1,3 +1,59 @@
-from django.test import TestCase
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib.auth.hashers import check_password
+from django.test import TestCase, override_settings
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from api.tests import IN_MEMORY_CHANNEL_LAYERS, Endpoint, QueryBudgetMixin
+from .models import CustomUser
+from .onboarding import hash_passwords
+
+
+def signup_data(market):
+    return {'email': market.new_email(), 'password': 'pass12345', 'user_type': 'customer', 'full_name': 'New Customer'}
+
+
+def activation_path(market):
+    user = market.new_user(is_active=False)
+    return f'activate/{urlsafe_base64_encode(force_bytes(user.pk))}/{default_token_generator.make_token(user)}/'
+
+
+class AccountsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    urlconf = 'accounts.urls'
+    prefix = '/accounts/'
+    endpoints = [
+        Endpoint('signup/', 10, method='POST', user=None, data=signup_data, status=201),
+        Endpoint('bulk-onboard/', 8, method='POST', user='admin', status=201,
+                 data=lambda m: {'users': [signup_data(m)]}),
+        # A first login, which creates the token
+        Endpoint('login/', 5, method='POST', user=None,
+                 data=lambda m: {'email': m.new_user().email, 'password': 'pass12345'}),
+        Endpoint('logout/', 2, method='POST', user=lambda m: m.new_user()),
+        Endpoint('activate/<uidb64>/<token>/', 2, user=None, path=activation_path, status=302),
+    ]
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class BulkOnboardTests(TestCase):
+    def setUp(self):
+        admin = CustomUser.objects.create_user(email='admin@example.com', password='pass12345', user_type='admin')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=admin).key}')
+
+    def row(self, email):
+        return {'email': email, 'password': 'pass12345', 'user_type': 'customer', 'full_name': 'New Customer'}
+
+    def test_accepts_a_bare_list_and_rejects_other_bodies(self):
+        response = self.client.post('/accounts/bulk-onboard/', [self.row('a@example.com')], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+        for body in ('users', 7):
+            response = self.client.post('/accounts/bulk-onboard/', body, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_hashes_in_spawned_processes(self):
+        hashed = hash_passwords(['first-secret', 'second-secret'], workers=2)
+        self.assertTrue(check_password('first-secret', hashed[0]))
+        self.assertTrue(check_password('second-secret', hashed[1]))
@@ -1,10 +1,14 @@
 # accounts/views.py
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.authtoken.models import Token
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from .serializers import RegistrationSerializer, LoginSerializer
+from .onboarding import bulk_onboard, parse_rows
+from api.permissions import IsAmdin
+from api.parsers import FastJSONParser
 from django.contrib.auth import logout
 from django.shortcuts import redirect
 from django.contrib.auth import get_user_model
@@ -28,6 +32,32 @@ def register_view(request):
         }, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAmdin])
+@parser_classes([FastJSONParser, MultiPartParser])
+def bulk_onboard_view(request):
+    """
+    Accepts either a multipart `file` (.csv or .json) or a JSON body,
+    {"users": [...]} or a bare list, with the same fields as signup.
+    """
+    upload = request.FILES.get('file')
+    try:
+        if upload:
+            fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+            rows = parse_rows(upload, fmt)
+        else:
+            # A bare list is taken as the rows, like in a JSON file
+            data = request.data
+            rows = data.get('users', []) if isinstance(data, dict) else data
+    except ValueError as e:
+        return Response({'detail': f'Could not parse file: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not isinstance(rows, list) or not rows:
+        return Response({'detail': 'No users provided.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    result = bulk_onboard(rows)
+    return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST)
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login_view(request):
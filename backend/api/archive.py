@@ -0,0 +1,169 @@
+"""
+Hot/cold archival.
+
+Old rows are moved from Order, Bid, ChatMessage and Notification into the
+Archived* tables in accounts.models, one batch per transaction: copy with
+bulk_create, then delete from the hot table. Hot tables (and their indexes)
+only hold live data while reads that need history fall through to the
+archive by primary key.
+
+What moves:
+- completed/cancelled orders untouched for ARCHIVE_ORDERS_AFTER_DAYS, with
+  all their bids and chat messages (reviews stay hot, see Review.order)
+- chat messages older than ARCHIVE_CHATS_AFTER_DAYS on finished orders
+- read notifications older than ARCHIVE_NOTIFICATIONS_AFTER_DAYS
+"""
+import logging
+from collections import namedtuple
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import caching
+from accounts.models import (
+    ArchivedBid, ArchivedChatMessage, ArchivedNotification, ArchivedOrder,
+    Bid, ChatMessage, Notification, Order,
+)
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('completed', 'cancelled')
+
+# Ids of the orders archive_orders is moving: api.signals keeps their reviews
+# and leaves cache invalidation to archive_all
+archiving = ContextVar('archiving', default=frozenset())
+
+
+def _cutoff(setting, default_days, now):
+    return now - timedelta(days=getattr(settings, setting, default_days))
+
+
+def _copy_fields(archive_model):
+    return [field.attname for field in archive_model._meta.concrete_fields if field.name != 'archived_at']
+
+
+def copy(queryset, archive_model, now):
+    """Copies `queryset`'s rows into `archive_model`. Returns the copied primary keys."""
+    fields = _copy_fields(archive_model)
+    rows = [archive_model(archived_at=now, **row) for row in queryset.values(*fields)]
+    archive_model.objects.bulk_create(rows)
+    return [row.pk for row in rows]
+
+
+def move(queryset, archive_model, now):
+    """Copies `queryset`'s rows into `archive_model` and deletes them. Call inside a transaction."""
+    pks = copy(queryset, archive_model, now)
+    queryset.model.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+def _in_batches(candidates, batch_size, archive_batch):
+    total = 0
+    while True:
+        ids = list(candidates.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        with transaction.atomic():
+            total += archive_batch(ids)
+
+
+def archive_orders(batch_size, now):
+    cutoff = _cutoff('ARCHIVE_ORDERS_AFTER_DAYS', 180, now)
+
+    def archive_batch(ids):
+        # Orders are copied first so the archived bids' foreign keys resolve,
+        # and deleted last so their bids and chats can't cascade away uncopied
+        pks = copy(Order.objects.filter(pk__in=ids), ArchivedOrder, now)
+        token = archiving.set(frozenset(pks))
+        try:
+            move(Bid.objects.filter(order_id__in=pks), ArchivedBid, now)
+            move(ChatMessage.objects.filter(order_id__in=pks), ArchivedChatMessage, now)
+            Order.objects.filter(pk__in=pks).delete()
+        finally:
+            archiving.reset(token)
+        return len(pks)
+
+    return _in_batches(
+        Order.objects.filter(status__in=FINAL_STATUSES, updated_at__lt=cutoff), batch_size, archive_batch)
+
+
+def archive_chats(batch_size, now):
+    cutoff = _cutoff('ARCHIVE_CHATS_AFTER_DAYS', 90, now)
+    return _in_batches(
+        ChatMessage.objects.filter(order__status__in=FINAL_STATUSES, timestamp__lt=cutoff), batch_size,
+        lambda ids: move(ChatMessage.objects.filter(pk__in=ids), ArchivedChatMessage, now),
+    )
+
+
+def archive_notifications(batch_size, now):
+    cutoff = _cutoff('ARCHIVE_NOTIFICATIONS_AFTER_DAYS', 30, now)
+    return _in_batches(
+        Notification.objects.filter(is_read=True, created_at__lt=cutoff), batch_size,
+        lambda ids: move(Notification.objects.filter(pk__in=ids), ArchivedNotification, now),
+    )
+
+
+def archive_all(batch_size=None, now=None):
+    """Runs every archival step. Returns {table: rows moved}."""
+    batch_size = batch_size or getattr(settings, 'ARCHIVE_BATCH_SIZE', 500)
+    now = now or timezone.now()
+    moved = {
+        'orders': archive_orders(batch_size, now),
+        'chat_messages': archive_chats(batch_size, now),
+        'notifications': archive_notifications(batch_size, now),
+    }
+    if any(moved.values()):
+        # Lists that stop showing archived rows are cached under many tags
+        caching.bump(caching.GLOBAL_TAG)
+    logger.info("archived %s", moved)
+    return moved
+
+
+# Read side
+
+def chat_history(order_id):
+    """Every message on an order, archived ones included, oldest first."""
+    archived = list(ArchivedChatMessage.objects.filter(order_id=order_id).select_related('sender'))
+    hot = list(ChatMessage.objects.filter(order_id=order_id).select_related('sender'))
+    return sorted(archived + hot, key=lambda message: (message.timestamp, message.id))
+
+
+ArchivedCounts = namedtuple('ArchivedCounts', 'accepted completed finished bids')
+
+
+def archived_chef_counts(chef_ids):
+    """
+    {chef_id: ArchivedCounts} of each chef's archived orders and bids, for
+    all-time stats that must not drop when history is archived.
+    """
+    orders = {
+        row['accepted_chef']: row for row in
+        ArchivedOrder.objects.filter(accepted_chef_id__in=chef_ids).values('accepted_chef').annotate(
+            accepted=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            finished=Count('id', filter=Q(status__in=FINAL_STATUSES)),
+        )
+    }
+    bids = dict(
+        ArchivedBid.objects.filter(chef_id__in=chef_ids)
+        .values('chef').annotate(total=Count('id')).values_list('chef', 'total')
+    )
+    counts = {}
+    for chef_id in chef_ids:
+        row = orders.get(chef_id, {'accepted': 0, 'completed': 0, 'finished': 0})
+        counts[chef_id] = ArchivedCounts(row['accepted'], row['completed'], row['finished'], bids.get(chef_id, 0))
+    return counts
+
+
+def chef_count_subquery(queryset, chef_field):
+    """Per-chef COUNT over `queryset` (hot or archived rows), for use in Chef annotations."""
+    return Coalesce(Subquery(
+        queryset.filter(**{chef_field: OuterRef('pk')})
+        .values(chef_field).annotate(total=Count('*')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
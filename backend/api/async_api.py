@@ -0,0 +1,106 @@
+"""
+Native async function views.
+
+DRF's @api_view only wraps sync functions, so under Daphne each request to
+one runs start to finish on a thread of its own. `async_api_view` gives an
+`async def` view the same authentication, permission checks, error
+responses and JSON rendering, while the view itself stays on the event loop
+and only steps off it for database work through Django's async ORM.
+
+Responses are always rendered with the first DEFAULT_RENDERER_CLASSES entry
+(the JSON renderer); the browsable API is sync-only.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+def async_api_view(http_method_names, permission_classes=None):
+    """
+    Equivalent of @api_view(methods) + @permission_classes(classes) for an
+    async view, which receives the DRF Request and returns a Response.
+    """
+    allowed = {method.upper() for method in http_method_names}
+    if 'GET' in allowed:
+        allowed.add('HEAD')
+    if permission_classes is None:
+        permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            request = Request(
+                request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+            renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+            request.accepted_renderer = renderer
+            request.accepted_media_type = renderer.media_type
+            try:
+                if request.method not in allowed:
+                    raise exceptions.MethodNotAllowed(request.method)
+                # Token lookups are sync; this is the only thread hop outside the view's queries
+                await sync_to_async(getattr)(request, 'user')
+                check_permissions(request, permission_classes)
+                response = await view(request, *args, **kwargs)
+            except Exception as exc:
+                response = handle_exception(exc, request)
+            return finalize(request, response, allowed)
+        return csrf_exempt(wrapped)
+    return decorator
+
+
+def check_permissions(request, permission_classes):
+    for permission in (permission() for permission in permission_classes):
+        if not permission.has_permission(request, None):
+            if request.authenticators and not request.successful_authenticator:
+                raise exceptions.NotAuthenticated()
+            raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+
+def handle_exception(exc, request):
+    """APIView.handle_exception: DRF's exception handler decides the response."""
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        authenticators = request.authenticators
+        auth_header = authenticators[0].authenticate_header(request) if authenticators else None
+        if auth_header:
+            exc.auth_header = auth_header
+        else:
+            exc.status_code = 403
+    response = api_settings.EXCEPTION_HANDLER(exc, {'request': request, 'args': (), 'kwargs': {}})
+    if response is None:
+        raise exc
+    response.exception = True
+    return response
+
+
+def render(request, response):
+    """
+    Renders a view's Response as finalize will, for decorators that need the
+    body before the view returns (e.g. to store it without blocking the loop
+    in a post-render callback). Rendering twice is a no-op.
+    """
+    if isinstance(response, Response) and not response.is_rendered:
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = {'request': request, 'response': response}
+        response.render()
+    return response
+
+
+def finalize(request, response, allowed):
+    """APIView.finalize_response, rendering straight away."""
+    render(request, response)
+    response['Allow'] = ', '.join(sorted(allowed))
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+async def alist(queryset):
+    """Evaluates a queryset through the async ORM, for use with asyncio.gather()."""
+    return [row async for row in queryset]
+
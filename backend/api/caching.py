@@ -0,0 +1,265 @@
+"""
+Tag-versioned caching for views and fragments.
+
+Each cached entry is stored under a key built from the current version of
+every tag it depends on, e.g. "order:12", "chef:3:reviews" or
+"user:7:wallet". Writes bump those versions (api.signals does it from
+post_save/post_delete via `tags_for`, set-based updates call `bump`), so a
+stale entry is never looked up again and simply ages out of the cache: by
+TTL, or by LRU eviction (LocMemCache's culling; set maxmemory-policy
+allkeys-lru on Redis). Nothing is ever deleted by pattern, so any Django
+cache backend works and every process sharing it sees the same versions.
+
+Opt in per view with @cached_view(lambda request, ...: [tags]), or cache a
+computed value with cached_fragment(name, tags, compute). Views are only
+cached when the cache is shared (see `responses_cached`): a per-process
+LocMemCache never sees the bumps of expire_orders, archive_data or other
+workers, so it would serve their stale responses until the TTL.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+
+from accounts.models import Bid, ChatMessage, Chef, Notification, Order, Review, Transaction, Wallet
+from .async_api import render
+from .metrics import registry
+
+VERSION_PREFIX = 'cachever:'
+ENTRY_PREFIX = 'cached:'
+# Included in every entry; bumping it drops the whole cache (e.g. after archiving)
+GLOBAL_TAG = 'all'
+
+_missing = object()
+
+
+def default_timeout():
+    return getattr(settings, 'CACHE_DEFAULT_TTL', 300)
+
+
+def shared_cache():
+    """Whether every process sees the same default cache, i.e. it isn't local memory."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def responses_cached():
+    """CACHE_RESPONSES when set, else whether the cache is shared."""
+    setting = getattr(settings, 'CACHE_RESPONSES', None)
+    return shared_cache() if setting is None else setting
+
+
+def _user_id(instance, path):
+    """
+    The user id at the end of `path` ("order__customer"), following rows
+    already loaded on `instance` and reading the rest in one query.
+    """
+    fields = path.split('__')
+    for position, name in enumerate(fields):
+        field = instance._meta.get_field(name)
+        related = field.get_cached_value(instance, None)
+        if related is None:
+            lookup = '__'.join([*fields[position + 1:], 'user'])
+            return (field.related_model.objects.filter(pk=getattr(instance, field.attname))
+                    .values_list(lookup, flat=True).first())
+        instance = related
+    return instance.user_id
+
+
+def _chef_tags(chef):
+    # Customers' order lists show the chef they accepted
+    customers = (Order.objects.filter(accepted_chef_id=chef.pk)
+                 .values_list('customer__user_id', flat=True).distinct())
+    return [f'chef:{chef.pk}', *(f'user:{user_id}:orders' for user_id in customers)]
+
+
+# Which tags a row invalidates when it is written
+MODEL_TAGS = {
+    Order: lambda order: [f'order:{order.pk}', f'user:{_user_id(order, "customer")}:orders'],
+    # Bid counts and reviews are part of the customer's order list too
+    Bid: lambda bid: [f'order:{bid.order_id}', f'user:{_user_id(bid, "order__customer")}:orders'],
+    Review: lambda review: [
+        f'order:{review.order_id}', f'user:{_user_id(review, "customer")}:orders',
+        f'chef:{review.chef_id}', f'chef:{review.chef_id}:reviews',
+    ],
+    Chef: _chef_tags,
+    Wallet: lambda wallet: [f'user:{wallet.user_id}:wallet'],
+    Transaction: lambda txn: [f'user:{_user_id(txn, "wallet")}:wallet'],
+    Notification: lambda notification: [f'user:{notification.user_id}:notifications'],
+    ChatMessage: lambda message: [f'order:{message.order_id}:chat'],
+}
+
+
+def tags_for(instance):
+    tags = MODEL_TAGS.get(type(instance))
+    return tags(instance) if tags else []
+
+
+# Versions
+
+def _fresh_version():
+    # Never reuses a version an evicted counter once had, so entries stored
+    # under the old number can't come back to life
+    return time.time_ns()
+
+
+def versions(tags):
+    """[version of each tag], creating missing ones."""
+    keys = [VERSION_PREFIX + tag for tag in tags]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, _fresh_version(), None)
+        found.update(cache.get_many(missing))
+    return [found.get(key) for key in keys]
+
+
+async def aversions(tags):
+    keys = [VERSION_PREFIX + tag for tag in tags]
+    found = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, _fresh_version(), None)
+        found.update(await cache.aget_many(missing))
+    return [found.get(key) for key in keys]
+
+
+def _bump_now(tags):
+    for tag in tags:
+        try:
+            cache.incr(VERSION_PREFIX + tag)
+        except ValueError:
+            # Never read (or evicted): the next read starts a fresh version anyway
+            pass
+
+
+def bump(*tags):
+    """
+    Invalidates everything cached under `tags`. Bumped straight away and again
+    when the current transaction commits, so a read that raced the write
+    can't leave pre-commit data cached under the new version.
+    """
+    if not tags:
+        return
+    _bump_now(tags)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump_now(tags))
+
+
+def entry_key(name, tags, tag_versions, vary=()):
+    digest = hashlib.blake2b(repr((tags, tag_versions, vary)).encode(), digest_size=12).hexdigest()
+    return f'{ENTRY_PREFIX}{name}:{digest}'
+
+
+# Fragments
+
+def cached_fragment(name, tags, compute, timeout=_missing, vary=()):
+    """compute()'s result, cached until one of `tags` is bumped or `timeout` passes."""
+    tags = [GLOBAL_TAG, *tags]
+    key = entry_key(name, tags, versions(tags), vary)
+    value = cache.get(key, _missing)
+    registry.observe_cache(name, value is not _missing)
+    if value is _missing:
+        value = compute()
+        cache.set(key, value, default_timeout() if timeout is _missing else timeout)
+    return value
+
+
+# Views
+
+def _view_key(view, request, tags, tag_versions, per_user):
+    user = getattr(request, 'user', None)
+    vary = (request.get_full_path(), user.pk if per_user and user is not None else None)
+    return entry_key(view.__name__, tags, tag_versions, vary)
+
+
+def _cacheable(request):
+    # Only JSON bodies are stored; the browsable API renders normally
+    renderer = getattr(request, 'accepted_renderer', None)
+    return request.method in ('GET', 'HEAD') and renderer is not None and renderer.format == 'json'
+
+
+def _from_entry(entry):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Cache'] = 'hit'
+    return response
+
+
+def _entry(response):
+    """What to store for a rendered `response`, or None when it isn't cacheable."""
+    if response.status_code != 200 or response.streaming:
+        return None
+    return {'content': response.content, 'content_type': response['Content-Type']}
+
+
+def _store_on_render(response, key, timeout):
+    if response.status_code != 200 or not hasattr(response, 'add_post_render_callback'):
+        return response
+
+    def store(rendered):
+        cache.set(key, _entry(rendered), timeout)
+        rendered['X-Cache'] = 'miss'
+    response.add_post_render_callback(store)
+    return response
+
+
+async def _astore(request, response, key, timeout):
+    # Async views are rendered here rather than in a post-render callback,
+    # which would run the cache write on the event loop
+    entry = _entry(render(request, response))
+    if entry is not None:
+        await cache.aset(key, entry, timeout)
+        response['X-Cache'] = 'miss'
+    return response
+
+
+def cached_view(tags, timeout=_missing, per_user=True):
+    """
+    Caches a DRF function view's rendered 200 responses.
+
+    `tags(request, *args, **kwargs)` lists what the response depends on. The
+    key covers the full path and, with per_user (the default), the user, so
+    responses that depend on who is asking are never shared. Works on sync
+    and async (api.async_api) views; apply below the auth decorators. A
+    no-op unless responses_cached().
+    """
+    def decorator(view):
+        def setup(request, args, kwargs):
+            view_tags = [GLOBAL_TAG, *tags(request, *args, **kwargs)]
+            return view_tags, (default_timeout() if timeout is _missing else timeout)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def awrapped(request, *args, **kwargs):
+                if not (_cacheable(request) and responses_cached()):
+                    return await view(request, *args, **kwargs)
+                view_tags, ttl = setup(request, args, kwargs)
+                key = _view_key(view, request, view_tags, await aversions(view_tags), per_user)
+                entry = await cache.aget(key)
+                registry.observe_cache(view.__name__, entry is not None)
+                if entry is not None:
+                    return _from_entry(entry)
+                return await _astore(request, await view(request, *args, **kwargs), key, ttl)
+            return awrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not (_cacheable(request) and responses_cached()):
+                return view(request, *args, **kwargs)
+            view_tags, ttl = setup(request, args, kwargs)
+            key = _view_key(view, request, view_tags, versions(view_tags), per_user)
+            entry = cache.get(key)
+            registry.observe_cache(view.__name__, entry is not None)
+            if entry is not None:
+                return _from_entry(entry)
+            return _store_on_render(view(request, *args, **kwargs), key, ttl)
+        return wrapped
+    return decorator
@@ -0,0 +1,74 @@
+"""
+Chat scrollback pages for the chat socket.
+
+Pages are keyset queries on (order_id, timestamp, id), newest first, so
+each page costs the same however far back the client scrolls. When the
+hot table runs out the page continues in the archive, which only ever
+holds messages older than the hot ones.
+"""
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import ArchivedChatMessage, ChatMessage
+from .serializers import ArchivedChatMessageSerializer, ChatMessageSerializer
+
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(message):
+    return f"{message.timestamp.isoformat()}|{message.id}"
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from an opaque cursor. Raises ValueError when malformed."""
+    stamp, _, message_id = str(cursor).rpartition('|')
+    moment = parse_datetime(stamp)
+    if moment is None or not message_id.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return moment, int(message_id)
+
+
+def page_limit(limit=None):
+    """The page size for a requested `limit`. Raises ValueError unless it is a whole number."""
+    if limit is None:
+        return getattr(settings, 'CHAT_HISTORY_PAGE_SIZE', 30)
+    if isinstance(limit, bool) or not isinstance(limit, (int, str)) or not str(limit).isdigit():
+        raise ValueError(f"Invalid limit: {limit!r}")
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def _older(queryset, before, limit):
+    if before is not None:
+        stamp, message_id = before
+        queryset = queryset.filter(Q(timestamp__lt=stamp) | Q(timestamp=stamp, id__lt=message_id))
+    return list(queryset.select_related('sender').order_by('-timestamp', '-id')[:limit])
+
+
+def serialize(message):
+    if isinstance(message, ArchivedChatMessage):
+        return ArchivedChatMessageSerializer(message).data
+    return ChatMessageSerializer(message).data
+
+
+def history_page(order_id, cursor=None, limit=None):
+    """
+    Up to `limit` messages older than `cursor` (the newest when None),
+    oldest first, with the cursor for the next older page. Raises
+    ValueError for a malformed cursor; validate `limit` with page_limit.
+    """
+    limit = page_limit(limit)
+    before = decode_cursor(cursor) if cursor else None
+
+    # One extra row tells whether another page exists
+    messages = _older(ChatMessage.objects.filter(order_id=order_id), before, limit + 1)
+    if len(messages) <= limit:
+        messages += _older(ArchivedChatMessage.objects.filter(order_id=order_id), before, limit + 1 - len(messages))
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
+    return {
+        'messages': [serialize(message) for message in reversed(messages)],
+        'cursor': encode_cursor(messages[-1]) if has_more else None,
+        'has_more': has_more,
+    }
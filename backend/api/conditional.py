@@ -0,0 +1,226 @@
+import asyncio
+import gzip
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+from accounts.models import Bid, Chef, Order, Review
+from .async_api import render
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Rendered bodies are kept until their ETag changes; the timeout only bounds memory
+BODY_CACHE_TIMEOUT = 60 * 60
+# Smaller bodies are not worth compressing
+MIN_COMPRESS_BYTES = 256
+
+
+def conditional_json(watermark):
+    """
+    ETag support for a DRF function view.
+
+    `watermark(request, *args, **kwargs)` returns the parts of a few cheap
+    aggregate queries, or None to skip conditional handling. A matching
+    If-None-Match gets a 304 without running the view. Otherwise the
+    rendered JSON is stored gzip/brotli-compressed next to its ETag, so later
+    requests with the same ETag skip serialization too.
+
+    There is no Last-Modified: its one-second stamps can't tell apart two
+    writes in the same second, and not every part has a stamp at all, so an
+    If-Modified-Since client could be sent a stale 304.
+
+    Async views (see api.async_api) take an async watermark, and store bodies
+    without blocking the event loop.
+
+    Apply below @api_view/@permission_classes so auth still runs first.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def awrapped(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                parts = await watermark(request, *args, **kwargs)
+                if parts is None:
+                    return await view(request, *args, **kwargs)
+                etag, cache_key, cacheable = validators(request, parts)
+                if not_modified(request, etag):
+                    return with_validators(HttpResponseNotModified(), etag)
+                if cacheable:
+                    response = cached_response(request, await cache.aget(cache_key), etag)
+                    if response is not None:
+                        return response
+                response = await view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                with_validators(response, etag)
+                if cacheable and isinstance(response, Response):
+                    render(request, response)
+                    entry = await sync_to_async(compress_entry, thread_sensitive=False)(etag, response)
+                    await cache.aset(cache_key, entry, BODY_CACHE_TIMEOUT)
+                    apply_encoding(request, response, entry)
+                return response
+            return awrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            parts = watermark(request, *args, **kwargs)
+            if parts is None:
+                return view(request, *args, **kwargs)
+            etag, cache_key, cacheable = validators(request, parts)
+            if not_modified(request, etag):
+                return with_validators(HttpResponseNotModified(), etag)
+            if cacheable:
+                response = cached_response(request, cache.get(cache_key), etag)
+                if response is not None:
+                    return response
+            return store_on_render(request, view(request, *args, **kwargs), etag, cache_key, cacheable)
+        return wrapped
+    return decorator
+
+
+def validators(request, parts):
+    """(etag, cache key, whether the body may be stored) for a watermark."""
+    path = request.get_full_path()
+    digest = hashlib.blake2b(repr((path, parts)).encode(), digest_size=12).hexdigest()
+    # Only JSON bodies are stored; the browsable API renders normally
+    renderer = getattr(request, 'accepted_renderer', None)
+    cacheable = renderer is not None and renderer.format == 'json'
+    return f'W/"{digest}"', f'conditional:{path}', cacheable
+
+
+def cached_response(request, entry, etag):
+    if entry is None or entry['etag'] != etag:
+        return None
+    response = HttpResponse(content_type=entry['content_type'])
+    apply_encoding(request, response, entry)
+    return with_validators(response, etag)
+
+
+def store_on_render(request, response, etag, cache_key, cacheable):
+    if response.status_code != 200:
+        return response
+    with_validators(response, etag)
+    if cacheable and hasattr(response, 'add_post_render_callback'):
+        def store(rendered):
+            entry = compress_entry(etag, rendered)
+            cache.set(cache_key, entry, BODY_CACHE_TIMEOUT)
+            apply_encoding(request, rendered, entry)
+        response.add_post_render_callback(store)
+    return response
+
+
+def not_modified(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    # Weak comparison: W/"x" and "x" match
+    if if_none_match.strip() == '*':
+        return True
+    bare = etag.removeprefix('W/')
+    return any(tag.removeprefix('W/') == bare for tag in parse_etags(if_none_match))
+
+
+def with_validators(response, etag):
+    response['ETag'] = etag
+    # Clients may keep the body but must revalidate before using it
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def compress_entry(etag, response):
+    body = response.content
+    entry = {
+        'etag': etag,
+        'content_type': response['Content-Type'],
+        'identity': body,
+        'gzip': None,
+        'br': None,
+    }
+    if len(body) >= MIN_COMPRESS_BYTES:
+        entry['gzip'] = gzip.compress(body, compresslevel=6)
+        if brotli is not None:
+            entry['br'] = brotli.compress(body, quality=5)
+    return entry
+
+
+def accepted_encodings(request):
+    """Codings from Accept-Encoding, ignoring those sent with q=0."""
+    accepted = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        if coding and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.lower())
+    return accepted
+
+
+def apply_encoding(request, response, entry):
+    accepted = accepted_encodings(request)
+    for coding in ('br', 'gzip'):
+        if entry[coding] is not None and coding in accepted:
+            response.content = entry[coding]
+            response['Content-Encoding'] = coding
+            break
+    else:
+        response.content = entry['identity']
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+
+# Watermarks: enough aggregate state to change whenever the view's output would
+
+# They are async (independent aggregates are gathered) for the async views in api.views
+
+async def open_orders_watermark(request):
+    orders, bids = await asyncio.gather(
+        Order.objects.filter(status='open').aaggregate(count=Count('id'), top=Max('id'), last=Max('updated_at')),
+        Bid.objects.filter(order__status='open').aaggregate(count=Count('id'), last=Max('updated_at')),
+    )
+    return (orders['count'], orders['top'], orders['last'], bids['count'], bids['last'])
+
+
+async def order_detail_watermark(request, pk):
+    rows = [
+        row async for row in Order.objects.filter(pk=pk)
+        .values('updated_at', 'review__updated_at', 'accepted_chef__updated_at')
+        .annotate(bid_count=Count('bids'), bids_last=Max('bids__updated_at'))
+    ]
+    if not rows:
+        return None
+    return tuple(rows[0].values())
+
+
+async def chef_profile_watermark(request, chef_id):
+    chef, reviews, accepted = await asyncio.gather(
+        Chef.objects.filter(pk=chef_id).values('updated_at', 'user__profile_image_asset_id').afirst(),
+        Review.objects.filter(chef_id=chef_id).aaggregate(count=Count('id'), last=Max('updated_at')),
+        Order.objects.filter(accepted_chef_id=chef_id).acount(),
+    )
+    if chef is None:
+        return None
+    return (
+        chef['updated_at'], chef['user__profile_image_asset_id'], reviews['count'], reviews['last'], accepted)
+
+
+async def top_chefs_watermark(request):
+    # Maxima only (no COUNTs) since this one spans whole tables
+    chefs, reviews, bids, orders = await asyncio.gather(
+        Chef.objects.aaggregate(top=Max('id'), last=Max('updated_at')),
+        Review.objects.aaggregate(top=Max('id'), last=Max('updated_at')),
+        Bid.objects.aaggregate(top=Max('id')),
+        Order.objects.aaggregate(last=Max('updated_at')),
+    )
+    return (
+        chefs['top'], chefs['last'], reviews['top'], reviews['last'], bids['top'], orders['last'])
@@ -1,14 +1,40 @@
-import json
+import asyncio
+import logging
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncJsonWebsocketConsumer, AsyncWebsocketConsumer
 from django.contrib.auth.models import AnonymousUser
 from asgiref.sync import sync_to_async
 from accounts.models import CustomUser, ChatMessage, Order
+from . import chat, events, throttling
+from .renderers import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Application close code (4000-4999) sent when a socket is closed for flooding
+RATE_LIMITED_CLOSE_CODE = 4429
 
 
 class OrderConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Order and bid events, each with its "seq" (see api/events.py). A client
+    that reconnects with ?last_seq=N, or sends {"type": "resume",
+    "last_seq": N}, is replayed what it missed and then sent "resumed", or
+    "resync" when it has to refetch over REST. A fresh connection is sent
+    "connected" with the current seq to resume from later. Live events can
+    overlap the replay; clients skip a seq they have already handled.
+    """
+
+    # Same encoder as the REST renderer, so payloads match the API output
+    @classmethod
+    async def encode_json(cls, content):
+        return dumps(content).decode()
+
+    @classmethod
+    async def decode_json(cls, text_data):
+        return loads(text_data)
+
     async def connect(self):
         user = self.scope['user']
-        print("User ob: ", user)
         if user.is_authenticated:
             # Join a global orders group
             await self.channel_layer.group_add("orders", self.channel_name)
@@ -17,7 +43,13 @@ class OrderConsumer(AsyncJsonWebsocketConsumer):
             await self.channel_layer.group_add(f"user_{user.id}", self.channel_name)
 
             await self.accept()
-            print(f"Websocket connected for user {user.id}")
+            logger.debug("orders socket connected: user=%s", user.id)
+
+            last_seq = parse_qs(self.scope.get("query_string", b"").decode()).get("last_seq")
+            if last_seq:
+                await self.resume(last_seq[0])
+            else:
+                await self.send_json({"event": "connected", "seq": await sync_to_async(events.latest_seq)()})
         else:
             # Reject unauthenticated socket
             await self.close()
@@ -28,20 +60,58 @@ class OrderConsumer(AsyncJsonWebsocketConsumer):
         await self.channel_layer.group_discard("orders", self.channel_name)
 
     async def receive_json(self, content):
-        # optional - if client sends something 
-        pass
+        if content.get("type") == "resume":
+            await self.resume(content.get("last_seq"))
+
+    async def resume(self, last_seq):
+        try:
+            last_seq = int(last_seq)
+        except (TypeError, ValueError):
+            await self.send_json({"event": "error", "error": "invalid_last_seq"})
+            return
+        # Each replay reads the event log; a socket can't ask for one per frame
+        for ident in (f"socket:{self.channel_name}", f"user:{self.scope['user'].id}"):
+            allowed, wait = await throttling.atake('socket_resume', ident)
+            if not allowed:
+                await self.send_json({"event": "error", "error": "rate_limited", "retry_after": round(wait, 2)})
+                return
+        missed, latest = await sync_to_async(events.replay)(self.scope["user"].id, last_seq)
+        if missed is None:
+            await self.send_json({"event": "resync", "seq": latest})
+            return
+        # Through the same handlers as live events, so the frames are identical
+        for message in missed:
+            await self.dispatch(message)
+        await self.send_json({"event": "resumed", "seq": latest, "replayed": len(missed)})
 
     async def order_update(self, event):
         await self.send_json({
             "event": event.get("event", "order_update"), 
+            "seq": event.get("seq"),
             "data": event["data"]
         })
 
+    async def order_matched(self, event):
+        """A new order this chef was matched to, sent ahead of the general broadcast."""
+        await self.send_json({
+            "event": "order_matched",
+            "seq": event.get("seq"),
+            "data": event["data"],
+        })
+
     async def bid_placed(self, event):
         """When a chef places a new bid."""
-        print("📨 Bid placed event:", event["data"])
         await self.send_json({
             "event": "bid_placed",
+            "seq": event.get("seq"),
+            "data": event["data"],
+        })
+
+    async def bid_ranked(self, event):
+        """Where a new bid landed in the customer's ranking of the order's bids."""
+        await self.send_json({
+            "event": "bid_ranked",
+            "seq": event.get("seq"),
             "data": event["data"],
         })
 
@@ -49,9 +119,9 @@ class OrderConsumer(AsyncJsonWebsocketConsumer):
         """
         Handle accepted bid notifications.
         """
-        print("Bid accepted event received:", event["data"])
         await self.send_json({
             "event": "bid_accepted",
+            "seq": event.get("seq"),
             "data": event["data"]
         })
 
@@ -67,6 +137,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
         await self.accept()
 
+        # Open with the latest page so clients don't need a REST call first
+        await self.send_history()
+
     async def disconnect(self, close_code):
         # Leave room
         await self.channel_layer.group_discard(
@@ -75,38 +148,97 @@ class ChatConsumer(AsyncWebsocketConsumer):
         )
 
     async def receive(self, text_data):
-        data = json.loads(text_data)
+        data = loads(text_data)
+        # {"type": "history", "cursor": <cursor from the previous page>, "limit": N}
+        if data.get('type') == 'history':
+            if await self.within_rate_limit('chat_history'):
+                await self.send_history(data.get('cursor'), data.get('limit'))
+            return
+
+        if not await self.within_rate_limit('chat_message'):
+            return
         message = data['message']
         sender_id = data['sender']
         receiver_id = data['receiver']
 
         # Save message to DB
-        await self.save_message(sender_id, receiver_id, self.order_id, message)
+        saved = await self.save_message(sender_id, receiver_id, self.order_id, message)
 
         # Broadcast message
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
+                'id': saved.id,
+                'timestamp': saved.timestamp.isoformat(),
                 'message': message,
                 'sender': sender_id,
                 'receiver': receiver_id
             }
         )
 
+    async def send_history(self, cursor=None, limit=None):
+        """One page of older messages, oldest first, plus the cursor for the next one."""
+        try:
+            limit = chat.page_limit(limit)
+        except ValueError:
+            await self.send(text_data=dumps({'type': 'history', 'error': 'invalid_limit'}).decode())
+            return
+        try:
+            page = await sync_to_async(chat.history_page)(self.order_id, cursor, limit)
+        except ValueError:
+            await self.send(text_data=dumps({'type': 'history', 'error': 'invalid_cursor'}).decode())
+            return
+        await self.send(text_data=dumps({'type': 'history', **page}).decode())
+
+    async def within_rate_limit(self, name):
+        """
+        Applies the `name` token bucket (chat_message or chat_history) to
+        this socket and, when authenticated, to its user across all their
+        sockets. Over the limit the frame is dropped with an error frame,
+        held until a token frees up, or the socket is closed, depending on
+        the configured action.
+        """
+        limit = throttling.get_limit(name)
+        user = self.scope.get('user')
+        idents = [f"socket:{self.channel_name}"]
+        if user is not None and user.is_authenticated:
+            idents.append(f"user:{user.id}")
+        max_wait = limit['max_delay'] if limit['action'] == 'delay' else 0.0
+        longest = 0.0
+        for ident in idents:
+            allowed, wait = await throttling.atake(name, ident, max_wait)
+            if not allowed:
+                logger.debug("%s rate limited: %s order=%s retry_after=%.2f", name, ident, self.order_id, wait)
+                if limit['action'] == 'close':
+                    await self.close(code=RATE_LIMITED_CLOSE_CODE)
+                else:
+                    await self.send(text_data=dumps({
+                        'error': 'rate_limited',
+                        'retry_after': round(wait, 2),
+                    }).decode())
+                return False
+            longest = max(longest, wait)
+        if longest > 0:
+            await asyncio.sleep(longest)
+        return True
+
     async def chat_message(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps({
+            'type': 'message',
+            'id': event.get('id'),
+            'timestamp': event.get('timestamp'),
             'message': event['message'],
             'sender': event['sender'],
             'receiver': event['receiver']
-        }))
+        }).decode())
 
     @sync_to_async
     def save_message(self, sender_id, receiver_id, order_id, message):
         sender = CustomUser.objects.get(id=sender_id)
         receiver = CustomUser.objects.get(id=receiver_id)
         order = Order.objects.get(id=order_id)
-        ChatMessage.objects.create(
+        return ChatMessage.objects.create(
             sender=sender,
             receiver=receiver,
             order=order,
@@ -135,7 +267,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         pass
 
     async def send_notification(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(text_data=dumps({
             'message': event['message'],
             'type': event.get('type', 'info')
-        }))
+        }).decode())
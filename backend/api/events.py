@@ -0,0 +1,123 @@
+"""
+Sequenced, replayable socket events.
+
+Everything pushed to the `ws/orders/` socket goes through `publish`, which,
+once the transaction commits, stores the channel layer message as a
+RealtimeEvent and sends it with the row id as "seq". Sequence numbers
+increase across all events, so the events one user receives (the "orders"
+broadcast plus their own "user_<id>" group) arrive in increasing order.
+Ids are taken at commit time and under a lock on the newest event (see
+`log`), so on Postgres or MySQL too an event never becomes visible after
+one with a higher seq, which replay would then skip.
+
+An event published with a `delay` (a matched order's head start) is only
+logged when it is sent, so it can't be replayed early and its seq follows
+the events sent while it waited.
+
+A client that reconnects with the last seq it handled is replayed only the
+events after it (`replay`). When some of those were already pruned, or
+there are more than REALTIME_REPLAY_MAX_EVENTS of them, it is told to
+resync over REST instead. Only the last REALTIME_LOG_SIZE events are
+kept; every REALTIME_PRUNE_EVERY-th event deletes the older ones.
+"""
+import threading
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from accounts.models import RealtimeEvent
+
+BROADCAST_GROUP = 'orders'
+
+
+def user_group(user_id):
+    return f'user_{user_id}'
+
+
+def publish(group, message, delay=0):
+    publish_many([(group, message)], delay)
+
+
+def publish_many(events, delay=0):
+    """
+    Once the current transaction commits (or `delay` seconds after it, if
+    given), logs [(group, message)] and sends each message to its group. A
+    rolled back transaction neither logs nor sends anything.
+    """
+    if not events:
+        return
+    if delay > 0:
+        def send_later():
+            timer = threading.Timer(delay, log_and_send, [events])
+            timer.daemon = True
+            timer.start()
+        transaction.on_commit(send_later)
+        return
+    transaction.on_commit(lambda: send(log(events)))
+
+
+def log(events):
+    """Stores [(group, message)]. Returns [(group, message with its seq)]."""
+    with transaction.atomic():
+        # Concurrent loggers queue on the newest row, so each one's ids are
+        # taken and committed after the previous one's (SQLite serializes
+        # writers anyway)
+        RealtimeEvent.objects.select_for_update().order_by('-id').values_list('id').first()
+        rows = RealtimeEvent.objects.bulk_create(
+            [RealtimeEvent(group=group, message=message) for group, message in events])
+    prune_every = getattr(settings, 'REALTIME_PRUNE_EVERY', 100)
+    if prune_every and any(row.id % prune_every == 0 for row in rows):
+        prune(rows[-1].id)
+    return [(row.group, {**message, 'seq': row.id}) for row, (_, message) in zip(rows, events)]
+
+
+def send(sends):
+    async def send_all():
+        channel_layer = get_channel_layer()
+        # One at a time, so each group receives them in seq order
+        for group, message in sends:
+            await channel_layer.group_send(group, message)
+
+    async_to_sync(send_all)()
+
+
+def log_and_send(events):
+    """Runs on a timer thread, which has a database connection of its own to close."""
+    try:
+        send(log(events))
+    finally:
+        connection.close()
+
+
+def prune(latest_seq):
+    size = getattr(settings, 'REALTIME_LOG_SIZE', 10000)
+    RealtimeEvent.objects.filter(id__lte=latest_seq - size).delete()
+
+
+def latest_seq():
+    return RealtimeEvent.objects.aggregate(seq=Max('id'))['seq'] or 0
+
+
+def replay(user_id, last_seq):
+    """
+    (messages, latest seq): the messages `user_id` was sent after
+    `last_seq`, oldest first, or None for messages when the log can't fill
+    the gap and the client has to resync.
+    """
+    bounds = RealtimeEvent.objects.aggregate(oldest=Min('id'), latest=Max('id'))
+    oldest, latest = bounds['oldest'], bounds['latest'] or 0
+    # Pruned past the client's position, or a seq from before a database reset
+    if (oldest is not None and last_seq < oldest - 1) or last_seq > latest:
+        return None, latest
+
+    limit = getattr(settings, 'REALTIME_REPLAY_MAX_EVENTS', 500)
+    rows = list(
+        RealtimeEvent.objects.filter(id__gt=last_seq, group__in=[BROADCAST_GROUP, user_group(user_id)])
+        .order_by('id').values_list('id', 'message')[:limit + 1]
+    )
+    if len(rows) > limit:
+        return None, latest
+    return [{**message, 'seq': seq} for seq, message in rows], latest
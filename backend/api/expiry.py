@@ -0,0 +1,89 @@
+"""
+Auto-cancelling open orders whose preferred delivery time has passed.
+
+Orders are cancelled a batch at a time with set-based UPDATEs instead of
+one save() (and one post_save broadcast) per order. The status guard and
+version bump make each batch a compare-and-swap like api.order_state: an
+order accepted between the SELECT and the UPDATE is left alone. Each batch
+ends with a single coalesced "orders_expired" event on the orders group.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import Bid, Notification, Order
+from . import caching, events
+
+logger = logging.getLogger(__name__)
+
+
+def expiry_cutoff(now=None):
+    grace = getattr(settings, 'ORDER_EXPIRY_GRACE_MINUTES', 0)
+    return (now or timezone.now()) - timedelta(minutes=grace)
+
+
+def expire_batch(cutoff, batch_size):
+    """
+    Cancels up to `batch_size` open orders due before `cutoff`.
+    Returns (number of candidates found, ids actually cancelled).
+    """
+    # Served by the (status, preferred_delivery_time) index
+    candidates = list(
+        Order.objects.filter(status='open', preferred_delivery_time__lt=cutoff)
+        .order_by('preferred_delivery_time', 'id')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    if not candidates:
+        return 0, []
+
+    now = timezone.now()
+    with transaction.atomic():
+        Order.objects.filter(id__in=candidates, status='open').update(
+            status='cancelled', version=F('version') + 1, updated_at=now)
+        # Orders that changed status in the meantime were skipped by the guard
+        expired = list(
+            Order.objects.filter(id__in=candidates, status='cancelled', updated_at=now)
+            .values_list('id', 'title', 'customer__user_id')
+        )
+        ids = [order_id for order_id, _, _ in expired]
+        Bid.objects.filter(order_id__in=ids, status='pending').update(status='declined', updated_at=now)
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id, type='order',
+                message=f"Your order '{title}' expired without an accepted bid and was cancelled."[:255],
+            )
+            for _, title, user_id in expired
+        ])
+
+    # The UPDATEs above send no post_save, so the cache tags are bumped here
+    caching.bump(*(
+        tag for order_id, _, user_id in expired
+        for tag in (f'order:{order_id}', f'user:{user_id}:orders', f'user:{user_id}:notifications')
+    ))
+    if ids:
+        events.publish(
+            events.BROADCAST_GROUP,
+            {
+                "type": "order.update",
+                "event": "orders_expired",
+                "data": {"orders": ids, "status": "cancelled"},
+            },
+        )
+    logger.info("expired %d of %d stale open orders", len(ids), len(candidates))
+    return len(candidates), ids
+
+
+def expire_stale_orders(batch_size=None, now=None):
+    """Cancels every stale open order, batch by batch. Returns how many were cancelled."""
+    batch_size = batch_size or getattr(settings, 'ORDER_EXPIRY_BATCH_SIZE', 500)
+    cutoff = expiry_cutoff(now)
+    total = 0
+    while True:
+        found, ids = expire_batch(cutoff, batch_size)
+        if not found:
+            return total
+        total += len(ids)
@@ -0,0 +1,157 @@
+"""
+Streaming CSV/NDJSON exports of orders, bids and transactions.
+
+Rows are read with values_list().iterator(), so the database driver hands
+them over CHUNK_SIZE at a time, and are encoded straight into output
+chunks. Nothing holds the whole result set, whether the chunks go to a
+StreamingHttpResponse or to a file from the `export_data` command.
+"""
+import csv
+import datetime
+import decimal
+import io
+from collections import namedtuple
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from accounts.models import Bid, Order, Transaction
+from .renderers import dumps
+
+CHUNK_SIZE = 2000
+# Rows encoded per yielded chunk
+ROWS_PER_CHUNK = 500
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# header: output column; lookup: values_list() path
+Dataset = namedtuple('Dataset', 'model date_field columns')
+
+DATASETS = {
+    'orders': Dataset(Order, 'created_at', [
+        ('id', 'id'),
+        ('customer_id', 'customer_id'),
+        ('customer_name', 'customer__full_name'),
+        ('title', 'title'),
+        ('max_budget', 'max_budget'),
+        ('preferred_delivery_time', 'preferred_delivery_time'),
+        ('status', 'status'),
+        ('accepted_chef_id', 'accepted_chef_id'),
+        ('accepted_chef_name', 'accepted_chef__full_name'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+    'bids': Dataset(Bid, 'created_at', [
+        ('id', 'id'),
+        ('order_id', 'order_id'),
+        ('chef_id', 'chef_id'),
+        ('chef_name', 'chef__full_name'),
+        ('proposed_price', 'proposed_price'),
+        ('delivery_estimate_seconds', 'delivery_estimate'),
+        ('status', 'status'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+    'transactions': Dataset(Transaction, 'created_at', [
+        ('id', 'id'),
+        ('wallet_id', 'wallet_id'),
+        ('user_email', 'wallet__user__email'),
+        ('transaction_type', 'transaction_type'),
+        ('amount', 'amount'),
+        ('description', 'description'),
+        ('created_at', 'created_at'),
+    ]),
+}
+
+
+def parse_bound(value, end=False):
+    """
+    A date or datetime filter value. A bare `until` date includes that
+    whole day. Raises ValueError for anything unparseable.
+    """
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"'{value}' is not a date or datetime.")
+        moment = datetime.datetime.combine(day + timedelta(days=1) if end else day, datetime.time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def export_queryset(dataset, since=None, until=None):
+    spec = DATASETS[dataset]
+    queryset = spec.model.objects.all()
+    if since is not None:
+        queryset = queryset.filter(**{f'{spec.date_field}__gte': since})
+    if until is not None:
+        queryset = queryset.filter(**{f'{spec.date_field}__lt': until})
+    # Ordered by primary key so the scan follows the table, not a sort
+    return queryset.order_by('id').values_list(*(lookup for _, lookup in spec.columns))
+
+
+def plain(value):
+    # Money stays exact (strings, not floats) in both formats
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return value
+
+
+def iter_csv(rows, headers):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    count = 0
+    for row in rows:
+        writer.writerow([plain(value) for value in row])
+        count += 1
+        if count % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def iter_ndjson(rows, headers):
+    lines = []
+    for row in rows:
+        lines.append(dumps({key: plain(value) for key, value in zip(headers, row)}))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+def export_chunks(dataset, fmt, since=None, until=None):
+    """Encoded output chunks (bytes) for one export."""
+    headers = [header for header, _ in DATASETS[dataset].columns]
+    rows = export_queryset(dataset, since, until).iterator(chunk_size=CHUNK_SIZE)
+    encode = iter_csv if fmt == 'csv' else iter_ndjson
+    return encode(rows, headers)
+
+
+async def aiter_chunks(chunks):
+    """
+    Async wrapper for ASGI servers, which would otherwise read a sync
+    iterator into a list before sending it. Each chunk is produced on the
+    thread that owns the request's database connection.
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
@@ -0,0 +1,219 @@
+"""
+Faceted browsing by category and dietary tags.
+
+Each worker process keeps a bitmap index over the open orders: every order
+gets a slot (a bit position, in created_at order) and every tag an int with
+the bits of the orders carrying it. Within a facet the picked tags are ORed,
+facets are ANDed together, and int.bit_count() does the counting, so a
+browse is a few big-integer operations whatever the number of open orders.
+
+Saves in this process reach the index as they commit (api.signals). Writes
+from other workers and set-based updates (expiry) are picked up by an
+incremental refresh, at most every FACETS_REFRESH_SECONDS, of the orders
+whose updated_at moved. Bulk updates must therefore bump updated_at.
+
+Chefs are filtered with the same semantics in SQL (`filter_by_tags`).
+"""
+import bisect
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import CATEGORY_BITS, DIETARY_BITS, Order
+
+# Query parameter -> tags, and the column holding them on Order and Chef
+FACETS = {'category': CATEGORY_BITS, 'dietary': DIETARY_BITS}
+FACET_FIELDS = {'category': 'categories', 'dietary': 'dietary_tags'}
+
+MAX_PAGE_SIZE = 100
+# Slots of orders that closed are only reclaimed by a rebuild
+REBUILD_AFTER_DEAD_SLOTS = 1000
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+ROW_FIELDS = ('id', 'status', 'created_at', 'categories', 'dietary_tags')
+
+Page = namedtuple('Page', 'order_ids count facets cursor has_more')
+
+
+def parse_selection(params):
+    """{facet: [tag names]} from ?category=meat,seafood&dietary=halal. Raises ValueError."""
+    selected = {}
+    for facet, tags in FACETS.items():
+        names = [name.strip() for value in params.getlist(facet) for name in value.split(',') if name.strip()]
+        if names:
+            tags.encode(names)  # validates
+            selected[facet] = names
+    return selected
+
+
+def filter_by_tags(queryset, selected):
+    """Rows of `queryset` (Order or Chef) carrying any of the picked tags of every facet."""
+    for facet, names in selected.items():
+        field = FACET_FIELDS[facet]
+        queryset = queryset.alias(**{f'{field}_picked': F(field).bitand(FACETS[facet].encode(names))})
+        queryset = queryset.filter(**{f'{field}_picked__gt': 0})
+    return queryset
+
+
+def encode_cursor(key):
+    # Digits only, so it survives a query string unescaped
+    created_at, order_id = key
+    return f"{(created_at - EPOCH) // timedelta(microseconds=1)}_{order_id}"
+
+
+def decode_cursor(cursor):
+    micros, _, order_id = str(cursor).partition('_')
+    if not micros.lstrip('-').isdigit() or not order_id.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return EPOCH + timedelta(microseconds=int(micros)), int(order_id)
+
+
+class OrderFacetIndex:
+    """Bitmaps over the open orders; one per process, see `index` below."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.watermark = None
+        self.refreshed_at = 0.0
+        self.reset()
+
+    def reset(self):
+        self.slot_of = {}       # order id -> slot
+        self.keys = []          # slot -> (created_at, order id), ascending
+        self.slot_tags = []     # slot -> (category bits, dietary bits)
+        self.live = 0           # slots whose order is still open
+        self.dead = 0
+        self.in_order = True
+        self.bitmaps = {facet: dict.fromkeys(tags.bits, 0) for facet, tags in FACETS.items()}
+
+    def __len__(self):
+        return self.live.bit_count()
+
+    def refresh(self, force=False):
+        interval = getattr(settings, 'FACETS_REFRESH_SECONDS', 5)
+        if not force and self.in_order and time.monotonic() - self.refreshed_at < interval:
+            return
+        with self.lock:
+            if not force and self.in_order and time.monotonic() - self.refreshed_at < interval:
+                return  # another thread refreshed while this one waited
+            started = timezone.now()
+            rebuild = (self.watermark is None or not self.in_order
+                       or self.dead > max(REBUILD_AFTER_DEAD_SLOTS, len(self)))
+            if not rebuild:
+                self.load(Order.objects.filter(updated_at__gte=self.watermark))
+                # Deletes leave no updated_at behind; a count mismatch means one happened.
+                # An order older than the newest slot can't be paged in place either.
+                rebuild = not self.in_order or len(self) != Order.objects.filter(status='open').count()
+            if rebuild:
+                self.reset()
+                self.load(Order.objects.filter(status='open'))
+            # Taken before the queries ran, so concurrent changes are re-read next time
+            self.watermark = started
+            self.refreshed_at = time.monotonic()
+
+    def load(self, queryset):
+        for row in queryset.order_by('created_at', 'id').values_list(*ROW_FIELDS):
+            self.apply(*row)
+
+    def apply(self, order_id, status, created_at, categories, dietary_tags):
+        slot = self.slot_of.get(order_id)
+        if status != 'open':
+            if slot is not None:
+                self.discard(order_id)
+            return
+        if slot is None:
+            key = (created_at, order_id)
+            if self.keys and key < self.keys[-1]:
+                self.in_order = False  # rebuilt on the next refresh
+            slot = len(self.keys)
+            self.slot_of[order_id] = slot
+            self.keys.append(key)
+            self.slot_tags.append((0, 0))
+            self.live |= 1 << slot
+        self.set_tags(slot, (categories, dietary_tags))
+
+    def set_tags(self, slot, tag_bits):
+        bit = 1 << slot
+        for facet, old, new in zip(FACETS, self.slot_tags[slot], tag_bits):
+            bitmaps = self.bitmaps[facet]
+            for name, tag_bit in FACETS[facet].bits.items():
+                if (old ^ new) & tag_bit:
+                    bitmaps[name] ^= bit
+        self.slot_tags[slot] = tag_bits
+
+    def discard(self, order_id):
+        slot = self.slot_of.pop(order_id)
+        self.set_tags(slot, (0, 0))
+        self.live &= ~(1 << slot)
+        self.dead += 1
+
+    def order_saved(self, order):
+        with self.lock:
+            if self.watermark is not None:  # otherwise the first refresh reads it
+                self.apply(order.id, order.status, order.created_at, order.categories, order.dietary_tags)
+
+    def order_deleted(self, order_id):
+        with self.lock:
+            if order_id in self.slot_of:
+                self.discard(order_id)
+
+    def browse(self, selected, before=None, limit=30):
+        """
+        A Page of open orders matching `selected` ({facet: [tag names]}),
+        newest first and older than the `before` key when given. Facet counts
+        cover all matches, each facet ignoring its own selection, so picking
+        "meat" still shows how many orders are "seafood".
+        """
+        with self.lock:
+            masks = {}
+            for facet, names in selected.items():
+                mask = 0
+                for name in names:
+                    mask |= self.bitmaps[facet][name]
+                masks[facet] = mask
+
+            counts = {}
+            for facet, bitmaps in self.bitmaps.items():
+                base = self.live
+                for other, mask in masks.items():
+                    if other != facet:
+                        base &= mask
+                counts[facet] = {name: (base & bitmap).bit_count() for name, bitmap in bitmaps.items()}
+
+            matched = self.live
+            for mask in masks.values():
+                matched &= mask
+            count = matched.bit_count()
+            if before is not None:
+                matched &= (1 << bisect.bisect_left(self.keys, before)) - 1
+
+            # Highest slots are the newest orders; one extra tells whether another page exists
+            slots = []
+            while matched and len(slots) <= limit:
+                slot = matched.bit_length() - 1
+                matched ^= 1 << slot
+                slots.append(slot)
+            has_more = len(slots) > limit
+            slots = slots[:limit]
+            return Page(
+                [self.keys[slot][1] for slot in slots], count, counts,
+                encode_cursor(self.keys[slots[-1]]) if has_more else None, has_more,
+            )
+
+
+index = OrderFacetIndex()
+
+
+def browse_open_orders(selected, cursor=None, limit=None):
+    """Raises ValueError for a malformed cursor or limit."""
+    page_size = getattr(settings, 'FACETS_PAGE_SIZE', 30)
+    limit = max(1, min(int(limit or page_size), MAX_PAGE_SIZE))
+    before = decode_cursor(cursor) if cursor else None
+    index.refresh()
+    return index.browse(selected, before, limit)
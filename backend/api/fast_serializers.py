@@ -0,0 +1,190 @@
+"""
+Precompiled read-only serializers for large list responses.
+
+Each class reproduces the output of a DRF serializer in `api.serializers`
+from a single `.values_list()` query: related and computed fields come from
+joins and subquery annotations, and every column is converted with the
+`to_representation` of the matching DRF field, looked up once per class.
+That skips per-row field binding, attribute traversal and per-object
+queries while producing the same JSON.
+"""
+from collections import namedtuple
+
+from django.core.files.storage import default_storage
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from accounts.models import Bid
+from .images import variant_urls
+from .metrics import serialization_timer
+from .serializers import BidSerializer, OrderSerializer, TransactionSerializer, chef_bid_stats
+
+# key: output key; lookups: values_list() paths passed to convert;
+# omit_if_null: drop the key when the value is None, matching DRF's SkipField
+# behaviour for dotted sources through a null relation
+Column = namedtuple('Column', 'key lookups convert omit_if_null', defaults=(False,))
+
+
+def drf_converter(serializer_fields, key):
+    to_representation = serializer_fields[key].to_representation
+    return lambda value: None if value is None else to_representation(value)
+
+
+def raw(value):
+    return value
+
+
+class FastSerializer:
+    serializer_class = None
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        fields = self.get_drf_fields()
+        self.columns = self.get_columns(fields)
+        assert [column.key for column in self.columns] == list(fields), (
+            f"{type(self).__name__} is out of sync with {self.serializer_class.__name__}"
+        )
+        self.lookups = [lookup for column in self.columns for lookup in column.lookups]
+        plan, position = [], 0
+        for column in self.columns:
+            width = len(column.lookups)
+            plan.append((column.key, position, width, column.convert, column.omit_if_null))
+            position += width
+        self.plan = plan
+
+    @classmethod
+    def get_drf_fields(cls):
+        # Field introspection happens once per class, not once per request
+        if '_drf_fields' not in cls.__dict__:
+            cls._drf_fields = cls.serializer_class().fields
+        return cls._drf_fields
+
+    def get_columns(self, fields):
+        raise NotImplementedError
+
+    def get_annotations(self):
+        return {}
+
+    def prepare(self, rows):
+        """Hook to load per-batch lookup tables before rows are converted."""
+
+    def serialize(self, queryset):
+        rows = list(queryset.annotate(**self.get_annotations()).values_list(*self.lookups))
+        self.prepare(rows)
+        plan = self.plan
+        with serialization_timer():
+            data = []
+            for row in rows:
+                item = {}
+                for key, position, width, convert, omit_if_null in plan:
+                    if width == 1:
+                        value = convert(row[position])
+                    else:
+                        value = convert(*row[position:position + width])
+                    if value is None and omit_if_null:
+                        continue
+                    item[key] = value
+                data.append(item)
+        return data
+
+
+class FastTransactionSerializer(FastSerializer):
+    """Same output as TransactionSerializer(many=True)."""
+    serializer_class = TransactionSerializer
+
+    def get_columns(self, fields):
+        return [Column(key, (key,), drf_converter(fields, key)) for key in fields]
+
+
+class FastBidSerializer(FastSerializer):
+    """Same output as BidSerializer(many=True), without per-bid chef queries."""
+    serializer_class = BidSerializer
+
+    def prepare(self, rows):
+        # Chef rating and accepted order count are per chef, not per bid, so
+        # they are aggregated once for the chefs present in this batch
+        position = self.lookups.index('chef_id')
+        self.chef_ratings, self.chef_order_counts = chef_bid_stats({row[position] for row in rows})
+
+    def get_columns(self, fields):
+        chef_rating = fields['chef_rating'].to_representation
+        return [
+            Column('id', ('id',), raw),
+            Column('chef_name', ('chef__full_name',), drf_converter(fields, 'chef_name')),
+            # Chef.rating rounds the average before the FloatField sees it
+            Column('chef_rating', ('chef_id',),
+                   lambda chef_id: chef_rating(round(self.chef_ratings.get(chef_id) or 0, 1))),
+            Column('chef_order_count', ('chef_id',), lambda chef_id: self.chef_order_counts.get(chef_id, 0)),
+            Column('proposed_price', ('proposed_price',), drf_converter(fields, 'proposed_price')),
+            Column('delivery_estimate', ('delivery_estimate',), drf_converter(fields, 'delivery_estimate')),
+            Column('message', ('message',), drf_converter(fields, 'message')),
+            Column('status', ('status',), drf_converter(fields, 'status')),
+            Column('created_at', ('created_at',), drf_converter(fields, 'created_at')),
+            Column('updated_at', ('updated_at',), drf_converter(fields, 'updated_at')),
+            Column('order', ('order_id',), raw),
+            Column('chef', ('chef_id',), raw),
+        ]
+
+
+class FastOrderSerializer(FastSerializer):
+    """Same output as OrderSerializer(many=True), including the nested review."""
+    serializer_class = OrderSerializer
+
+    def get_annotations(self):
+        return {
+            '_total_bids': Coalesce(Subquery(
+                Bid.objects.filter(order=OuterRef('pk'))
+                .values('order').annotate(total=Count('*')).values('total'),
+                output_field=IntegerField(),
+            ), 0),
+        }
+
+    def get_columns(self, fields):
+        review_fields = fields['review'].fields
+        review_columns = [
+            ('id', 'review__id', raw),
+            ('order', 'review__order_id', raw),
+            ('customer', 'review__customer_id', raw),
+            ('rating', 'review__rating', drf_converter(review_fields, 'rating')),
+            ('comment', 'review__comment', drf_converter(review_fields, 'comment')),
+            ('created_at', 'review__created_at', drf_converter(review_fields, 'created_at')),
+            ('updated_at', 'review__updated_at', drf_converter(review_fields, 'updated_at')),
+            ('accepted_chef', 'review__chef__user_id', drf_converter(review_fields, 'accepted_chef')),
+            ('customer_name', 'review__customer__full_name', drf_converter(review_fields, 'customer_name')),
+        ]
+
+        def review(*values):
+            if values[0] is None:
+                return None
+            return {key: convert(value) for (key, _, convert), value in zip(review_columns, values)}
+
+        request = self.context.get('request')
+
+        def image(name):
+            if not name:
+                return None
+            url = default_storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+
+        return [
+            Column('id', ('id',), raw),
+            Column('customer_name', ('customer__full_name',), drf_converter(fields, 'customer_name')),
+            Column('total_bids', ('_total_bids',), raw),
+            Column('accepted_chef', ('accepted_chef__user_id',), drf_converter(fields, 'accepted_chef'), True),
+            Column('accepted_chef_name', ('accepted_chef__full_name',), drf_converter(fields, 'accepted_chef_name'), True),
+            Column('review', tuple(lookup for _, lookup, _ in review_columns), review),
+            Column('image_variants', ('image_asset__variants',), lambda v: None if v is None else variant_urls(v)),
+            Column('categories', ('categories',), drf_converter(fields, 'categories')),
+            Column('dietary_tags', ('dietary_tags',), drf_converter(fields, 'dietary_tags')),
+            Column('title', ('title',), drf_converter(fields, 'title')),
+            Column('description', ('description',), drf_converter(fields, 'description')),
+            Column('max_budget', ('max_budget',), drf_converter(fields, 'max_budget')),
+            Column('delivery_address', ('delivery_address',), drf_converter(fields, 'delivery_address')),
+            Column('preferred_delivery_time', ('preferred_delivery_time',), drf_converter(fields, 'preferred_delivery_time')),
+            Column('image', ('image',), image),
+            Column('status', ('status',), drf_converter(fields, 'status')),
+            Column('version', ('version',), raw),
+            Column('created_at', ('created_at',), drf_converter(fields, 'created_at')),
+            Column('updated_at', ('updated_at',), drf_converter(fields, 'updated_at')),
+            Column('customer', ('customer_id',), raw),
+        ]
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from accounts.models import ImageAsset
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels for each variant served to clients.
+VARIANT_SIZES = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1600,
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+IMAGE_QUALITY = 80
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+            thread_name_prefix='image-pipeline',
+        )
+    return _executor
+
+
+def schedule_image_processing(instance, field_name, asset_field):
+    """
+    Queues variant generation for `instance.<field_name>` once the current
+    transaction commits, so the upload request returns immediately.
+    """
+    model_label = instance._meta.label
+    pk = instance.pk
+    transaction.on_commit(
+        lambda: get_executor().submit(process_image_upload, model_label, pk, field_name, asset_field)
+    )
+
+
+def process_image_upload(model_label, pk, field_name, asset_field):
+    """
+    Worker entry point: builds (or reuses) the ImageAsset for an upload and
+    links it to the owning row.
+    """
+    close_old_connections()
+    try:
+        model = apps.get_model(model_label)
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None:
+            return
+        field_file = getattr(instance, field_name)
+        if not field_file:
+            return
+        with field_file.open('rb') as f:
+            raw = f.read()
+        asset = get_or_create_asset(raw)
+        changes = {asset_field: asset}
+        if any(field.name == 'updated_at' for field in model._meta.concrete_fields):
+            # update() skips auto_now; bump it so ETags/watermarks see the variants
+            changes['updated_at'] = timezone.now()
+        # update() rather than save() so the post_save broadcast is not re-fired
+        model.objects.filter(pk=pk, **{field_name: field_file.name}).update(**changes)
+        caching.bump(*caching.tags_for(instance))
+    except Exception:
+        logger.exception("Image processing failed for %s #%s", model_label, pk)
+    finally:
+        close_old_connections()
+
+
+def get_or_create_asset(raw):
+    """
+    Returns the ImageAsset for these bytes, generating variants only the
+    first time a given content hash is seen.
+    """
+    content_hash = hashlib.sha256(raw).hexdigest()
+    asset = ImageAsset.objects.filter(content_hash=content_hash).first()
+    if asset is not None:
+        return asset
+
+    width, height, variants = build_variants(raw, content_hash)
+    try:
+        return ImageAsset.objects.create(
+            content_hash=content_hash, width=width, height=height, variants=variants
+        )
+    except IntegrityError:
+        # Another worker processed the same content concurrently
+        return ImageAsset.objects.get(content_hash=content_hash)
+
+
+def build_variants(raw, content_hash):
+    """
+    Decodes the upload once and writes every size/format combination.
+    Re-encoding without exif/icc info strips the original metadata.
+    """
+    with Image.open(BytesIO(raw)) as original:
+        image = ImageOps.exif_transpose(original)
+        width, height = image.size
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        variants = {}
+        for name, max_edge in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+            variants[name] = {}
+            for ext, (pil_format, _) in VARIANT_FORMATS.items():
+                frame = resized.convert('RGB') if pil_format == 'JPEG' else resized
+                buffer = BytesIO()
+                frame.save(buffer, format=pil_format, quality=IMAGE_QUALITY, optimize=True)
+                path = f"images/{content_hash[:2]}/{content_hash}/{name}.{ext}"
+                if not default_storage.exists(path):
+                    path = default_storage.save(path, ContentFile(buffer.getvalue()))
+                variants[name][ext] = path
+    return width, height, variants
+
+
+def image_variant_urls(asset):
+    """
+    {"thumbnail": {"webp": url, "jpeg": url}, "card": {...}, "full": {...}}
+    or None while the upload is still being processed.
+    """
+    if asset is None:
+        return None
+    return variant_urls(asset.variants)
+
+
+def variant_urls(variants):
+    """Storage URLs for an ImageAsset.variants mapping."""
+    return {
+        name: {ext: default_storage.url(path) for ext, path in formats.items()}
+        for name, formats in variants.items()
+    }
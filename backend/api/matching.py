@@ -0,0 +1,255 @@
+"""
+Chef matching for new orders.
+
+Each worker process keeps every chef's matching features in NumPy columns:
+location, delivery radius, smoothed rating, last bid time, number of orders
+in progress, and an inverted index of specialty words. Matching one order is
+a handful of vectorized operations over those columns plus an argpartition
+for the top N, so it stays in the milliseconds with tens of thousands of chefs.
+
+The columns are loaded once and then refreshed incrementally: every
+MATCHING_REFRESH_SECONDS, chefs touched since the last refresh (their own
+row, or a review, bid or accepted order pointing at them) are re-read and
+patched in place. Bulk updates must therefore bump updated_at; deleted chefs
+show up as a row-count mismatch and trigger a full reload.
+"""
+import math
+import re
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from accounts.models import Bid, Chef, Order, Review
+from .ranking import PRIOR_RATING, PRIOR_REVIEWS
+
+COMPONENTS = ('specialty', 'distance', 'rating', 'activity', 'workload')
+DEFAULT_WEIGHTS = {'specialty': 0.35, 'distance': 0.2, 'rating': 0.2, 'activity': 0.15, 'workload': 0.1}
+
+# Activity score halves for every week since the chef's last bid
+ACTIVITY_HALF_LIFE_DAYS = 7
+# Score used for distance when the chef or the customer has no location
+UNKNOWN_DISTANCE_SCORE = 0.5
+EARTH_RADIUS_KM = 6371.0
+# Above this many changed chefs a refresh reloads everything
+FULL_RELOAD_THRESHOLD = 5000
+
+WORD_RE = re.compile(r'[a-z]{3,}')
+
+Match = namedtuple('Match', 'chef_id user_id score breakdown')
+
+
+def tokenize(text):
+    return set(WORD_RE.findall((text or '').lower()))
+
+
+def get_weights():
+    return getattr(settings, 'CHEF_MATCHING_WEIGHTS', None) or DEFAULT_WEIGHTS
+
+
+class ChefIndex:
+    """In-memory chef feature matrix; one per process, see `index` below."""
+
+    FLOAT_COLUMNS = ('lat', 'lng', 'radius', 'rating', 'last_active', 'workload', 'token_count')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.watermark = None
+        self.refreshed_at = 0.0
+        self.reset()
+
+    def reset(self):
+        self.chef_ids = np.empty(0, dtype=np.int64)
+        self.user_ids = np.empty(0, dtype=np.int64)
+        self.columns = {name: np.empty(0) for name in self.FLOAT_COLUMNS}
+        self.row_of = {}        # chef id -> row
+        self.row_tokens = []    # row -> specialty words
+        self.postings = {}      # word -> set of rows
+        self.posting_arrays = {}
+
+    def __len__(self):
+        return len(self.chef_ids)
+
+    def refresh(self, force=False):
+        interval = getattr(settings, 'MATCHING_REFRESH_SECONDS', 30)
+        if not force and time.monotonic() - self.refreshed_at < interval:
+            return
+        with self.lock:
+            if not force and time.monotonic() - self.refreshed_at < interval:
+                return  # another thread refreshed while this one waited
+            started = timezone.now()
+            changed = None if self.watermark is None else self.changed_since(self.watermark)
+            rebuild = changed is None or len(changed) > FULL_RELOAD_THRESHOLD
+            if not rebuild:
+                if changed:
+                    self.load(changed)
+                # Deletes leave no updated_at behind; a count mismatch means one happened
+                rebuild = len(self.row_of) != Chef.objects.count()
+            if rebuild:
+                self.reset()
+                self.load()
+            # Taken before the queries ran, so concurrent changes are re-read next time
+            self.watermark = started
+            self.refreshed_at = time.monotonic()
+
+    def changed_since(self, since):
+        changed = set(Chef.objects.filter(updated_at__gte=since).values_list('id', flat=True))
+        changed.update(Review.objects.filter(updated_at__gte=since).values_list('chef_id', flat=True))
+        changed.update(Bid.objects.filter(updated_at__gte=since).values_list('chef_id', flat=True))
+        changed.update(
+            Order.objects.filter(updated_at__gte=since, accepted_chef__isnull=False)
+            .values_list('accepted_chef_id', flat=True)
+        )
+        return changed
+
+    def load(self, chef_ids=None):
+        """(Re)reads features for `chef_ids`, or for every chef when None."""
+        def scoped(queryset, field):
+            return queryset if chef_ids is None else queryset.filter(**{f'{field}__in': chef_ids})
+
+        chefs = list(scoped(Chef.objects.all(), 'id').values_list(
+            'id', 'user_id', 'specialty', 'location_lat', 'location_lng', 'delivery_radius_km'))
+        reviews = dict(
+            (chef_id, (total, count)) for chef_id, total, count in
+            scoped(Review.objects.all(), 'chef_id').values('chef')
+            .annotate(total=Sum('rating'), count=Count('id')).values_list('chef', 'total', 'count')
+        )
+        last_bids = dict(
+            scoped(Bid.objects.all(), 'chef_id').values('chef')
+            .annotate(last=Max('created_at')).values_list('chef', 'last')
+        )
+        workloads = dict(
+            scoped(Order.objects.filter(status__in=['accepted', 'preparing']), 'accepted_chef_id')
+            .values('accepted_chef').annotate(active=Count('id')).values_list('accepted_chef', 'active')
+        )
+
+        new_rows = {'chef_ids': [], 'user_ids': [], **{name: [] for name in self.FLOAT_COLUMNS}}
+        for chef_id, user_id, specialty, lat, lng, radius in chefs:
+            total, count = reviews.get(chef_id, (0, 0))
+            last_bid = last_bids.get(chef_id)
+            tokens = tokenize(specialty)
+            values = {
+                'lat': math.nan if lat is None else float(lat),
+                'lng': math.nan if lng is None else float(lng),
+                'radius': float(radius),
+                'rating': (total + PRIOR_RATING * PRIOR_REVIEWS) / (count + PRIOR_REVIEWS),
+                'last_active': 0.0 if last_bid is None else last_bid.timestamp(),
+                'workload': float(workloads.get(chef_id, 0)),
+                'token_count': float(len(tokens)),
+            }
+            row = self.row_of.get(chef_id)
+            if row is None:
+                row = len(self.chef_ids) + len(new_rows['chef_ids'])
+                self.row_of[chef_id] = row
+                self.row_tokens.append(set())
+                new_rows['chef_ids'].append(chef_id)
+                new_rows['user_ids'].append(user_id)
+                for name, value in values.items():
+                    new_rows[name].append(value)
+            else:
+                for name, value in values.items():
+                    self.columns[name][row] = value
+            self.index_tokens(row, tokens)
+
+        if new_rows['chef_ids']:
+            self.chef_ids = np.concatenate([self.chef_ids, np.array(new_rows['chef_ids'], dtype=np.int64)])
+            self.user_ids = np.concatenate([self.user_ids, np.array(new_rows['user_ids'], dtype=np.int64)])
+            for name in self.FLOAT_COLUMNS:
+                self.columns[name] = np.concatenate([self.columns[name], np.array(new_rows[name], dtype=float)])
+
+    def index_tokens(self, row, tokens):
+        old = self.row_tokens[row]
+        for token in old - tokens:
+            self.postings[token].discard(row)
+            self.posting_arrays.pop(token, None)
+        for token in tokens - old:
+            self.postings.setdefault(token, set()).add(row)
+            self.posting_arrays.pop(token, None)
+        self.row_tokens[row] = tokens
+
+    def posting(self, token):
+        rows = self.posting_arrays.get(token)
+        if rows is None:
+            rows = np.fromiter(self.postings.get(token, ()), dtype=np.int64)
+            self.posting_arrays[token] = rows
+        return rows
+
+    def score(self, text, lat=None, lng=None, now=None):
+        """
+        Component scores for every chef as {name: array}, plus a boolean mask
+        of chefs allowed to take the order (within their delivery radius).
+        """
+        cols = self.columns
+        size = len(self)
+
+        # Share of the chef's specialty words that appear in the order
+        hits = np.zeros(size)
+        for token in tokenize(text):
+            hits[self.posting(token)] += 1
+        specialty = np.divide(hits, cols['token_count'], out=np.zeros(size), where=cols['token_count'] > 0)
+
+        eligible = np.ones(size, dtype=bool)
+        distance = np.full(size, UNKNOWN_DISTANCE_SCORE)
+        if lat is not None and lng is not None:
+            known = ~np.isnan(cols['lat'])
+            lat1, lng1 = math.radians(lat), math.radians(lng)
+            lat2, lng2 = np.radians(cols['lat'][known]), np.radians(cols['lng'][known])
+            a = (np.sin((lat2 - lat1) / 2) ** 2
+                 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+            km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+            radius = cols['radius'][known]
+            distance[known] = np.clip(1 - km / np.maximum(radius, 1), 0, 1)
+            eligible[known] = km <= radius
+
+        now = (now or timezone.now()).timestamp()
+        idle_days = (now - cols['last_active']) / 86400
+        activity = np.where(cols['last_active'] > 0, 0.5 ** (idle_days / ACTIVITY_HALF_LIFE_DAYS), 0.0)
+
+        return {
+            'specialty': specialty,
+            'distance': distance,
+            'rating': np.clip(cols['rating'] / 5, 0, 1),
+            'activity': activity,
+            'workload': 1 / (1 + cols['workload']),
+        }, eligible
+
+    def top(self, text, limit, lat=None, lng=None, now=None):
+        """The `limit` best eligible chefs as Matches, best first."""
+        with self.lock:
+            if not len(self) or limit <= 0:
+                return []
+            parts, eligible = self.score(text, lat, lng, now)
+            weights = get_weights()
+            total = sum(weights[name] * parts[name] for name in COMPONENTS)
+            total = np.where(eligible, total, -np.inf)
+
+            limit = min(limit, int(eligible.sum()))
+            if not limit:
+                return []
+            best = np.argpartition(-total, limit - 1)[:limit]
+            best = best[np.argsort(-total[best], kind='stable')]
+            return [
+                Match(
+                    int(self.chef_ids[row]), int(self.user_ids[row]), round(float(total[row]), 4),
+                    {name: round(float(parts[name][row]), 4) for name in COMPONENTS},
+                )
+                for row in best
+            ]
+
+
+index = ChefIndex()
+
+
+def match_chefs(order, limit=None):
+    """The chefs best suited to a new `order`, best first."""
+    if limit is None:
+        limit = getattr(settings, 'MATCHING_TOP_N', 20)
+    index.refresh()
+    customer = order.customer
+    lat = None if customer.location_lat is None else float(customer.location_lat)
+    lng = None if customer.location_lng is None else float(customer.location_lng)
+    return index.top(f'{order.title} {order.description}', limit, lat, lng)
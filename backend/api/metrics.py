@@ -0,0 +1,256 @@
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Upper bounds (seconds) of the latency histogram buckets, Prometheus style
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestStats:
+    """Counters for the request currently being handled."""
+    __slots__ = ('db_queries', 'db_time', 'serialization_time', 'serialization_depth')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.serialization_depth = 0
+
+
+class RouteMetrics:
+    """Running totals for one URL pattern."""
+    __slots__ = ('count', 'buckets', 'latency_sum', 'db_queries', 'db_time',
+                 'serialization_time', 'response_bytes')
+
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        # name -> [hits, misses] for api.caching
+        self._cache = {}
+
+    def observe(self, route, latency, stats, response_bytes):
+        with self._lock:
+            metrics = self._routes.get(route)
+            if metrics is None:
+                metrics = self._routes[route] = RouteMetrics()
+            metrics.count += 1
+            metrics.latency_sum += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    metrics.buckets[i] += 1
+                    break
+            metrics.db_queries += stats.db_queries
+            metrics.db_time += stats.db_time
+            metrics.serialization_time += stats.serialization_time
+            metrics.response_bytes += response_bytes
+
+    def observe_cache(self, name, hit):
+        with self._lock:
+            counts = self._cache.setdefault(name, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self._cache.clear()
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+
+            def family(name, kind, help_text, value_of):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for route, metrics in routes:
+                    lines.append(f'{name}{{route="{_escape(route)}"}} {value_of(metrics)}')
+
+            family('http_requests_total', 'counter', 'Requests handled per URL pattern.',
+                   lambda m: m.count)
+
+            lines.append('# HELP http_request_duration_seconds Request latency per URL pattern.')
+            lines.append('# TYPE http_request_duration_seconds histogram')
+            for route, metrics in routes:
+                label = _escape(route)
+                cumulative = 0
+                for bound, hits in zip(LATENCY_BUCKETS, metrics.buckets):
+                    cumulative += hits
+                    lines.append(f'http_request_duration_seconds_bucket{{route="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_bucket{{route="{label}",le="+Inf"}} {metrics.count}')
+                lines.append(f'http_request_duration_seconds_sum{{route="{label}"}} {metrics.latency_sum:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{route="{label}"}} {metrics.count}')
+
+            family('db_queries_total', 'counter', 'Database queries issued per URL pattern.',
+                   lambda m: m.db_queries)
+            family('db_query_duration_seconds_total', 'counter', 'Time spent in database queries per URL pattern.',
+                   lambda m: f'{m.db_time:.6f}')
+            family('serialization_duration_seconds_total', 'counter',
+                   'Time spent in serializers and response rendering per URL pattern.',
+                   lambda m: f'{m.serialization_time:.6f}')
+            family('http_response_size_bytes_total', 'counter', 'Response body bytes per URL pattern.',
+                   lambda m: m.response_bytes)
+
+            lines.append('# HELP cache_lookups_total Tag-versioned cache lookups per cached view or fragment.')
+            lines.append('# TYPE cache_lookups_total counter')
+            for name, (hits, misses) in sorted(self._cache.items()):
+                label = _escape(name)
+                lines.append(f'cache_lookups_total{{name="{label}",result="hit"}} {hits}')
+                lines.append(f'cache_lookups_total{{name="{label}",result="miss"}} {misses}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper counting queries against the active request, if any."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # Installed on every new connection, so queries run from sync_to_async
+    # threads are attributed to the request through the context variable.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+@contextmanager
+def serialization_timer():
+    """
+    Adds the enclosed time to the request's serialization total. Nested timers
+    (e.g. a serializer field inside another serializer) are only counted once.
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    stats.serialization_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialization_depth -= 1
+        if stats.serialization_depth == 0:
+            stats.serialization_time += time.perf_counter() - start
+
+
+class ProfiledSerializerMixin:
+    """Counts `to_representation` time towards the request's serialization metric."""
+
+    def to_representation(self, instance):
+        with serialization_timer():
+            return super().to_representation(instance)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records count, latency, DB queries/time, serialization time and response
+    size for each request, keyed by the matched URL pattern.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time the render as serialization
+        stats = _current.get()
+        if stats is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                stats.serialization_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _observe(self, request, response, stats, latency):
+        match = request.resolver_match
+        route = f'/{match.route}' if match else 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(route, latency, stats, size)
+
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. When METRICS_TOKEN is set, the scraper must
+    send it as `Authorization: Bearer <token>`; without one only staff
+    sessions and local scrapers are let in.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        sent = request.headers.get('Authorization', '')
+        allowed = hmac.compare_digest(sent.encode(), f'Bearer {token}'.encode())
+    else:
+        user = getattr(request, 'user', None)
+        allowed = (user is not None and user.is_staff) or request.META.get('REMOTE_ADDR') in LOCAL_ADDRESSES
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,119 @@
+"""
+Order status transitions.
+
+Every status change goes through `transition`, which is a single
+compare-and-swap UPDATE guarded by the status and version the caller read.
+Whoever loses a race gets StaleOrder instead of silently overwriting the
+winner, and no row lock is held between the read and the write.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from accounts.models import Bid, Chef, Order, Review
+from . import pricing, schedule
+from .utils import credit_chef_wallet
+
+# status -> statuses it may move to
+TRANSITIONS = {
+    'open': {'accepted', 'cancelled'},
+    'accepted': {'preparing', 'delivered', 'completed', 'cancelled'},
+    'preparing': {'delivered', 'completed', 'cancelled'},
+    'delivered': {'completed'},
+    'completed': set(),
+    'cancelled': set(),
+}
+
+
+class InvalidTransition(Exception):
+    """The order's current status does not allow the requested one."""
+
+
+class StaleOrder(Exception):
+    """The order changed since it was read (another request won the race)."""
+
+
+class ChefUnavailable(Exception):
+    """The chef has no room left around the order's delivery time (see api.schedule)."""
+
+    def __init__(self, message, conflicting_orders):
+        super().__init__(message)
+        self.conflicting_orders = conflicting_orders
+
+
+def can_transition(order, to_status):
+    return to_status in TRANSITIONS.get(order.status, ())
+
+
+def transition(order, to_status, **changes):
+    """
+    Moves `order` to `to_status` (plus any extra field `changes`) if it still
+    has the status and version it was read with. Updates the instance in
+    place and fires post_save so realtime listeners see the change.
+    """
+    if not can_transition(order, to_status):
+        raise InvalidTransition(f"Cannot move order {order.pk} from '{order.status}' to '{to_status}'.")
+
+    now = timezone.now()
+    updated = Order.objects.filter(
+        pk=order.pk, status=order.status, version=order.version
+    ).update(status=to_status, version=F('version') + 1, updated_at=now, **changes)
+    if not updated:
+        raise StaleOrder(f"Order {order.pk} was modified by another request.")
+
+    order.status = to_status
+    order.version += 1
+    order.updated_at = now
+    for field, value in changes.items():
+        setattr(order, field, value)
+    post_save.send(
+        sender=Order, instance=order, created=False, raw=False,
+        using=Order.objects.db, update_fields={'status', 'version', 'updated_at', *changes},
+    )
+    return order
+
+
+def accept_bid(bid):
+    """
+    Accepts `bid` and declines the order's other bids. The order CAS runs
+    first, so when two customers' requests race only one gets past it. The
+    chef's row lock serializes acceptances of the same chef's bids, so each
+    sees the commitments of the ones before it.
+    """
+    if bid.status != 'pending':
+        raise InvalidTransition(f"Bid {bid.pk} is '{bid.status}', not pending.")
+    with transaction.atomic():
+        list(Chef.objects.select_for_update().filter(pk=bid.chef_id).values_list('pk'))
+        schedule.index.reload_chef(bid.chef_id)
+        busy_with = schedule.index.conflicts(
+            bid.chef_id, *schedule.window(bid.order.preferred_delivery_time, bid.delivery_estimate),
+            exclude_order=bid.order_id)
+        if busy_with:
+            raise ChefUnavailable(f"Chef {bid.chef_id} is fully booked around order {bid.order_id}.", busy_with)
+        order = transition(bid.order, 'accepted', accepted_chef=bid.chef)
+        bid.status = 'accepted'
+        bid.save(update_fields=['status', 'updated_at'])
+        Bid.objects.filter(order=order).exclude(id=bid.id).update(status='declined', updated_at=timezone.now())
+        pricing.record_accepted(order, bid.proposed_price)
+    return order
+
+
+def fulfill(order):
+    return transition(order, 'delivered')
+
+
+def complete(order, accepted_bid):
+    """
+    Completes the order and pays the chef. The wallet credit shares the CAS's
+    transaction, so an order can only ever be paid out once.
+    """
+    with transaction.atomic():
+        transition(order, 'completed')
+        result = credit_chef_wallet(accepted_bid.chef.user, accepted_bid.proposed_price, order.id)
+        review, _ = Review.objects.get_or_create(
+            order=order,
+            customer=order.customer,
+            chef=accepted_bid.chef
+        )
+    return result, review
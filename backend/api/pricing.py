@@ -0,0 +1,204 @@
+"""
+Suggested bid prices from quantile sketches of accepted prices.
+
+Every accepted bid's price is added, in the accepting transaction, to the
+PriceSketch rows of the order's market segments: its food categories, its
+region (the customer's location on a REGION_GRID_DEGREES grid) and its
+budget band (PRICING_BUDGET_BANDS), at several levels of detail. A
+suggestion reads the sketches of the most specific level holding at least
+PRICING_MIN_SAMPLES prices and returns their quartiles, so answering costs
+the same whatever the bid history's size.
+
+The sketches are DDSketches: counts in log-spaced buckets, so every
+quantile is within RELATIVE_ACCURACY of a real accepted price, sketches of
+several categories merge by adding counts, and a segment's size is bounded
+by the price range, not the number of prices. Changing RELATIVE_ACCURACY
+needs `manage.py rebuild_price_sketches`.
+"""
+import bisect
+import math
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from accounts.models import CATEGORY_BITS, ArchivedBid, Bid, PriceSketch
+from . import caching
+
+RELATIVE_ACCURACY = 0.01
+# Far more than prices between 1 and 10^8 need at 1%; only bounds bad input
+MAX_BINS = 2048
+REGION_GRID_DEGREES = 0.5
+DEFAULT_BUDGET_BANDS = [500, 1000, 2000, 5000, 10000, 20000]
+QUARTILES = (0.25, 0.5, 0.75)
+
+
+class QuantileSketch:
+    """A DDSketch over positive values."""
+
+    gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    log_gamma = math.log(gamma)
+
+    def __init__(self, bins=None, count=0):
+        self.bins = {int(index): weight for index, weight in (bins or {}).items()}
+        self.count = count
+
+    def add(self, value, weight=1):
+        if value <= 0:
+            raise ValueError(f"Sketch values must be positive, got {value}")
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + weight
+        self.count += weight
+        self.collapse()
+
+    def merge(self, other):
+        for index, weight in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + weight
+        self.count += other.count
+        self.collapse()
+
+    def collapse(self):
+        # Folds the lowest buckets together: only low quantiles lose accuracy
+        while len(self.bins) > MAX_BINS:
+            lowest, second = sorted(self.bins)[:2]
+            self.bins[second] += self.bins.pop(lowest)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        running = 0
+        for index in sorted(self.bins):
+            running += self.bins[index]
+            if running > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return None
+
+    def to_json(self):
+        return {str(index): weight for index, weight in self.bins.items()}
+
+
+# Segments
+
+def region_of(customer):
+    if customer.location_lat is None or customer.location_lng is None:
+        return None
+    def cell(degrees):
+        return math.floor(float(degrees) / REGION_GRID_DEGREES) * REGION_GRID_DEGREES
+    return f"{cell(customer.location_lat):g},{cell(customer.location_lng):g}"
+
+
+def budget_band(max_budget):
+    edges = getattr(settings, 'PRICING_BUDGET_BANDS', DEFAULT_BUDGET_BANDS)
+    position = bisect.bisect_right(edges, max_budget)
+    low = edges[position - 1] if position else 0
+    return f"{low}-{edges[position]}" if position < len(edges) else f"{low}+"
+
+
+def segment_levels(order):
+    """[(basis, [sketch keys])], most specific first. An order counts in every category it has."""
+    categories = CATEGORY_BITS.decode(order.categories)
+    region = region_of(order.customer)
+    band = budget_band(order.max_budget)
+    levels = []
+    if categories and region:
+        levels.append(('category, region and budget',
+                       [f'cat:{category}|region:{region}|band:{band}' for category in categories]))
+    if categories:
+        levels.append(('category and budget', [f'cat:{category}|band:{band}' for category in categories]))
+    if region:
+        levels.append(('region and budget', [f'region:{region}|band:{band}']))
+    levels.append(('budget', [f'band:{band}']))
+    levels.append(('all orders', ['all']))
+    return levels
+
+
+def sketch_tag(key):
+    return f'pricing:{key}'
+
+
+# Writes
+
+def record_accepted(order, price):
+    """
+    Adds an accepted price to the order's sketches. Call inside the accepting
+    transaction. Free (zero priced) bids are accepted but not sketched.
+    """
+    if price <= 0:
+        return
+    keys = sorted({key for _, keys in segment_levels(order) for key in keys})
+    with transaction.atomic():
+        # Created empty first, so concurrent first writers can't both insert
+        PriceSketch.objects.bulk_create([PriceSketch(key=key) for key in keys], ignore_conflicts=True)
+        rows = list(PriceSketch.objects.select_for_update().filter(key__in=keys).order_by('key'))
+        for row in rows:
+            sketch = QuantileSketch(row.bins, row.count)
+            sketch.add(float(price))
+            row.bins, row.count = sketch.to_json(), sketch.count
+        PriceSketch.objects.bulk_update(rows, ['bins', 'count', 'updated_at'])
+        caching.bump(*(sketch_tag(key) for key in keys))
+
+
+def rebuild():
+    """Recomputes every sketch from the accepted bids, hot and archived. Returns the number of prices."""
+    sketches = {}
+    accepted = [
+        model.objects.filter(status='accepted', proposed_price__gt=0).select_related('order__customer')
+        for model in (Bid, ArchivedBid)
+    ]
+    total = 0
+    for queryset in accepted:
+        for bid in queryset.iterator(chunk_size=2000):
+            for _, keys in segment_levels(bid.order):
+                for key in keys:
+                    sketches.setdefault(key, QuantileSketch()).add(float(bid.proposed_price))
+            total += 1
+    with transaction.atomic():
+        stale = list(PriceSketch.objects.exclude(key__in=sketches).values_list('key', flat=True))
+        PriceSketch.objects.all().delete()
+        PriceSketch.objects.bulk_create([
+            PriceSketch(key=key, bins=sketch.to_json(), count=sketch.count) for key, sketch in sketches.items()
+        ], batch_size=500)
+        caching.bump(*(sketch_tag(key) for key in [*sketches, *stale]))
+    return total
+
+
+# Reads
+
+def _money(value):
+    return str(Decimal(value).quantize(Decimal('0.01')))
+
+
+def suggest(order):
+    """
+    The low/median/high quartiles of accepted prices for orders like `order`
+    (capped at its max_budget), or None before any bid was ever accepted.
+    """
+    min_samples = getattr(settings, 'PRICING_MIN_SAMPLES', 20)
+    levels = segment_levels(order)
+    keys = [key for _, level_keys in levels for key in level_keys]
+
+    def compute():
+        found = {row.key: row for row in PriceSketch.objects.filter(key__in=keys)}
+        for basis, level_keys in levels:
+            sketch = QuantileSketch()
+            for key in level_keys:
+                if key in found:
+                    sketch.merge(QuantileSketch(found[key].bins, found[key].count))
+            if sketch.count >= min_samples:
+                break
+        # Short of samples everywhere, the broadest level (the last one) answers
+        if not sketch.count:
+            return None
+        cap = float(order.max_budget)
+        low, median, high = (min(sketch.quantile(q), cap) for q in QUARTILES)
+        return {
+            'low': _money(low),
+            'median': _money(median),
+            'high': _money(high),
+            'samples': sketch.count,
+            'basis': basis,
+        }
+
+    return caching.cached_fragment(
+        'price_suggestion', [sketch_tag(key) for key in keys], compute, vary=(keys, str(order.max_budget)))
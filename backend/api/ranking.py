@@ -0,0 +1,245 @@
+"""
+Bid ranking for customers choosing among many bids.
+
+Every pending bid gets a score in [0, 1], a weighted sum of four components:
+
+- price: share of the order's max_budget the bid leaves unspent
+- delivery: 1 when the delivery_estimate fits before preferred_delivery_time
+  (counted from when the bid was placed), falling to 0 at
+  LATE_TOLERANCE_HOURS late
+- rating: the chef's review average, smoothed towards PRIOR_RATING
+- completion: share of the chef's finished orders that were completed
+  rather than cancelled, Laplace-smoothed
+
+A score depends only on its own bid and chef, never on the other bids, so a
+new bid is slotted into an order's cached ranking without rescoring the rest.
+Chef features are precomputed per chef and cached until a review or order
+change invalidates them (see api.signals).
+
+An order's ranking is cached under a key built from the order's version and
+updated_at plus a caching tag that bid changes bump, so an order changed by
+another process (expire_orders) simply stops matching its old entry.
+"""
+import bisect
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from accounts.models import Bid, Order, Review
+from . import caching
+from .archive import archived_chef_counts
+
+try:
+    import numpy as np
+except ImportError:  # pure-Python scoring, same results
+    np = None
+
+COMPONENTS = ('price', 'delivery', 'rating', 'completion')
+DEFAULT_WEIGHTS = {'price': 0.35, 'delivery': 0.25, 'rating': 0.25, 'completion': 0.15}
+
+LATE_TOLERANCE_HOURS = 6
+# A chef with no reviews is treated as having two 3-star reviews
+PRIOR_RATING = 3.0
+PRIOR_REVIEWS = 2
+
+CHEF_FEATURES_TIMEOUT = 60 * 60
+# Bounds how long a chef feature change can take to reach cached rankings
+RANKING_TIMEOUT = 10 * 60
+# add_bid's per-order lock: how long a writer waits for it, and how long a
+# crashed holder can keep it
+LOCK_WAIT_SECONDS = 0.25
+LOCK_TIMEOUT = 5
+
+RankedBid = namedtuple('RankedBid', 'bid_id score breakdown')
+
+# values_list() columns a bid is scored from
+BID_COLUMNS = ('id', 'chef_id', 'proposed_price', 'delivery_estimate', 'created_at')
+
+
+def get_weights():
+    return getattr(settings, 'BID_RANKING_WEIGHTS', None) or DEFAULT_WEIGHTS
+
+
+def chef_features_key(chef_id):
+    return f'ranking:chef:{chef_id}'
+
+
+def bids_tag(order_id):
+    return f'order:{order_id}:bids'
+
+
+def order_ranking_key(order):
+    version, = caching.versions([bids_tag(order.id)])
+    return f'ranking:order:{order.id}:{order.version}:{order.updated_at.timestamp()}:{version}'
+
+
+def chef_features(chef_ids):
+    """{chef_id: (rating, completion_rate)}, computed in a few queries for any cache misses."""
+    keys = {chef_id: chef_features_key(chef_id) for chef_id in set(chef_ids)}
+    cached = cache.get_many(keys.values())
+    features = {chef_id: cached[key] for chef_id, key in keys.items() if key in cached}
+    missing = [chef_id for chef_id in keys if chef_id not in features]
+    if not missing:
+        return features
+
+    reviews = {
+        row['chef']: row for row in
+        Review.objects.filter(chef_id__in=missing)
+        .values('chef').annotate(total=Sum('rating'), count=Count('id'))
+    }
+    orders = {
+        row['accepted_chef']: row for row in
+        Order.objects.filter(accepted_chef_id__in=missing, status__in=['completed', 'cancelled'])
+        .values('accepted_chef')
+        .annotate(finished=Count('id'), completed=Count('id', filter=Q(status='completed')))
+    }
+    archived = archived_chef_counts(missing)
+    fresh = {}
+    for chef_id in missing:
+        review = reviews.get(chef_id, {'total': 0, 'count': 0})
+        order = orders.get(chef_id, {'finished': 0, 'completed': 0})
+        completed = order['completed'] + archived[chef_id].completed
+        finished = order['finished'] + archived[chef_id].finished
+        rating = (review['total'] + PRIOR_RATING * PRIOR_REVIEWS) / (review['count'] + PRIOR_REVIEWS)
+        completion = (completed + 1) / (finished + 2)
+        fresh[chef_id] = (rating, completion)
+    cache.set_many({keys[chef_id]: value for chef_id, value in fresh.items()}, CHEF_FEATURES_TIMEOUT)
+    features.update(fresh)
+    return features
+
+
+def _clip(value, low, high):
+    return min(max(value, low), high)
+
+
+def _components(price, eta, hours_left, rating, completion, budget, clip):
+    # Works on floats (clip=_clip) and on NumPy arrays (clip=np.clip) alike
+    return {
+        'price': clip(1 - price / budget, 0.0, 1.0),
+        'delivery': clip((hours_left - eta) / LATE_TOLERANCE_HOURS + 1, 0.0, 1.0),
+        'rating': clip(rating / 5, 0.0, 1.0),
+        'completion': completion,
+    }
+
+
+def score_bids(order, rows):
+    """
+    Scores `rows` (tuples of BID_COLUMNS) for `order`.
+    Returns RankedBids in input order.
+    """
+    if not rows:
+        return []
+    features = chef_features(row[1] for row in rows)
+    budget = float(order.max_budget) or 1.0
+    deadline = order.preferred_delivery_time
+    weights = get_weights()
+
+    price = [float(row[2]) for row in rows]
+    eta = [row[3].total_seconds() / 3600 for row in rows]
+    hours_left = [(deadline - row[4]).total_seconds() / 3600 for row in rows]
+    rating = [features[row[1]][0] for row in rows]
+    completion = [features[row[1]][1] for row in rows]
+
+    if np is not None:
+        parts = _components(
+            np.array(price), np.array(eta), np.array(hours_left),
+            np.array(rating), np.array(completion), budget, np.clip,
+        )
+        totals = sum(weights[name] * parts[name] for name in COMPONENTS).tolist()
+        columns = [parts[name].tolist() for name in COMPONENTS]
+    else:
+        per_bid = [
+            _components(*values, budget, _clip)
+            for values in zip(price, eta, hours_left, rating, completion)
+        ]
+        totals = [sum(weights[name] * parts[name] for name in COMPONENTS) for parts in per_bid]
+        columns = [[parts[name] for parts in per_bid] for name in COMPONENTS]
+
+    return [
+        RankedBid(row[0], round(total, 4), {name: round(value, 4) for name, value in zip(COMPONENTS, values)})
+        for row, total, values in zip(rows, totals, zip(*columns))
+    ]
+
+
+def build_ranking(order):
+    rows = list(Bid.objects.filter(order=order, status='pending').values_list(*BID_COLUMNS))
+    ranked = score_bids(order, rows)
+    return {
+        'order': sorted((-bid.score, bid.bid_id) for bid in ranked),
+        'bids': {bid.bid_id: bid for bid in ranked},
+    }
+
+
+def order_ranking(order):
+    """
+    The order's pending bids, best first, as {'order': [(-score, bid_id)],
+    'bids': {bid_id: RankedBid}}. Cached until a bid or the order changes.
+    """
+    key = order_ranking_key(order)
+    ranking = cache.get(key)
+    if ranking is None:
+        ranking = build_ranking(order)
+        # add, not set: a ranking add_bid stored meanwhile may hold a bid this read missed
+        cache.add(key, ranking, RANKING_TIMEOUT)
+    return ranking
+
+
+def top_bids(order, k):
+    """The `k` best pending bids as RankedBids, plus the number of bids ranked."""
+    ranking = order_ranking(order)
+    return [ranking['bids'][bid_id] for _, bid_id in ranking['order'][:k]], len(ranking['order'])
+
+
+def _lock(key):
+    """Takes the cache lock `key`, waiting up to LOCK_WAIT_SECONDS. Returns whether it was taken."""
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while not cache.add(key, True, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def add_bid(bid):
+    """
+    Slots a newly placed pending bid into its order's cached ranking,
+    scoring only that bid. Writers hold a per-order cache lock around the
+    get/insort/set so concurrent bids can't overwrite each other; one that
+    can't get it drops the ranking, and the next read rebuilds it.
+    Returns (rank, RankedBid, number of bids ranked).
+    """
+    order = bid.order
+    key = order_ranking_key(order)
+    lock = f'{key}:lock'
+    if _lock(lock):
+        try:
+            ranking = cache.get(key)
+            if ranking is None:
+                # Built from the database, which already includes this bid
+                ranking = build_ranking(order)
+            elif bid.id not in ranking['bids']:
+                row = tuple(getattr(bid, column) for column in BID_COLUMNS)
+                ranked, = score_bids(order, [row])
+                bisect.insort(ranking['order'], (-ranked.score, bid.id))
+                ranking['bids'][bid.id] = ranked
+            cache.set(key, ranking, RANKING_TIMEOUT)
+        finally:
+            cache.delete(lock)
+    else:
+        discard_order(order.id)
+        ranking = order_ranking(order)
+    ranked = ranking['bids'][bid.id]
+    rank = bisect.bisect_left(ranking['order'], (-ranked.score, bid.id)) + 1
+    return rank, ranked, len(ranking['order'])
+
+
+def discard_order(order_id):
+    # Bumped again on commit, so a ranking built before then is not kept
+    caching.bump(bids_tag(order_id))
+
+
+def discard_chef(chef_id):
+    cache.delete(chef_features_key(chef_id))
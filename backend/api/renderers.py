@@ -0,0 +1,92 @@
+import datetime
+import decimal
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback, same output
+    orjson = None
+
+# Dates, times and anything orjson does not know natively (Decimal,
+# timedelta, lazy strings, querysets...) are handed to DRF's own encoder,
+# so the output matches rest_framework.renderers.JSONRenderer exactly.
+_drf_default = encoders.JSONEncoder().default
+
+
+def _datetime(obj):
+    representation = obj.isoformat()
+    if representation.endswith('+00:00'):
+        representation = representation[:-6] + 'Z'
+    return representation
+
+
+# Exact-type shortcuts for the model field types that fill order, bid and
+# transaction payloads; each mirrors the corresponding DRF encoder branch.
+_FAST_DEFAULTS = {
+    datetime.datetime: _datetime,
+    datetime.date: datetime.date.isoformat,
+    datetime.timedelta: lambda obj: str(obj.total_seconds()),
+    decimal.Decimal: float,
+}
+
+
+def _default(obj):
+    encode = _FAST_DEFAULTS.get(type(obj))
+    if encode is not None:
+        return encode(obj)
+    return _drf_default(obj)
+
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(data):
+    """
+    Compact UTF-8 JSON bytes, equivalent to DRF's JSONRenderer with the
+    default COMPACT_JSON/UNICODE_JSON settings.
+    """
+    content = None
+    if orjson is not None:
+        try:
+            content = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits; let the stdlib have a go
+            content = None
+    if content is None:
+        content = json.dumps(
+            data, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(',', ':')
+        ).encode()
+    # Keep the output a strict javascript subset, as DRF does
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+def loads(content):
+    if orjson is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass  # re-parse with the stdlib for its error message / big ints
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        content = bytes(content).decode('utf-8')
+    return json.loads(content)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer backed by orjson when installed. Indented output
+    (browsable API, `; indent=` media types) still goes through DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,226 @@
+"""
+Chef schedules: what each chef has committed to, and when.
+
+An accepted (or preparing) order occupies its chef from its
+preferred_delivery_time minus the accepted bid's delivery_estimate until
+the delivery time. A chef can work on CHEF_CONCURRENT_ORDERS orders at
+once; a bid or acceptance that would go over that is a conflict.
+
+Each worker process keeps every chef's commitments sorted by start, with
+the longest one's duration. Finding what overlaps a window is then a
+bisect to the first commitment that could reach it plus a walk over the
+ones that do, so a check costs O(log n) in the chef's history rather than
+a scan of their orders.
+
+Like api.facets, commits in this process reach the index through
+api.signals and other workers' writes through an incremental refresh, at
+most every SCHEDULE_REFRESH_SECONDS, of orders whose updated_at moved.
+Accepting a bid locks the chef and re-reads their commitments first, so
+two workers can't book the same chef's last slot at once.
+"""
+import bisect
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from accounts.models import Bid, Order
+
+ACTIVE_STATUSES = ('accepted', 'preparing')
+# For an accepted order whose accepted bid is gone (e.g. deleted in the admin)
+DEFAULT_ESTIMATE = timedelta(hours=2)
+
+Commitment = namedtuple('Commitment', 'start end order_id')
+
+
+def capacity():
+    return getattr(settings, 'CHEF_CONCURRENT_ORDERS', 2)
+
+
+def window(delivery_time, estimate):
+    """The (start, end) a chef is busy with an order due at `delivery_time`."""
+    return delivery_time - (estimate or DEFAULT_ESTIMATE), delivery_time
+
+
+def commitment_rows(queryset):
+    """(order id, chef id, status, start, end) of `queryset`'s orders."""
+    estimate = Bid.objects.filter(order=OuterRef('pk'), status='accepted').values('delivery_estimate')[:1]
+    rows = queryset.annotate(estimate=Subquery(estimate)).values_list(
+        'id', 'accepted_chef_id', 'status', 'preferred_delivery_time', 'estimate')
+    for order_id, chef_id, status, delivery_time, estimate in rows:
+        yield (order_id, chef_id, status, *window(delivery_time, estimate))
+
+
+def edges(commitments, start, end):
+    """(moment, +1 for a start / -1 for an end) of `commitments` clipped to [start, end), in time order."""
+    # Ends sort first: a commitment ending as another starts doesn't overlap it
+    return sorted([(max(c.start, start), 1) for c in commitments] + [(min(c.end, end), -1) for c in commitments])
+
+
+def peak(commitments, start, end):
+    """The most of `commitments` running at the same moment within [start, end)."""
+    running = highest = 0
+    for _, step in edges(commitments, start, end):
+        running += step
+        highest = max(highest, running)
+    return highest
+
+
+class Calendar:
+    """One chef's commitments, sorted by start."""
+
+    def __init__(self):
+        self.commitments = []
+        self.longest = timedelta(0)
+
+    def add(self, commitment):
+        bisect.insort(self.commitments, commitment)
+        self.longest = max(self.longest, commitment.end - commitment.start)
+
+    def remove(self, order_id):
+        self.commitments = [c for c in self.commitments if c.order_id != order_id]
+        # Left at an old outlier's length, overlapping() would scan from further and further back
+        self.longest = max((c.end - c.start for c in self.commitments), default=timedelta(0))
+
+    def overlapping(self, start, end):
+        # Nothing starting before start - longest can still be running at start
+        position = bisect.bisect_left(self.commitments, (start - self.longest,))
+        found = []
+        for commitment in self.commitments[position:]:
+            if commitment.start >= end:
+                break
+            if commitment.end > start:
+                found.append(commitment)
+        return found
+
+
+class ScheduleIndex:
+    """Every chef's Calendar; one per process, see `index` below."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.watermark = None
+        self.refreshed_at = 0.0
+        self.reset()
+
+    def reset(self):
+        self.calendars = {}     # chef id -> Calendar
+        self.chef_of = {}       # order id -> chef id, for the committed orders
+
+    def refresh(self, force=False):
+        interval = getattr(settings, 'SCHEDULE_REFRESH_SECONDS', 5)
+        if not force and time.monotonic() - self.refreshed_at < interval:
+            return
+        with self.lock:
+            if not force and time.monotonic() - self.refreshed_at < interval:
+                return  # another thread refreshed while this one waited
+            started = timezone.now()
+            committed = Order.objects.filter(status__in=ACTIVE_STATUSES, accepted_chef__isnull=False)
+            rebuild = self.watermark is None
+            if not rebuild:
+                self.load(Order.objects.filter(updated_at__gte=self.watermark, accepted_chef__isnull=False))
+                # Deletes leave no updated_at behind; a count mismatch means one happened
+                rebuild = len(self.chef_of) != committed.count()
+            if rebuild:
+                self.reset()
+                self.load(committed)
+            # Taken before the queries ran, so concurrent changes are re-read next time
+            self.watermark = started
+            self.refreshed_at = time.monotonic()
+
+    def reload_chef(self, chef_id):
+        """Re-reads one chef's commitments, e.g. while holding a lock on the chef."""
+        rows = list(commitment_rows(Order.objects.filter(accepted_chef_id=chef_id, status__in=ACTIVE_STATUSES)))
+        with self.lock:
+            for commitment in self.calendars.pop(chef_id, Calendar()).commitments:
+                del self.chef_of[commitment.order_id]
+            for row in rows:
+                self.apply(*row)
+
+    def load(self, queryset):
+        for row in commitment_rows(queryset):
+            self.apply(*row)
+
+    def apply(self, order_id, chef_id, status, start, end):
+        if order_id in self.chef_of:
+            self.discard(order_id)
+        if status in ACTIVE_STATUSES and chef_id is not None:
+            self.calendars.setdefault(chef_id, Calendar()).add(Commitment(start, end, order_id))
+            self.chef_of[order_id] = chef_id
+
+    def discard(self, order_id):
+        chef_id = self.chef_of.pop(order_id, None)
+        if chef_id is not None:
+            self.calendars[chef_id].remove(order_id)
+
+    def bid_accepted(self, bid):
+        order = bid.order
+        with self.lock:
+            self.apply(order.id, bid.chef_id, order.status,
+                       *window(order.preferred_delivery_time, bid.delivery_estimate))
+
+    def order_saved(self, order):
+        with self.lock:
+            if order.status not in ACTIVE_STATUSES or order.accepted_chef_id is None:
+                self.discard(order.id)
+                return
+            chef_id = self.chef_of.get(order.id)
+            if chef_id is None:
+                return  # the accepted bid's signal (or the next refresh) adds it
+            old = next(c for c in self.calendars[chef_id].commitments if c.order_id == order.id)
+            self.apply(order.id, order.accepted_chef_id, order.status,
+                       *window(order.preferred_delivery_time, old.end - old.start))
+
+    def order_deleted(self, order_id):
+        with self.lock:
+            self.discard(order_id)
+
+    def conflicts(self, chef_id, start, end, exclude_order=None):
+        """
+        Ids of the chef's orders overlapping [start, end) when taking one more
+        order there would put them over capacity, else [].
+        """
+        with self.lock:
+            calendar = self.calendars.get(chef_id)
+            overlapping = [
+                c for c in (calendar.overlapping(start, end) if calendar else [])
+                if c.order_id != exclude_order
+            ]
+        if peak(overlapping, start, end) < capacity():
+            return []
+        return [c.order_id for c in overlapping]
+
+    def agenda(self, chef_id, start, end):
+        """(commitments overlapping [start, end), [(from, to, free orders)] where the chef has room)."""
+        with self.lock:
+            calendar = self.calendars.get(chef_id)
+            overlapping = calendar.overlapping(start, end) if calendar else []
+        limit = capacity()
+        slots, running, cursor = [], 0, start
+        for moment, step in edges(overlapping, start, end) + [(end, 0)]:
+            if moment > cursor and running < limit:
+                free = limit - running
+                if slots and slots[-1][1] == cursor and slots[-1][2] == free:
+                    slots[-1] = (slots[-1][0], moment, free)
+                else:
+                    slots.append((cursor, moment, free))
+            cursor = max(cursor, moment)
+            running += step
+        return overlapping, slots
+
+
+index = ScheduleIndex()
+
+
+def conflicts(chef_id, start, end, exclude_order=None):
+    index.refresh()
+    return index.conflicts(chef_id, start, end, exclude_order)
+
+
+def agenda(chef_id, start, end):
+    index.refresh()
+    return index.agenda(chef_id, start, end)
@@ -1,8 +1,16 @@
+from django.db.models import Avg, Count, Manager, QuerySet
 from rest_framework import serializers
-from accounts.models import Customer, Chef, Order, Bid, ChatMessage, Review, Notification, Transaction
+from accounts.models import (
+    Customer, Chef, Order, Bid, ChatMessage, Review, Notification, Transaction,
+    ArchivedOrder, ArchivedChatMessage, CATEGORY_BITS, DIETARY_BITS,
+)
+from accounts.serializers import TagSetField
+from .archive import archived_chef_counts
+from .images import image_variant_urls
+from .metrics import ProfiledSerializerMixin
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source="customer.full_name", read_only=True)
     accepted_chef = serializers.CharField(source="chef.user.id")
 
@@ -10,22 +18,98 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
         fields = ['id', 'order', 'customer', 'rating', 'comment', 'created_at', 'updated_at', 'accepted_chef', 'customer_name']
         
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     customer_name = serializers.CharField(source="customer.full_name", read_only=True)
     total_bids = serializers.SerializerMethodField()
     accepted_chef = serializers.CharField(source="accepted_chef.user.id", read_only=True)
     accepted_chef_name = serializers.CharField(source="accepted_chef.full_name", read_only=True)
     review = ReviewSerializer(read_only=True)
+    image_variants = serializers.SerializerMethodField()
+    categories = TagSetField(CATEGORY_BITS, required=False)
+    dietary_tags = TagSetField(DIETARY_BITS, required=False)
 
     class Meta:
         model = Order
-        fields = '__all__'
+        exclude = ['image_asset']
 
     def get_total_bids(self, obj):
+        # Querysets from order_queryset() carry the count already
+        if hasattr(obj, 'bid_count'):
+            return obj.bid_count
         return Bid.objects.filter(order=obj).count()
 
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj.image_asset)
+
+
+def order_queryset():
+    """Orders with everything OrderSerializer reads, so serializing them runs no queries."""
+    return Order.objects.select_related(
+        'customer', 'accepted_chef__user', 'image_asset', 'review__customer', 'review__chef__user'
+    ).annotate(bid_count=Count('bids')).order_by(*Order._meta.ordering)  # aggregating drops Meta.ordering
+
+
+class ArchivedOrderSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    """Same output as OrderSerializer, for orders served from the archive."""
+    customer_name = serializers.CharField(source="customer.full_name", read_only=True)
+    total_bids = serializers.SerializerMethodField()
+    accepted_chef = serializers.CharField(source="accepted_chef.user.id", read_only=True)
+    accepted_chef_name = serializers.CharField(source="accepted_chef.full_name", read_only=True)
+    review = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+    categories = TagSetField(CATEGORY_BITS, read_only=True)
+    dietary_tags = TagSetField(DIETARY_BITS, read_only=True)
 
-class BidSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedOrder
+        exclude = ['image_asset', 'archived_at']
+
+    def get_total_bids(self, obj):
+        return obj.bids.count()
+
+    def get_review(self, obj):
+        review = Review.objects.filter(order_id=obj.id).select_related('customer', 'chef__user').first()
+        return ReviewSerializer(review).data if review else None
+
+    def get_image_variants(self, obj):
+        return image_variant_urls(obj.image_asset)
+
+
+def chef_bid_stats(chef_ids):
+    """
+    ({chef_id: average rating}, {chef_id: accepted orders, archived included})
+    for the chef fields of a list of bids, in a few grouped queries.
+    """
+    ratings = dict(
+        Review.objects.filter(chef_id__in=chef_ids)
+        .values('chef').annotate(avg=Avg('rating')).values_list('chef', 'avg')
+    )
+    order_counts = dict(
+        Order.objects.filter(accepted_chef_id__in=chef_ids)
+        .values('accepted_chef').annotate(total=Count('*')).values_list('accepted_chef', 'total')
+    )
+    for chef_id, archived in archived_chef_counts(chef_ids).items():
+        if archived.accepted:
+            order_counts[chef_id] = order_counts.get(chef_id, 0) + archived.accepted
+    return ratings, order_counts
+
+
+class BidListSerializer(serializers.ListSerializer):
+    """Loads each chef's rating and order count once for the list, not once per bid."""
+
+    def to_representation(self, data):
+        bids = data.all() if isinstance(data, Manager) else data
+        if isinstance(bids, QuerySet):
+            bids = bids.select_related('chef')
+        bids = list(bids)
+        ratings, order_counts = chef_bid_stats({bid.chef_id for bid in bids})
+        for bid in bids:
+            bid.chef.preloaded_rating = round(ratings.get(bid.chef_id) or 0, 1)
+            bid.chef.preloaded_orders_count = order_counts.get(bid.chef_id, 0)
+        return super().to_representation(bids)
+
+
+class BidSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     chef_name = serializers.CharField(source="chef.full_name", read_only=True)
     chef_rating = serializers.FloatField(source="chef.rating", read_only=True)
     chef_order_count = serializers.IntegerField(source="chef.orders_count", read_only=True)
@@ -33,9 +117,10 @@ class BidSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bid
         fields = '__all__'
+        list_serializer_class = BidListSerializer
 
 
-class ChatMessageSerializer(serializers.ModelSerializer):
+class ChatMessageSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     sender_name = serializers.CharField(source="sender.email", read_only=True)
 
     class Meta:
@@ -45,13 +130,23 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 
 
 
-class TransactionSerializer(serializers.ModelSerializer):
+class ArchivedChatMessageSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
+    """Same output as ChatMessageSerializer, for archived messages."""
+    sender_name = serializers.CharField(source="sender.email", read_only=True)
+    order = serializers.IntegerField(source="order_id", read_only=True)
+
+    class Meta:
+        model = ArchivedChatMessage
+        fields = ['id', 'sender_name', 'message', 'timestamp', 'is_read', 'order', 'sender', 'receiver']
+
+
+class TransactionSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = ['id', 'transaction_type', 'amount', 'description', 'created_at']
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = '__all__'
@@ -1,12 +1,15 @@
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from accounts.models import Order, Bid, Review, Wallet
+from accounts.models import Order, Bid, Review, Wallet, ChatMessage, Notification
 from .serializers import OrderSerializer, BidSerializer, ReviewSerializer
+from .images import schedule_image_processing
+from . import archive, caching, events, facets, matching, ranking, schedule, sync
 from django.contrib.auth import get_user_model
+import logging
 
-channel_layer = get_channel_layer()
+logger = logging.getLogger(__name__)
 User = get_user_model()
 
 @receiver(post_save, sender=Order)
@@ -30,16 +33,42 @@ def order_updated(sender, instance, created, **kwargs):
     else:
         event_type = "order_updated"
 
-    print(f"📢 {event_type} signal fired for order {instance.id}")
+    logger.debug("%s signal fired: order=%s", event_type, instance.id)
 
-    async_to_sync(channel_layer.group_send)(
-        "orders",
-        {
-            "type": "order.update",  # consumer method
-            "event": event_type,
-            "data": data,
-        },
-    )
+    message = {
+        "type": "order.update",  # consumer method
+        "event": event_type,
+        "data": data,
+    }
+    if created:
+        # The best-matched chefs hear about a new order before everyone else
+        matches = matching.match_chefs(instance)
+        events.publish_many(match_messages(data, matches))
+        logger.debug("order_matched: order=%s chefs=%s", instance.id, [m.chef_id for m in matches])
+
+        head_start = getattr(settings, 'MATCHING_HEAD_START_SECONDS', 0)
+        if matches and head_start > 0:
+            events.publish(events.BROADCAST_GROUP, message, delay=head_start)
+            return
+
+    events.publish(events.BROADCAST_GROUP, message)
+
+def match_messages(data, matches):
+    return [
+        (
+            events.user_group(match.user_id),
+            {
+                "type": "order.matched",  # consumer method name => order_matched
+                "data": {
+                    "order": data,
+                    "rank": rank,
+                    "score": match.score,
+                    "breakdown": match.breakdown,
+                },
+            },
+        )
+        for rank, match in enumerate(matches, start=1)
+    ]
 
 @receiver(post_save, sender=Bid)
 def bid_placed_signal(sender, instance, created, **kwargs):
@@ -49,12 +78,11 @@ def bid_placed_signal(sender, instance, created, **kwargs):
     can instantly see new bids on their orders.
     """
     if created:
-        print(f"📢 New bid placed by {instance.chef} on order {instance.order.id}")
-        channel_layer = get_channel_layer()
+        logger.debug("bid_placed signal fired: bid=%s chef=%s order=%s", instance.id, instance.chef_id, instance.order_id)
         data = BidSerializer(instance).data
 
-        async_to_sync(channel_layer.group_send)(
-            "orders",  # same group as for other order/bid updates
+        events.publish(
+            events.BROADCAST_GROUP,  # same group as for other order/bid updates
             {
                 "type": "bid.placed",  # this will map to bid_placed() in consumer
                 "data": data,
@@ -70,7 +98,6 @@ def bid_status_updated(sender, instance, created, **kwargs):
     """
     if not created and instance.status == 'accepted':
 
-        channel_layer = get_channel_layer()
         chef_id = instance.chef.user.id # target this chef only 
 
         data = {
@@ -79,16 +106,89 @@ def bid_status_updated(sender, instance, created, **kwargs):
             "message": f"Your bid on order '{instance.order.title}' was accepted!"
         }
 
-        print(f"📢 Sending bid accepted notification to user_{chef_id}")
+        logger.debug("bid_accepted notification: user=%s order=%s", chef_id, instance.order_id)
 
-        async_to_sync(channel_layer.group_send)(
-            f"user_{chef_id}",
+        events.publish(
+            events.user_group(chef_id),
             {
                 "type": "bid.accepted",  # consumer method name => bid_accepted
                 "data": data,
             },
         )
 
+@receiver(post_save, sender=Bid)
+def bid_ranked(sender, instance, created, **kwargs):
+    """
+    Keeps the order's bid ranking current. A new bid is slotted into it and
+    the customer is told where it landed, so their list re-sorts in place.
+    """
+    if not created:
+        ranking.discard_order(instance.order_id)
+        return
+    if instance.status != 'pending':
+        return  # e.g. added as declined in the admin: never ranked
+
+    rank, ranked, total = ranking.add_bid(instance)
+    customer_user_id = instance.order.customer.user_id
+
+    logger.debug("bid_ranked: bid=%s order=%s rank=%s/%s", instance.id, instance.order_id, rank, total)
+
+    events.publish(
+        events.user_group(customer_user_id),
+        {
+            "type": "bid.ranked",  # consumer method name => bid_ranked
+            "data": {
+                "order": instance.order_id,
+                "bid": instance.id,
+                "rank": rank,
+                "total_bids": total,
+                "score": ranked.score,
+                "breakdown": ranked.breakdown,
+            },
+        },
+    )
+
+@receiver(post_save, sender=Order)
+def order_ranking_changed(sender, instance, created, **kwargs):
+    # Budget, deadline or status changes move the order's updated_at, and
+    # with it the key its bid ranking is cached under (see api.ranking)
+    if created:
+        return
+    if instance.accepted_chef_id and instance.status in ('completed', 'cancelled'):
+        ranking.discard_chef(instance.accepted_chef_id)
+
+@receiver(post_save, sender=Order)
+def order_facets_changed(sender, instance, **kwargs):
+    # After commit, so a rolled back save never reaches the index
+    transaction.on_commit(lambda: facets.index.order_saved(instance))
+
+@receiver(post_delete, sender=Order)
+def order_facets_deleted(sender, instance, **kwargs):
+    order_id = instance.id
+    transaction.on_commit(lambda: facets.index.order_deleted(order_id))
+
+@receiver(post_delete, sender=Order)
+def order_review_deleted(sender, instance, **kwargs):
+    # Review.order has no database cascade so archived orders keep their
+    # reviews; any other order delete (or customer cascade) takes it along
+    if instance.pk not in archive.archiving.get():
+        Review.objects.filter(order_id=instance.pk).delete()
+
+@receiver(post_save, sender=Order)
+def order_schedule_changed(sender, instance, **kwargs):
+    # Status or delivery time changes move or free the chef's slot
+    transaction.on_commit(lambda: schedule.index.order_saved(instance))
+
+@receiver(post_save, sender=Bid)
+def bid_schedule_booked(sender, instance, created, **kwargs):
+    if instance.status == 'accepted':
+        transaction.on_commit(lambda: schedule.index.bid_accepted(instance))
+
+@receiver(post_delete, sender=Order)
+def order_schedule_deleted(sender, instance, **kwargs):
+    order_id = instance.id
+    transaction.on_commit(lambda: schedule.index.order_deleted(order_id))
+
 @receiver(post_save, sender=Review)
 def review_updated(sender, instance, created, **kwargs):
     """
@@ -96,11 +196,12 @@ def review_updated(sender, instance, created, **kwargs):
     Broadcasts to the relevant chef. 
     """
     data = ReviewSerializer(instance).data
+    ranking.discard_chef(instance.chef_id)
 
     event_type = "review_created" if created else "review_updated"
 
-    async_to_sync(channel_layer.group_send)(
-        "orders", 
+    events.publish(
+        events.BROADCAST_GROUP,
         {
             "type": "order.update", 
             "event": event_type,
@@ -108,10 +209,54 @@ def review_updated(sender, instance, created, **kwargs):
         }
     )
 
-    print(f"Signal fired: {event_type} for Review ID {instance.id}")
+    logger.debug("%s signal fired: review=%s", event_type, instance.id)
+
+
+def bump_cache_tags(sender, instance, **kwargs):
+    """Invalidates cached views and fragments that depend on the written row."""
+    if archive.archiving.get():
+        return  # archive_all bumps every tag once it is done
+    caching.bump(*caching.tags_for(instance))
+
+for model in caching.MODEL_TAGS:
+    post_save.connect(bump_cache_tags, sender=model, dispatch_uid=f'cache_tags_save_{model.__name__}')
+    post_delete.connect(bump_cache_tags, sender=model, dispatch_uid=f'cache_tags_delete_{model.__name__}')
+
+
+def record_tombstone(sender, instance, **kwargs):
+    """Lets mobile clients drop their copy of a deleted or archived row (api/sync.py)."""
+    sync.bury(instance)
+
+for model in (Order, Bid, ChatMessage, Notification):
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'sync_tombstone_{model.__name__}')
 
 
 @receiver(post_save, sender=User)
 def create_wallet_for_user(sender, instance, created, **kwargs):
     if created and not hasattr(instance, "wallet"):
-        Wallet.objects.create(user=instance)
\ No newline at end of file
+        Wallet.objects.create(user=instance)
+
+
+# Image uploads: a FieldFile is uncommitted only while a fresh upload is
+# waiting to be written, so that is when the variants need (re)building.
+IMAGE_FIELDS = {
+    Order: ('image', 'image_asset'),
+    User: ('profile_image', 'profile_image_asset'),
+}
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=User)
+def image_upload_pending(sender, instance, **kwargs):
+    field_name, asset_field = IMAGE_FIELDS[sender]
+    field_file = getattr(instance, field_name)
+    instance._image_uploaded = bool(field_file) and not field_file._committed
+    if instance._image_uploaded:
+        setattr(instance, asset_field, None)
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=User)
+def image_upload_saved(sender, instance, **kwargs):
+    if getattr(instance, '_image_uploaded', False):
+        instance._image_uploaded = False
+        field_name, asset_field = IMAGE_FIELDS[sender]
+        schedule_image_processing(instance, field_name, asset_field)
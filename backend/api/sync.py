@@ -0,0 +1,191 @@
+"""
+Incremental sync for offline-first (mobile) clients.
+
+One request returns what changed in every feed of the caller since the
+watermark the client holds for it: their orders, bids, chat messages,
+notifications and wallet transactions. Each feed is read in (updated_at,
+id) order along a per-owner index, so a sync costs one indexed range scan
+per feed, and the client gets back the position of the last row it was
+sent as that feed's new watermark. A client with no watermark for a feed
+gets it from the start. Watermarks are facets-style cursors
+("<microseconds>_<id>").
+
+Deleted rows are sent as tombstones (SyncTombstone, written by the
+post_delete receivers in api.signals). Archived rows leave the hot tables
+the REST lists read, so they are sent as tombstones too. Tombstones are
+kept for SYNC_TOMBSTONE_DAYS. A client whose tombstone watermark is older
+than that is told to `reset`: drop its copy and sync from scratch.
+
+Only rows written at least SYNC_SETTLE_SECONDS ago are returned. Their
+timestamps are taken before they commit, so a newer watermark could
+otherwise pass a row that commits later. The live socket covers those
+last seconds.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import Bid, ChatMessage, Chef, Customer, Notification, Order, SyncTombstone, Transaction
+from .facets import decode_cursor, encode_cursor
+from .serializers import (
+    BidSerializer, ChatMessageSerializer, NotificationSerializer, OrderSerializer, TransactionSerializer,
+    order_queryset,
+)
+
+# `owners`: (scope kind, lookup) pairs; a row is in the feed of every scope its lookups name
+Feed = namedtuple('Feed', 'model queryset stamp owners serializer')
+
+FEEDS = {
+    'orders': Feed(
+        Order, order_queryset, 'updated_at',
+        [('customer', 'customer_id'), ('chef', 'accepted_chef_id')],
+        OrderSerializer,
+    ),
+    'bids': Feed(
+        Bid, lambda: Bid.objects.select_related('chef'), 'updated_at',
+        [('customer', 'order__customer_id'), ('chef', 'chef_id')],
+        BidSerializer,
+    ),
+    'chat': Feed(
+        ChatMessage, lambda: ChatMessage.objects.select_related('sender'), 'updated_at',
+        [('user', 'sender_id'), ('user', 'receiver_id')],
+        ChatMessageSerializer,
+    ),
+    'notifications': Feed(
+        Notification, Notification.objects.all, 'updated_at',
+        [('user', 'user_id')],
+        NotificationSerializer,
+    ),
+    # The ledger is append-only: new rows are its only changes and it has no tombstones
+    'transactions': Feed(
+        Transaction, Transaction.objects.all, 'created_at',
+        [('user', 'wallet__user_id')],
+        TransactionSerializer,
+    ),
+}
+
+TOMBSTONES = 'tombstones'
+MAX_PAGE_SIZE = 500
+
+
+def scopes_of(user):
+    """{'user': id} plus the caller's customer or chef profile id."""
+    scopes = {'user': user.id}
+    profiles = {'customer': Customer, 'chef': Chef}
+    if user.user_type in profiles:
+        profile_id = profiles[user.user_type].objects.filter(user=user).values_list('id', flat=True).first()
+        if profile_id is not None:
+            scopes[user.user_type] = profile_id
+    return scopes
+
+
+def scope_keys(scopes):
+    return [f'{kind}:{scope_id}' for kind, scope_id in scopes.items()]
+
+
+def owned(feed, scopes):
+    """The caller's rows of `feed`, or None when it has no profile the feed is kept for."""
+    conditions = [Q(**{lookup: scopes[kind]}) for kind, lookup in feed.owners if kind in scopes]
+    if not conditions:
+        return None
+    condition = conditions[0]
+    for other in conditions[1:]:
+        condition |= other
+    return condition
+
+
+def after(stamp, cursor):
+    """Rows strictly after `cursor` in (stamp, id) order."""
+    moment, row_id = cursor
+    return Q(**{f'{stamp}__gt': moment}) | Q(**{stamp: moment, 'id__gt': row_id})
+
+
+def parse_watermarks(params):
+    """{feed or 'tombstones': (moment, id)} from the query string. Raises ValueError."""
+    return {
+        name: decode_cursor(params[name])
+        for name in [*FEEDS, TOMBSTONES] if params.get(name)
+    }
+
+
+def changes(user, watermarks, limit=None):
+    """
+    {'changes': {feed: [rows]}, 'tombstones': [{'entity', 'id'}],
+    'watermarks': {feed: cursor}, 'has_more', 'reset'}. With has_more the
+    client asks again with the new watermarks straight away.
+    """
+    limit = max(1, min(int(limit or getattr(settings, 'SYNC_PAGE_SIZE', 200)), MAX_PAGE_SIZE))
+    now = timezone.now()
+    settled = now - timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 2))
+    kept_since = now - timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_DAYS', 30))
+
+    tombstone_mark = watermarks.get(TOMBSTONES)
+    if tombstone_mark is not None and tombstone_mark[0] < kept_since:
+        return {'changes': {}, 'tombstones': [], 'watermarks': {}, 'has_more': False, 'reset': True}
+
+    scopes = scopes_of(user)
+    result = {'changes': {}, 'tombstones': [], 'watermarks': {}, 'has_more': False, 'reset': False}
+    for name, feed in FEEDS.items():
+        condition = owned(feed, scopes)
+        if condition is None:
+            result['changes'][name] = []
+            result['watermarks'][name] = encode_cursor(watermarks[name]) if name in watermarks else None
+            continue
+        queryset = feed.queryset().filter(condition, **{f'{feed.stamp}__lte': settled})
+        if name in watermarks:
+            queryset = queryset.filter(after(feed.stamp, watermarks[name]))
+        rows = list(queryset.order_by(feed.stamp, 'id')[:limit + 1])
+        result['has_more'] |= len(rows) > limit
+        rows = rows[:limit]
+        result['changes'][name] = feed.serializer(rows, many=True).data
+        last = (getattr(rows[-1], feed.stamp), rows[-1].id) if rows else watermarks.get(name)
+        result['watermarks'][name] = encode_cursor(last) if last else None
+
+    if tombstone_mark is None:
+        # Nothing is cached client side yet, so there is nothing to delete
+        last = (settled, 0)
+    else:
+        tombstones = list(
+            SyncTombstone.objects.filter(scope__in=scope_keys(scopes), deleted_at__lte=settled)
+            .filter(after('deleted_at', tombstone_mark))
+            .order_by('deleted_at', 'id').values_list('entity', 'object_id', 'deleted_at', 'id')[:limit + 1]
+        )
+        result['has_more'] |= len(tombstones) > limit
+        tombstones = tombstones[:limit]
+        result['tombstones'] = [{'entity': entity, 'id': object_id} for entity, object_id, _, _ in tombstones]
+        last = tombstones[-1][2:] if tombstones else tombstone_mark
+    result['watermarks'][TOMBSTONES] = encode_cursor(last)
+    return result
+
+
+# Writes
+
+def bury(instance):
+    """
+    Records the deletion of a FEEDS row for each scope that had it. Call
+    from post_delete: a lookup through a foreign key (a bid's customer)
+    reads the parent, which cascades and archival delete after the row.
+    """
+    entity, feed = next((name, feed) for name, feed in FEEDS.items() if isinstance(instance, feed.model))
+    scopes = {}
+    for kind, lookup in feed.owners:
+        field, _, rest = lookup.partition('__')
+        if rest:
+            parent = instance._meta.get_field(field).related_model
+            scope_id = parent.objects.filter(pk=getattr(instance, f'{field}_id')).values_list(rest, flat=True).first()
+        else:
+            scope_id = getattr(instance, field)
+        if scope_id is not None:
+            scopes[f'{kind}:{scope_id}'] = None
+    SyncTombstone.objects.bulk_create([
+        SyncTombstone(entity=entity, object_id=instance.pk, scope=scope) for scope in scopes
+    ])
+
+
+def prune_tombstones(now=None):
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_DAYS', 30))
+    return SyncTombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
@@ -1,3 +1,1038 @@
-from django.test import TestCase
+import json
+import os
+import statistics
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from accounts.models import (
+    Bid, ChatMessage, Chef, CustomUser, Customer, Notification, Order, Review, Transaction, Wallet,
+)
+from . import (
+    archive, consumers, events, expiry, facets, matching, order_state, pricing, ranking, schedule, throttling,
+)
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def make_customer(email='customer@example.com'):
+    user = CustomUser.objects.create_user(email=email, password='pass12345', user_type='customer')
+    return Customer.objects.create(user=user, full_name='Test Customer')
+
+
+def make_chef(email):
+    user = CustomUser.objects.create_user(email=email, password='pass12345', user_type='chef')
+    return Chef.objects.create(user=user, full_name=email.split('@')[0])
+
+
+def make_order(customer, **fields):
+    fields.setdefault('title', 'Biryani for 4')
+    fields.setdefault('description', 'Chicken biryani, mild')
+    fields.setdefault('max_budget', Decimal('2000.00'))
+    fields.setdefault('delivery_address', 'House 1, Street 2')
+    fields.setdefault('preferred_delivery_time', timezone.now() + timedelta(days=1))
+    return Order.objects.create(customer=customer, **fields)
+
+
+def make_bid(order, chef, price='1500.00'):
+    return Bid.objects.create(order=order, chef=chef, proposed_price=Decimal(price),
+                              delivery_estimate=timedelta(hours=2))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class OrderStateTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.chef = make_chef('chef@example.com')
+        self.order = make_order(self.customer)
+        self.bid = make_bid(self.order, self.chef)
+
+    def test_accept_bumps_version_and_declines_other_bids(self):
+        other = make_bid(self.order, make_chef('other@example.com'))
+        order_state.accept_bid(self.bid)
+
+        self.order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version), ('accepted', 1))
+        self.assertEqual(self.order.accepted_chef, self.chef)
+        self.assertEqual(other.status, 'declined')
+
+    def test_illegal_transition_is_rejected(self):
+        with self.assertRaises(order_state.InvalidTransition):
+            order_state.fulfill(self.order)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version), ('open', 0))
+
+    def test_stale_instance_loses(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        order_state.transition(self.order, 'cancelled')
+        # Same status as read, but the version has moved on
+        Order.objects.filter(pk=self.order.pk).update(status='open')
+        with self.assertRaises(order_state.StaleOrder):
+            order_state.transition(stale, 'accepted')
+
+    def test_accept_endpoint_reports_conflicts(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.customer.user).key}')
+        response = client.post(f'/api/bids/{self.bid.id}/accept/')
+        self.assertEqual(response.status_code, 200)
+        response = client.post(f'/api/bids/{self.bid.id}/accept/')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class OrderStateConcurrencyTests(TransactionTestCase):
+    """
+    Many threads act on the same order at once, each through its own
+    database connection and each holding the same (soon stale) read.
+    """
+    workers = 8
+
+    def hammer(self, action):
+        barrier = threading.Barrier(self.workers)
+        outcomes = []
+
+        def run(index):
+            try:
+                barrier.wait()
+                for _ in range(50):
+                    try:
+                        action(index)
+                    except OperationalError as e:
+                        # SQLite serializes writers; retry the whole call
+                        if 'locked' not in str(e):
+                            raise
+                        time.sleep(0.01)
+                        continue
+                    outcomes.append('ok')
+                    return
+                outcomes.append('gave up')
+            except (order_state.InvalidTransition, order_state.StaleOrder) as e:
+                outcomes.append(type(e).__name__)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_parallel_accepts_pick_exactly_one_bid(self):
+        customer = make_customer()
+        order = make_order(customer)
+        bids = [make_bid(order, make_chef(f'chef{i}@example.com')) for i in range(self.workers)]
+
+        def accept(index):
+            # Re-read on every attempt: a retry must not reuse a half-applied instance
+            order_state.accept_bid(Bid.objects.select_related('order').get(pk=bids[index].pk))
+
+        outcomes = self.hammer(accept)
+
+        self.assertEqual(outcomes.count('ok'), 1, outcomes)
+        self.assertNotIn('gave up', outcomes)
+        order.refresh_from_db()
+        statuses = list(Bid.objects.filter(order=order).values_list('status', flat=True))
+        self.assertEqual(order.status, 'accepted')
+        self.assertEqual(order.version, 1)
+        self.assertEqual(statuses.count('accepted'), 1)
+        self.assertEqual(statuses.count('declined'), self.workers - 1)
+        self.assertEqual(Bid.objects.get(status='accepted').chef, order.accepted_chef)
+
+    def test_parallel_completes_pay_the_chef_once(self):
+        customer = make_customer()
+        chef = make_chef('chef@example.com')
+        order = make_order(customer)
+        bid = make_bid(order, chef, price='1000.00')
+        order_state.accept_bid(bid)
+
+        def complete(index):
+            order = Order.objects.get(pk=bid.order_id)
+            order_state.complete(order, Bid.objects.select_related('chef__user').get(pk=bid.pk))
+
+        outcomes = self.hammer(complete)
+
+        self.assertEqual(outcomes.count('ok'), 1, outcomes)
+        self.assertNotIn('gave up', outcomes)
+        self.assertEqual(Wallet.objects.get(user=chef.user).balance, Decimal('950.00'))
+        self.assertEqual(Transaction.objects.filter(transaction_type='credit').count(), 1)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'completed')
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class OrderExpiryTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.chef = make_chef('chef@example.com')
+        past = timezone.now() - timedelta(hours=1)
+        self.stale = [make_order(self.customer, preferred_delivery_time=past + timedelta(minutes=i))
+                      for i in range(4)]
+        self.future = make_order(self.customer)
+
+    def expired_events(self, seen):
+        missed, _ = events.replay(self.customer.user_id, seen)
+        return [m['data']['orders'] for m in missed if m.get('event') == 'orders_expired']
+
+    def test_cancels_in_batches_and_declines_pending_bids(self):
+        bid = make_bid(self.stale[0], self.chef)
+        seen = events.latest_seq()
+        with self.captureOnCommitCallbacks(execute=True):
+            found, ids = expiry.expire_batch(expiry.expiry_cutoff(), 3)
+        first = [order.id for order in self.stale[:3]]
+        self.assertEqual((found, sorted(ids)), (3, first))
+        self.assertEqual(Bid.objects.get(pk=bid.pk).status, 'declined')
+        self.assertEqual(Notification.objects.filter(user=self.customer.user, type='order').count(), 3)
+        # One coalesced event for the whole batch
+        self.assertEqual(self.expired_events(seen), [ids])
+
+        self.assertEqual(expiry.expire_stale_orders(batch_size=3), 1)
+        statuses = dict(Order.objects.values_list('id', 'status'))
+        self.assertEqual([statuses[order.id] for order in self.stale], ['cancelled'] * 4)
+        self.assertEqual(statuses[self.future.id], 'open')
+
+    def test_orders_changed_after_the_select_are_left_alone(self):
+        accepted, withdrawn = self.stale[:2]
+        accepted_bid = make_bid(accepted, self.chef)
+        fired = []
+
+        def race(execute, sql, params, many, context):
+            # Another request gets in between the SELECT and the UPDATE
+            if sql.startswith('UPDATE "accounts_order"') and not fired:
+                fired.append(True)
+                Order.objects.filter(pk=accepted.pk).update(status='accepted', accepted_chef=self.chef)
+                Order.objects.filter(pk=withdrawn.pk).update(status='cancelled')
+            return execute(sql, params, many, context)
+
+        seen = events.latest_seq()
+        with self.captureOnCommitCallbacks(execute=True), connection.execute_wrapper(race):
+            found, ids = expiry.expire_batch(expiry.expiry_cutoff(), 10)
+        self.assertEqual(found, 4)
+        self.assertEqual(sorted(ids), [order.id for order in self.stale[2:]])
+        self.assertEqual(Bid.objects.get(pk=accepted_bid.pk).status, 'pending')
+        # The customer's own cancellation is already cancelled, but not by expiry
+        self.assertEqual(Notification.objects.filter(user=self.customer.user, type='order').count(), 2)
+        self.assertEqual(self.expired_events(seen), [ids])
+
+
+class MetricsAccessTests(TestCase):
+    def test_remote_scrapers_need_the_token_or_a_staff_session(self):
+        remote = {'REMOTE_ADDR': '203.0.113.9'}
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+        self.assertEqual(self.client.get('/metrics/', **remote).status_code, 403)
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer nope').status_code, 403)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer s3cret', **remote).status_code, 200)
+        self.client.force_login(CustomUser.objects.create_user(
+            email='staff@example.com', password='pass12345', user_type='admin', is_staff=True))
+        self.assertEqual(self.client.get('/metrics/', **remote).status_code, 200)
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def limits(self, **chat_message):
+        return self.settings(RATE_LIMITS={'chat_message': chat_message, 'place_bid': {'rate': 0.01, 'burst': 3}})
+
+    def test_bucket_allows_a_burst_then_refills_at_the_rate(self):
+        limit = {'rate': 2.0, 'burst': 3}
+        stored, waits = None, []
+        for _ in range(3):
+            wait, stored = throttling._plan(stored, limit, 100.0, 0.0)
+            waits.append(wait)
+        self.assertEqual((waits, stored), ([0.0, 0.0, 0.0], 101.5))
+        # Empty: the next token frees up one interval (1 / rate) later
+        self.assertEqual(throttling._plan(stored, limit, 100.0, 0.0), (0.5, None))
+        self.assertEqual(throttling._plan(stored, limit, 100.5, 0.0), (0.0, 102.0))
+        # Waiting is allowed up to max_wait, and queues behind earlier waiters
+        self.assertEqual(throttling._plan(stored, limit, 100.0, 1.0), (0.5, 102.0))
+        # An idle bucket refills to `burst`, never beyond
+        self.assertEqual(throttling._plan(stored, limit, 200.0, 0.0), (0.0, 200.5))
+
+    def test_place_bid_answers_429_past_the_burst(self):
+        chef = make_chef('chef@example.com')
+        order = make_order(make_customer())
+        client = APIClient()
+        client.force_authenticate(chef.user)
+        with self.limits():
+            codes = [client.post(f'/api/orders/{order.id}/bid/', {}).status_code for _ in range(4)]
+            self.assertNotIn(429, codes[:3])
+            self.assertEqual(codes[3], 429)
+            # Per user: another chef still has their own bucket
+            client.force_authenticate(make_chef('other@example.com').user)
+            self.assertNotEqual(client.post(f'/api/orders/{order.id}/bid/', {}).status_code, 429)
+
+    def consumer(self, channel, user=None):
+        consumer = consumers.ChatConsumer()
+        consumer.scope = {'user': user or AnonymousUser()}
+        consumer.channel_name, consumer.order_id = channel, 1
+        consumer.frames, consumer.closed = [], []
+
+        async def send(text_data):
+            consumer.frames.append(json.loads(text_data))
+
+        async def close(code=None):
+            consumer.closed.append(code)
+        consumer.send, consumer.close = send, close
+        return consumer
+
+    def allowed(self, consumer, times=1):
+        return [async_to_sync(consumer.within_rate_limit)('chat_message') for _ in range(times)]
+
+    def test_drop_answers_with_an_error_frame(self):
+        socket = self.consumer('a')
+        with self.limits(rate=0.01, burst=2, action='drop'):
+            self.assertEqual(self.allowed(socket, 3), [True, True, False])
+        self.assertEqual(socket.frames[0]['error'], 'rate_limited')
+        self.assertEqual(socket.closed, [])
+
+    def test_delay_holds_the_frame_until_a_token_frees_up(self):
+        socket = self.consumer('a')
+        with self.limits(rate=20.0, burst=1, action='delay', max_delay=1.0):
+            started = time.monotonic()
+            self.assertEqual(self.allowed(socket, 3), [True, True, True])
+            self.assertGreaterEqual(time.monotonic() - started, 0.09)
+        self.assertEqual(socket.frames, [])
+        # Past max_delay the frame is dropped instead
+        slow = self.consumer('b')
+        with self.limits(rate=0.01, burst=1, action='delay', max_delay=1.0):
+            self.assertEqual(self.allowed(slow, 2), [True, False])
+        self.assertEqual(slow.frames[0]['error'], 'rate_limited')
+
+    def test_close_shuts_a_flooding_socket(self):
+        socket = self.consumer('a')
+        with self.limits(rate=0.01, burst=1, action='close'):
+            self.assertEqual(self.allowed(socket, 2), [True, False])
+        self.assertEqual((socket.frames, socket.closed), ([], [consumers.RATE_LIMITED_CLOSE_CODE]))
+
+    def test_buckets_are_per_socket_and_per_user(self):
+        user = make_customer().user
+        first, second = self.consumer('a', user), self.consumer('b', user)
+        strangers = self.consumer('c'), self.consumer('d')
+        with self.limits(rate=0.01, burst=2, action='drop'):
+            self.assertEqual(self.allowed(first, 2), [True, True])
+            # The user's bucket is shared by all their sockets
+            self.assertEqual(self.allowed(second), [False])
+            # Anonymous sockets only have their own
+            self.assertEqual([self.allowed(socket, 2) for socket in strangers], [[True, True]] * 2)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, CACHE_RESPONSES=True)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = make_customer()
+        self.chef = make_chef('chef@example.com')
+        self.order = make_order(self.customer, accepted_chef=self.chef, status='accepted')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer.user)
+
+    def assertInvalidatedBy(self, path, write):
+        self.client.get(path)
+        self.assertEqual(self.client.get(path)['X-Cache'], 'hit')
+        write()
+        response = self.client.get(path)
+        self.assertEqual(response['X-Cache'], 'miss')
+        return response
+
+    def test_order_list_follows_orders_bids_reviews_and_chefs(self):
+        def rename_order():
+            self.order.title = 'Nihari for 2'
+            self.order.save()
+
+        def rename_chef():
+            self.chef.full_name = 'Renamed Chef'
+            self.chef.save()
+
+        path = '/api/orders/my/'
+        self.assertInvalidatedBy(path, rename_order)
+        other = make_order(self.customer)
+        self.assertInvalidatedBy(path, lambda: make_bid(other, self.chef))
+        self.assertInvalidatedBy(path, lambda: Review.objects.create(
+            order=self.order, customer=self.customer, chef=self.chef, rating=4.0))
+        response = self.assertInvalidatedBy(path, rename_chef)
+        self.assertIn('Renamed Chef', [order.get('accepted_chef_name') for order in response.json()])
+
+    def test_wallet_follows_its_balance_and_transactions(self):
+        wallet = Wallet.objects.get(user=self.customer.user)
+
+        def top_up():
+            wallet.balance = Decimal('500.00')
+            wallet.save()
+
+        self.assertInvalidatedBy('/api/wallet/', top_up)
+        self.assertInvalidatedBy('/api/wallet/', lambda: Transaction.objects.create(
+            wallet=wallet, transaction_type='credit', amount=Decimal('500.00')))
+
+    def test_notifications_and_chat_follow_new_rows(self):
+        response = self.assertInvalidatedBy('/api/notifications/', lambda: Notification.objects.create(
+            user=self.customer.user, message='Your order was accepted'))
+        self.assertEqual(len(response.json()), 1)
+        self.assertInvalidatedBy(f'/api/chat/{self.order.id}/', lambda: ChatMessage.objects.create(
+            order=self.order, sender=self.customer.user, receiver=self.chef.user, message='Salaam'))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class BidRankingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.order = make_order(make_customer())
+        self.chefs = [make_chef(f'chef{i}@example.com') for i in range(3)]
+
+    def ranked_ids(self):
+        top, _ = ranking.top_bids(Order.objects.get(pk=self.order.pk), 10)
+        return [ranked.bid_id for ranked in top]
+
+    def test_new_bids_are_slotted_into_the_cached_ranking(self):
+        pricey = make_bid(self.order, self.chefs[0], '1900.00')
+        self.assertEqual(self.ranked_ids(), [pricey.id])
+        cheap = make_bid(self.order, self.chefs[1], '900.00')
+        # Only the new bid was scored: the cached entry still holds the first one's
+        key = ranking.order_ranking_key(Order.objects.get(pk=self.order.pk))
+        self.assertEqual(cache.get(key)['order'][-1][1], pricey.id)
+        with self.assertNumQueries(1):  # the order itself
+            self.assertEqual(self.ranked_ids(), [cheap.id, pricey.id])
+
+    def test_a_contended_lock_falls_back_to_a_rebuild(self):
+        make_bid(self.order, self.chefs[0])
+        key = ranking.order_ranking_key(Order.objects.get(pk=self.order.pk))
+        cache.add(f'{key}:lock', True)
+        late = make_bid(self.order, self.chefs[1], '100.00')
+        # The locked entry was left alone and dropped by moving to a new key
+        self.assertNotEqual(ranking.order_ranking_key(Order.objects.get(pk=self.order.pk)), key)
+        self.assertEqual(self.ranked_ids()[0], late.id)
+
+    def test_bids_created_as_declined_are_not_ranked(self):
+        Bid.objects.create(order=self.order, chef=self.chefs[2], proposed_price=Decimal('1000.00'),
+                           delivery_estimate=timedelta(hours=2), status='declined')
+        self.assertEqual(self.ranked_ids(), [])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class RealtimeReplayTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.chef = make_chef('chef@example.com')
+        self.order = make_order(self.customer)
+
+    def test_replays_own_and_broadcast_events_in_seq_order(self):
+        seen = events.latest_seq()
+        with self.captureOnCommitCallbacks() as callbacks:
+            bid = make_bid(self.order, self.chef)
+            make_bid(make_order(make_customer('other@example.com')), make_chef('other-chef@example.com'))
+        # Logged, and given their seqs, only once the transaction commits
+        self.assertEqual(events.latest_seq(), seen)
+        for callback in callbacks:
+            callback()
+
+        missed, latest = events.replay(self.customer.user_id, seen)
+        seqs = [message['seq'] for message in missed]
+        self.assertEqual(seqs, sorted(seqs))
+        self.assertTrue(seen < seqs[0] and seqs[-1] <= latest)
+        # Both bids are broadcast; only this customer's bid is ranked for them
+        self.assertEqual([m['type'] for m in missed].count('bid.placed'), 2)
+        ranked = [m for m in missed if m['type'] == 'bid.ranked']
+        self.assertEqual([m['data']['bid'] for m in ranked], [bid.id])
+
+        self.assertEqual(events.replay(self.customer.user_id, latest), ([], latest))
+
+    def test_delayed_events_are_not_replayed_before_they_are_sent(self):
+        seen = events.latest_seq()
+        with self.captureOnCommitCallbacks() as callbacks:
+            events.publish(events.BROADCAST_GROUP, {'type': 'order.update', 'data': {}}, delay=60)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(events.replay(self.customer.user_id, seen), ([], seen))
+
+    def test_asks_for_resync_when_the_gap_is_gone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_bid(self.order, self.chef)
+        latest = events.latest_seq()
+        self.assertEqual(events.replay(self.customer.user_id, latest + 5), (None, latest))
+        with self.settings(REALTIME_REPLAY_MAX_EVENTS=1):
+            self.assertEqual(events.replay(self.customer.user_id, 0), (None, latest))
+        with self.settings(REALTIME_LOG_SIZE=1):
+            events.prune(latest)
+        self.assertEqual(events.replay(self.customer.user_id, 0), (None, latest))
+        self.assertEqual(events.replay(self.customer.user_id, latest - 1)[0][0]['seq'], latest)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, SYNC_SETTLE_SECONDS=0)
+class MobileSyncTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.chef = make_chef('chef@example.com')
+        self.orders = [make_order(self.customer, title=f'Order {i}') for i in range(3)]
+        make_order(make_customer('other@example.com'))
+        order_state.accept_bid(make_bid(self.orders[0], self.chef))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.customer.user).key}')
+
+    def sync(self, watermarks):
+        response = self.client.get('/api/sync/', watermarks)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_through_own_rows_then_sends_only_changes(self):
+        watermarks, seen = {}, []
+        with self.settings(SYNC_PAGE_SIZE=2):
+            while True:
+                data = self.sync(watermarks)
+                seen += [order['id'] for order in data['changes']['orders']]
+                watermarks = {name: mark for name, mark in data['watermarks'].items() if mark}
+                if not data['has_more']:
+                    break
+        self.assertEqual(sorted(seen), sorted(order.id for order in self.orders))
+
+        deleted_id = self.orders[1].id
+        self.orders[1].delete()
+        order_state.fulfill(self.orders[0])
+        data = self.sync(watermarks)
+        self.assertEqual([order['id'] for order in data['changes']['orders']], [self.orders[0].id])
+        self.assertEqual(data['tombstones'], [{'entity': 'orders', 'id': deleted_id}])
+
+    def test_stale_tombstone_watermark_asks_for_a_reset(self):
+        stale = facets.encode_cursor((timezone.now() - timedelta(days=365), 0))
+        self.assertTrue(self.sync({'tombstones': stale})['reset'])
+        self.assertEqual(self.client.get('/api/sync/', {'orders': 'nope'}).status_code, 400)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class ReviewCleanupTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.chef = make_chef('chef@example.com')
+
+    def review(self):
+        order = make_order(self.customer, status='completed', accepted_chef=self.chef)
+        return Review.objects.create(order=order, customer=self.customer, chef=self.chef, rating=5.0)
+
+    def test_deleting_an_order_deletes_its_review_but_archiving_keeps_it(self):
+        deleted, archived = self.review(), self.review()
+        deleted.order.delete()
+        archive.archive_orders(10, timezone.now() + timedelta(days=365))
+        self.assertEqual(list(Review.objects.values_list('id', flat=True)), [archived.id])
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, PRICING_MIN_SAMPLES=3)
+class PriceSuggestionTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.chefs = []
+
+    def accept(self, price, **fields):
+        # A chef per order, so none of them is booked up
+        self.chefs.append(make_chef(f'chef{len(self.chefs)}@example.com'))
+        return order_state.accept_bid(make_bid(make_order(self.customer, **fields), self.chefs[-1], price))
+
+    def test_sketch_quantiles_stay_within_the_relative_accuracy(self):
+        prices = list(range(1, 1001))
+        sketch = pricing.QuantileSketch()
+        for price in prices:
+            sketch.add(price)
+        for q in pricing.QUARTILES:
+            exact = prices[int(q * (len(prices) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q), exact, delta=exact * pricing.RELATIVE_ACCURACY)
+
+    def test_falls_back_to_broader_segments_until_enough_samples(self):
+        biryani = {'categories': 1}
+        for price in ('900.00', '1000.00', '1100.00'):
+            self.accept(price)
+        self.accept('1500.00', **biryani)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.chefs[0].user).key}')
+
+        data = client.get(f'/api/orders/{make_order(self.customer, **biryani).id}/price-suggestion/').json()
+        self.assertEqual(data['suggestion']['basis'], 'budget')
+        self.assertEqual(data['suggestion']['samples'], 4)
+
+    def test_a_free_bid_can_be_accepted_and_is_not_sketched(self):
+        order = self.accept('0.00')
+        self.assertEqual(order.status, 'accepted')
+        self.assertIsNone(pricing.suggest(make_order(self.customer)))
+        self.assertEqual(pricing.rebuild(), 0)
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, CHEF_CONCURRENT_ORDERS=1)
+class ChefScheduleTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.chef = make_chef('chef@example.com')
+        self.due = timezone.now() + timedelta(days=2)
+        schedule.index.refresh(force=True)
+
+    def test_full_slot_blocks_acceptance_until_freed(self):
+        first, second = (make_bid(make_order(self.customer, preferred_delivery_time=self.due), self.chef)
+                         for _ in range(2))
+        order_state.accept_bid(first)
+        with self.assertRaises(order_state.ChefUnavailable):
+            order_state.accept_bid(second)
+        self.assertEqual(Order.objects.get(pk=second.order_id).status, 'open')
+
+        order_state.fulfill(first.order)
+        order_state.accept_bid(second)
+
+    def test_windows_that_only_touch_do_not_conflict(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order_state.accept_bid(make_bid(make_order(self.customer, preferred_delivery_time=self.due), self.chef))
+        self.assertEqual(schedule.conflicts(self.chef.id, self.due, self.due + timedelta(hours=2)), [])
+        self.assertNotEqual(schedule.conflicts(self.chef.id, self.due - timedelta(hours=1), self.due), [])
+
+        _, slots = schedule.agenda(self.chef.id, self.due - timedelta(hours=3), self.due + timedelta(hours=1))
+        self.assertEqual([(start, end) for start, end, _ in slots], [
+            (self.due - timedelta(hours=3), self.due - timedelta(hours=2)),
+            (self.due, self.due + timedelta(hours=1)),
+        ])
+
+    def test_calendar_search_window_shrinks_when_the_longest_commitment_goes(self):
+        calendar = schedule.Calendar()
+        calendar.add(schedule.Commitment(self.due - timedelta(days=1), self.due, 1))
+        calendar.add(schedule.Commitment(self.due - timedelta(hours=2), self.due, 2))
+        self.assertEqual(calendar.longest, timedelta(days=1))
+        calendar.remove(1)
+        self.assertEqual(calendar.longest, timedelta(hours=2))
+        self.assertEqual([c.order_id for c in calendar.overlapping(self.due - timedelta(hours=1), self.due)], [2])
+        calendar.remove(2)
+        self.assertEqual(calendar.longest, timedelta(0))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+class OrderFacetTests(TestCase):
+    def setUp(self):
+        self.customer = make_customer()
+        self.index = facets.OrderFacetIndex()
+
+    def make_order(self, categories=(), dietary=()):
+        return make_order(self.customer, categories=facets.CATEGORY_BITS.encode(categories),
+                          dietary_tags=facets.DIETARY_BITS.encode(dietary))
+
+    def browse(self, before=None, limit=30, **selected):
+        self.index.refresh(force=True)
+        return self.index.browse(selected, before, limit)
+
+    def test_counts_ignore_their_own_facet_selection(self):
+        lamb = self.make_order(['meat'], ['halal'])
+        self.make_order(['seafood'], ['halal'])
+        self.make_order(['meat'], ['vegan'])
+        page = self.browse(category=['meat'], dietary=['halal'])
+        self.assertEqual((page.order_ids, page.count), ([lamb.id], 1))
+        # Categories among the halal orders, dietary tags among the meat ones
+        self.assertEqual((page.facets['category']['meat'], page.facets['category']['seafood']), (1, 1))
+        self.assertEqual((page.facets['dietary']['halal'], page.facets['dietary']['vegan']), (1, 1))
+        self.assertEqual(self.browse(category=['meat', 'seafood']).count, 3)
+
+    def test_cursor_pages_newest_first(self):
+        orders = [self.make_order(['grain']) for _ in range(5)]
+        seen, before = [], None
+        while True:
+            page = self.browse(before, limit=2, category=['grain'])
+            self.assertEqual(page.count, 5)
+            seen += page.order_ids
+            if not page.has_more:
+                break
+            before = facets.decode_cursor(page.cursor)
+        self.assertEqual(seen, [order.id for order in reversed(orders)])
+        self.assertIsNone(page.cursor)
+
+    def test_changed_orders_keep_their_slot_until_a_rebuild(self):
+        orders = [self.make_order(['meat']) for _ in range(3)]
+        self.browse()
+        orders[0].categories = facets.CATEGORY_BITS.encode(['fruit'])
+        orders[0].save()
+        self.index.order_saved(orders[0])
+        self.assertEqual(self.index.slot_of[orders[0].id], 0)
+        self.assertEqual(self.index.browse({'category': ['fruit']}).order_ids, [orders[0].id])
+        self.assertEqual(self.index.browse({'category': ['meat']}).count, 2)
+
+        for order in orders[:2]:
+            order.status = 'cancelled'
+            order.save()
+            self.index.order_saved(order)
+        self.assertEqual((len(self.index), self.index.dead), (1, 2))
+        self.assertEqual(self.index.slot_of, {orders[2].id: 2})
+        # Once dead slots outnumber live ones (past the threshold) they are compacted away
+        with mock.patch.object(facets, 'REBUILD_AFTER_DEAD_SLOTS', 0):
+            self.browse()
+        self.assertEqual((self.index.slot_of, self.index.dead), ({orders[2].id: 0}, 0))
+
+    def test_refresh_picks_up_other_workers_writes(self):
+        kept, closed, deleted = (self.make_order(['meat']) for _ in range(3))
+        self.assertEqual(self.browse().count, 3)
+        # Set-based writes (another process, expiry) send nothing to this index
+        Order.objects.filter(pk=closed.pk).update(status='cancelled', updated_at=timezone.now())
+        Order.objects.filter(pk=kept.pk).update(dietary_tags=facets.DIETARY_BITS.encode(['halal']),
+                                                updated_at=timezone.now())
+        Order.objects.filter(pk=deleted.pk).delete()
+        page = self.browse(dietary=['halal'])
+        self.assertEqual((page.order_ids, len(self.index)), ([kept.id], 1))
+
+        # An order created before the newest slot arrives out of order and forces a rebuild
+        late = self.make_order(['meat'])
+        Order.objects.filter(pk=late.pk).update(created_at=kept.created_at - timedelta(seconds=1))
+        self.assertEqual(self.browse(category=['meat']).order_ids, [kept.id, late.id])
+        self.assertTrue(self.index.in_order)
+
+
+class ChefMatchingTests(TestCase):
+    def setUp(self):
+        self.index = matching.ChefIndex()
+
+    def make_chef(self, email, specialty):
+        chef = make_chef(email)
+        Chef.objects.filter(pk=chef.pk).update(specialty=specialty)
+        return chef
+
+    def top_ids(self, text):
+        self.index.refresh(force=True)
+        return [match.chef_id for match in self.index.top(text, 10)]
+
+    def test_refresh_patches_changed_chefs_in_place(self):
+        cook = self.make_chef('cook@example.com', 'Karahi and nihari')
+        self.assertEqual(self.top_ids('karahi')[0], cook.id)
+        baker = self.make_chef('baker@example.com', 'Biryani and pulao')
+        self.assertEqual(self.top_ids('biryani')[0], baker.id)
+        Chef.objects.filter(pk=cook.pk).update(specialty='Biryani', updated_at=timezone.now())
+        self.top_ids('biryani')
+        self.assertEqual(self.index.row_of, {cook.id: 0, baker.id: 1})
+        self.assertEqual(self.index.posting('karahi').tolist(), [])
+        self.assertEqual(self.index.top('biryani', 1)[0].chef_id, cook.id)
+
+    def test_deleted_chefs_drop_out_of_the_index(self):
+        kept = self.make_chef('kept@example.com', 'Biryani')
+        gone = self.make_chef('gone@example.com', 'Biryani')
+        self.assertEqual(set(self.top_ids('biryani')), {kept.id, gone.id})
+        gone.user.delete()
+        self.assertEqual(self.top_ids('biryani'), [kept.id])
+        self.assertEqual(len(self.index), 1)
+
+
+# Query budgets
+#
+# Every route gets a maximum number of queries, checked with 10 and again
+# with 1,000 orders (and bids, messages, transactions...) in the database:
+# the count must stay the same, so an N+1 fails here instead of in
+# production. Request times at the largest scale are compared with
+# perf_baselines.json, where a route without a baseline fails too;
+# PERF_BASELINES=update rewrites it after an intended change (or a new
+# route), PERF_BASELINES=off skips the comparison (e.g. on shared runners),
+# and PERF_TOLERANCE scales the allowed slowdown.
+
+SCALES = (10, 1000)
+RUNS = 3
+BASELINES_PATH = Path(__file__).with_name('perf_baselines.json')
+# A request may take this many times its baseline, plus PERF_SLACK_MS
+PERF_TOLERANCE = float(os.getenv('PERF_TOLERANCE', 3.0))
+PERF_SLACK_MS = 25.0
+
+
+class Marketplace:
+    """
+    A customer, a chef and an admin with a growing history behind them. The
+    *_order/*_bid methods create a fresh target for a request that changes
+    it, so every run measures the same transition.
+    """
+
+    def __init__(self):
+        self.customer = make_customer('budget-customer@example.com')
+        self.chef = make_chef('budget-chef@example.com')
+        self.admin = CustomUser.objects.create_user(
+            email='budget-admin@example.com', password='pass12345', user_type='admin')
+        self.busy_order = make_order(self.customer, title='Order everyone bid on')
+        self.chefs = []
+        self.size = 0
+        self.tokens = {}
+        self.new_users = 0
+        self.slots = 0
+
+    def grow(self, size):
+        """Adds rows until there are `size` orders, bids per order, messages, transactions..."""
+        count = size - self.size
+        chef_count = size // 10 - len(self.chefs)
+        if chef_count > 0:
+            users = CustomUser.objects.bulk_create([
+                CustomUser(email=f'budget-chef{len(self.chefs) + i}@example.com', user_type='chef')
+                for i in range(chef_count)
+            ])
+            chefs = Chef.objects.bulk_create([Chef(user=user, full_name=user.email) for user in users])
+            Bid.objects.bulk_create([
+                Bid(order=self.busy_order, chef=chef, proposed_price=Decimal('1400.00') + i,
+                    delivery_estimate=timedelta(hours=2))
+                for i, chef in enumerate(chefs)
+            ])
+            self.chefs.extend(chefs)
+
+        statuses = ['open', 'accepted', 'completed', 'cancelled']
+        orders = Order.objects.bulk_create([
+            Order(
+                customer=self.customer, title=f'Order {self.size + i}', description='Daal chawal for 2',
+                max_budget=Decimal('2000.00'), delivery_address='House 1, Street 2',
+                # Spread out, so the chef's accepted orders don't all compete for one slot
+                preferred_delivery_time=timezone.now() + timedelta(days=1, hours=4 * (self.size + i)),
+                status=statuses[i % 4], accepted_chef=self.chef if i % 4 in (1, 2) else None,
+            )
+            for i in range(count)
+        ])
+        bids = []
+        for i, order in enumerate(orders):
+            bids.append(Bid(order=order, chef=self.chef, proposed_price=Decimal('1500.00'),
+                            delivery_estimate=timedelta(hours=2),
+                            status='accepted' if order.accepted_chef_id else 'pending'))
+            if self.chefs:
+                bids.append(Bid(order=order, chef=self.chefs[i % len(self.chefs)], proposed_price=Decimal('1600.00'),
+                                delivery_estimate=timedelta(hours=3),
+                                status='declined' if order.accepted_chef_id else 'pending'))
+        Bid.objects.bulk_create(bids)
+        Review.objects.bulk_create([
+            Review(order=order, customer=self.customer, chef=self.chef, rating=4.0, comment='Tasty')
+            for order in orders if order.status == 'completed'
+        ])
+        ChatMessage.objects.bulk_create([
+            ChatMessage(order=self.busy_order, message=f'Message {i}',
+                        sender=self.customer.user if i % 2 else self.chef.user,
+                        receiver=self.chef.user if i % 2 else self.customer.user)
+            for i in range(count)
+        ])
+        wallet, _ = Wallet.objects.get_or_create(user=self.chef.user)
+        admin_wallet, _ = Wallet.objects.get_or_create(user=self.admin)
+        Transaction.objects.bulk_create([
+            Transaction(wallet=wallet, transaction_type='credit', amount=Decimal('95.00'), description='Order payout')
+            for _ in range(count)
+        ] + [
+            Transaction(wallet=admin_wallet, transaction_type='commission', amount=Decimal('5.00'),
+                        description=self.chef.full_name)
+            for _ in range(count)
+        ])
+        Notification.objects.bulk_create([
+            Notification(user=self.customer.user, type='bid', message=f'New bid {i}') for i in range(count)
+        ])
+        self.size = size
+
+    def user(self, role):
+        return {'customer': self.customer.user, 'chef': self.chef.user, 'admin': self.admin}[role]
+
+    def token(self, user):
+        if user.pk not in self.tokens:
+            self.tokens[user.pk] = Token.objects.get_or_create(user=user)[0].key
+        return self.tokens[user.pk]
+
+    # Fresh targets
+
+    def open_order(self):
+        # Past the seeded orders, each in a slot of its own
+        self.slots += 1
+        return make_order(self.customer, preferred_delivery_time=timezone.now() + timedelta(days=365, hours=4 * self.slots))
+
+    def pending_bid(self):
+        return make_bid(self.open_order(), self.chef)
+
+    def accepted_order(self):
+        return order_state.accept_bid(self.pending_bid())
+
+    def delivered_order(self):
+        return order_state.fulfill(self.accepted_order())
+
+    def completed_order(self):
+        order = self.delivered_order()
+        order_state.complete(order, Bid.objects.select_related('chef__user').get(order=order, status='accepted'))
+        return order
+
+    def new_email(self):
+        self.new_users += 1
+        return f'budget-new{self.new_users}@example.com'
+
+    def new_user(self, user_type='customer', **fields):
+        return CustomUser.objects.create_user(
+            email=self.new_email(), password='pass12345', user_type=user_type, **fields)
+
+
+class Endpoint:
+    """
+    A route and the most queries one request to it may run. `path`, `data`
+    and `user` are filled in from the Marketplace before each request;
+    `user` is a role ('customer', 'chef', 'admin'), a function returning a
+    user, or None for anonymous calls.
+    """
+
+    def __init__(self, route, queries, method='GET', user='customer', path=None, data=None, status=200):
+        self.route = route
+        self.queries = queries
+        self.method = method
+        self.user = user
+        self.path = path or (lambda market: route)
+        self.data = data
+        self.status = status
+
+
+class QueryBudgetMixin:
+    """Checks `endpoints`, which must cover every route of `urlconf`, mounted under `prefix`."""
+    urlconf = None
+    prefix = '/'
+    endpoints = []
+
+    def test_every_route_has_a_budget(self):
+        routes = {str(pattern.pattern) for pattern in import_module(self.urlconf).urlpatterns}
+        self.assertEqual(routes - {endpoint.route for endpoint in self.endpoints}, set(),
+                         f'Routes in {self.urlconf} need an Endpoint in {type(self).__name__}.endpoints')
+
+    @override_settings(
+        CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS,
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+        # Every Nth socket event also prunes the event log, which would make counts vary
+        REALTIME_PRUNE_EVERY=0,
+        # So the rows seeded a moment ago are already in the sync feeds
+        SYNC_SETTLE_SECONDS=0,
+    )
+    def test_queries_and_timings_stay_within_budget(self):
+        market = Marketplace()
+        queries = {endpoint.route: [] for endpoint in self.endpoints}
+        timings = {}
+        for scale in SCALES:
+            market.grow(scale)
+            for endpoint in self.endpoints:
+                elapsed = []
+                for _ in range(RUNS):
+                    count, seconds = self.measure(market, endpoint)
+                    queries[endpoint.route].append(count)
+                    elapsed.append(seconds)
+                timings[endpoint.route] = statistics.median(elapsed) * 1000
+
+        baselines = load_baselines()
+        mode = os.getenv('PERF_BASELINES', 'check')
+        report, failures = [], []
+        for endpoint in self.endpoints:
+            key = f'{endpoint.method} {self.prefix}{endpoint.route}'
+            counts, ms = queries[endpoint.route], timings[endpoint.route]
+            baseline = baselines.get(key)
+            problems = []
+            if len(set(counts)) > 1:
+                problems.append('query count varies with the data')
+            if max(counts) > endpoint.queries:
+                problems.append(f'over its budget of {endpoint.queries} queries')
+            if mode == 'check' and baseline is None:
+                problems.append('no timing baseline (record one with PERF_BASELINES=update)')
+            elif mode == 'check' and ms > max(baseline * PERF_TOLERANCE, baseline + PERF_SLACK_MS):
+                problems.append(f'slower than its {baseline:.1f} ms baseline')
+            report.append(
+                f"{'!!' if problems else '  '} {key:<52} queries {'/'.join(map(str, sorted(set(counts)))):>7} "
+                f"(budget {endpoint.queries:>2})  {ms:8.1f} ms (baseline {baseline if baseline is not None else '-'})"
+                + (f"  <- {', '.join(problems)}" if problems else '')
+            )
+            failures.extend(problems)
+            baselines[key] = round(ms, 1)
+        # Only rewritten on request, so a runner's timings never land in the tracked file
+        if mode == 'update':
+            save_baselines(baselines)
+        if failures:
+            self.fail(f'Performance budgets exceeded at {SCALES} orders:\n' + '\n'.join(report))
+
+    def measure(self, market, endpoint):
+        """(queries, seconds) of one request, after setting up its target."""
+        path = self.prefix + endpoint.path(market)
+        data = endpoint.data(market) if endpoint.data else None
+        if endpoint.user is None:
+            user = None
+        else:
+            user = endpoint.user(market) if callable(endpoint.user) else market.user(endpoint.user)
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {market.token(user)}')
+        # Every run starts cold: no cached responses, and in-process indexes
+        # that are fresh without refreshing during the request
+        cache.clear()
+        facets.index.refresh(force=True)
+        matching.index.refresh(force=True)
+        schedule.index.refresh(force=True)
+
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = getattr(client, endpoint.method.lower())(path, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            seconds = time.perf_counter() - start
+        self.assertEqual(response.status_code, endpoint.status,
+                         f'{endpoint.method} {path}: {getattr(response, "data", response)}')
+        return len(captured), seconds
+
+
+def load_baselines():
+    if BASELINES_PATH.exists():
+        return json.loads(BASELINES_PATH.read_text())
+    return {}
+
+
+def save_baselines(baselines):
+    # Other test modules share the file; keep what they recorded
+    merged = {**load_baselines(), **baselines}
+    BASELINES_PATH.write_text(json.dumps(dict(sorted(merged.items())), indent=2) + '\n')
+
+
+def new_order_data(market):
+    return {
+        'title': 'Nihari for 6', 'description': 'Beef nihari with naan', 'max_budget': '3000.00',
+        'delivery_address': 'House 9, Street 4',
+        'preferred_delivery_time': (timezone.now() + timedelta(days=1)).isoformat(),
+    }
+
+
+class ApiQueryBudgetTests(QueryBudgetMixin, TestCase):
+    urlconf = 'api.urls'
+    prefix = '/api/'
+    endpoints = [
+        Endpoint('admin-dashboard/', 4, user='admin'),
+        Endpoint('exports/<str:dataset>.<str:fmt>', 2, user='admin', path=lambda m: 'exports/orders.csv'),
+
+        Endpoint('chefs/top/', 5, user=None),
+        Endpoint('chefs/<int:chef_id>/', 8, user=None, path=lambda m: f'chefs/{m.chef.id}/'),
+        Endpoint('chef/stats/', 10, user='chef'),
+        Endpoint('chef/availability/', 2, user='chef'),
+
+        Endpoint('orders/', 2, user='chef'),
+        Endpoint('orders/create/', 9, method='POST', data=new_order_data, status=201),
+        Endpoint('orders/my/', 3),
+        Endpoint('orders/open/', 4, user='chef'),
+        Endpoint('orders/browse/', 2, user='chef'),
+        Endpoint('orders/<int:pk>/', 3, path=lambda m: f'orders/{m.busy_order.id}/'),
+        Endpoint('orders/<int:order_id>/fulfill/', 10, method='POST', user='chef',
+                 path=lambda m: f'orders/{m.accepted_order().id}/fulfill/'),
+        Endpoint('orders/<int:order_id>/complete/', 25, method='POST',
+                 path=lambda m: f'orders/{m.delivered_order().id}/complete/'),
+
+        Endpoint('orders/<int:order_id>/bids/', 9, path=lambda m: f'orders/{m.busy_order.id}/bids/'),
+        Endpoint('orders/<int:order_id>/bids/ranked/', 14, path=lambda m: f'orders/{m.busy_order.id}/bids/ranked/'),
+        Endpoint('orders/<int:order_id>/bid/', 21, method='POST', user='chef', status=201,
+                 path=lambda m: f'orders/{m.open_order().id}/bid/',
+                 data=lambda m: {'proposed_price': '1450.00', 'delivery_estimate': '02:00:00'}),
+        Endpoint('orders/<int:order_id>/price-suggestion/', 3, user='chef',
+                 path=lambda m: f'orders/{m.busy_order.id}/price-suggestion/'),
+        Endpoint('bids/<int:bid_id>/accept/', 23, method='POST', path=lambda m: f'bids/{m.pending_bid().id}/accept/'),
+        Endpoint('bids/my-bids/', 7, user='chef'),
+
+        Endpoint('chat/', 2),
+        Endpoint('chat/send/', 5, method='POST', status=201, data=lambda m: {
+            'order': m.busy_order.id, 'sender': m.customer.user.id, 'receiver': m.chef.user.id, 'message': 'On my way?',
+        }),
+        Endpoint('chat/<int:order_id>/', 3, path=lambda m: f'chat/{m.busy_order.id}/'),
+
+        Endpoint('orders/<int:order_id>/review/', 7, method='POST',
+                 path=lambda m: f'orders/{m.completed_order().id}/review/', data=lambda m: {'rating': 5, 'comment': 'Great'}),
+
+        Endpoint('wallet/', 3, user='chef'),
+
+        Endpoint('notifications/', 2),
+
+        Endpoint('sync/', 12, path=lambda m: f'sync/?tombstones={facets.encode_cursor((timezone.now(), 0))}'),
+    ]
@@ -0,0 +1,108 @@
+"""
+Token-bucket rate limits for chat messages, chat scrollback, socket replays and bids.
+
+Buckets are kept in the Django cache as a single "theoretical arrival
+time" per key (the GCRA form of a token bucket), so they are shared by
+every worker and node that shares the cache (set REDIS_CACHE_URL), and
+per process with the default in-memory cache. Two racing requests can
+both read the same value, so a burst may overshoot by one per racer.
+
+Limits come from settings.RATE_LIMITS:
+    {name: {'rate': tokens per second, 'burst': bucket size,
+            'action': 'drop' | 'delay' | 'close', 'max_delay': seconds}}
+`action` applies to sockets; HTTP endpoints always answer 429.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_LIMITS = {
+    'chat_message': {'rate': 1.0, 'burst': 5, 'action': 'drop', 'max_delay': 2.0},
+    # Scrollback pages requested over the chat socket
+    'chat_history': {'rate': 2.0, 'burst': 10},
+    # Replays requested over (or by reconnecting to) the orders socket
+    'socket_resume': {'rate': 0.2, 'burst': 5},
+    'place_bid': {'rate': 0.2, 'burst': 3},
+}
+
+
+def get_limit(name):
+    limits = getattr(settings, 'RATE_LIMITS', None) or DEFAULT_LIMITS
+    return {'action': 'drop', 'max_delay': 0.0, **DEFAULT_LIMITS.get(name, {}), **limits.get(name, {})}
+
+
+def _bucket_key(name, ident):
+    return f'ratelimit:{name}:{ident}'
+
+
+def _plan(stored, limit, now, max_wait):
+    """
+    Returns (wait, new_value): seconds until the request may proceed and
+    the value to store, or new_value None when it must be rejected.
+    """
+    interval = 1.0 / limit['rate']
+    arrival = max(stored or now, now)
+    # With a full bucket, `burst` requests fit before arrival runs ahead of now
+    wait = arrival + interval - limit['burst'] * interval - now
+    if wait > max_wait:
+        return wait, None
+    return max(wait, 0.0), arrival + interval
+
+
+def _timeout(limit):
+    return math.ceil(limit['burst'] / limit['rate']) + 1
+
+
+def take(name, ident, max_wait=0.0):
+    """
+    Takes a token from `ident`'s bucket. Returns (allowed, wait): when
+    allowed, `wait` is how long to hold the request (only with max_wait > 0);
+    otherwise how long until a token frees up.
+    """
+    limit = get_limit(name)
+    key = _bucket_key(name, ident)
+    wait, value = _plan(cache.get(key), limit, time.time(), max_wait)
+    if value is None:
+        return False, wait
+    cache.set(key, value, _timeout(limit))
+    return True, wait
+
+
+async def atake(name, ident, max_wait=0.0):
+    """
+    Async `take` for consumers. The in-memory cache is read directly: its
+    async methods would queue each decision on the ORM's thread.
+    """
+    if isinstance(caches['default'], LocMemCache):
+        return take(name, ident, max_wait)
+    limit = get_limit(name)
+    key = _bucket_key(name, ident)
+    wait, value = _plan(await cache.aget(key), limit, time.time(), max_wait)
+    if value is None:
+        return False, wait
+    await cache.aset(key, value, _timeout(limit))
+    return True, wait
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle over the same buckets, keyed by user (or client IP)."""
+    scope = None
+
+    def allow_request(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        allowed, self.retry_after = take(self.scope, ident)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class PlaceBidThrottle(TokenBucketThrottle):
+    scope = 'place_bid'
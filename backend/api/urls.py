@@ -4,25 +4,30 @@ from . import views
 urlpatterns = [
     # Admin
     path('admin-dashboard/', views.admin_dashboard, name='admin-dashboard'),
+    path('exports/<str:dataset>.<str:fmt>', views.export_data, name='export-data'),
 
 
     # Chefs 
     path("chefs/top/", views.top_chefs, name="top-chefs"),
     path("chefs/<int:chef_id>/", views.chef_profile, name="chef-profile"),
     path("chef/stats/", views.chef_stats, name="chef-stats"),
+    path("chef/availability/", views.chef_availability, name="chef-availability"),
 
     # Orders
     path('orders/', views.orders),
     path('orders/create/', views.create_order),
     path('orders/my/', views.customer_orders),
     path('orders/open/', views.open_orders),
+    path('orders/browse/', views.browse_orders),
     path('orders/<int:pk>/', views.order_detail),
     path('orders/<int:order_id>/fulfill/', views.fulfill_order),
     path('orders/<int:order_id>/complete/', views.mark_order_complete),
 
     # Bids
     path('orders/<int:order_id>/bids/', views.order_bids),
+    path('orders/<int:order_id>/bids/ranked/', views.ranked_bids),
     path('orders/<int:order_id>/bid/', views.place_bid),
+    path('orders/<int:order_id>/price-suggestion/', views.price_suggestion),
     path('bids/<int:bid_id>/accept/', views.accept_bid),
     path('bids/my-bids/', views.chef_bids),
 
@@ -39,4 +44,7 @@ urlpatterns = [
 
     # Notifications
     path('notifications/', views.get_notifications),
+
+    # Mobile sync
+    path('sync/', views.sync_changes),
 ]
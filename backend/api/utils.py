@@ -1,5 +1,6 @@
 from decimal import Decimal
 from django.db import transaction
+from django.db.models import F
 from accounts.models import Wallet, Transaction
 from django.contrib.auth import get_user_model
 
@@ -16,9 +17,9 @@ def credit_chef_wallet(chef_user, amount, order_id):
     chef_earnings = amount - comission_amount
 
     # Chef wallet 
+    # F() increments so concurrent credits to the same wallet can't overwrite each other
     chef_wallet = Wallet.objects.get(user=chef_user)
-    chef_wallet.balance += chef_earnings
-    chef_wallet.save()
+    Wallet.objects.filter(pk=chef_wallet.pk).update(balance=F('balance') + chef_earnings)
 
     Transaction.objects.create(
         wallet=chef_wallet,
@@ -31,8 +32,7 @@ def credit_chef_wallet(chef_user, amount, order_id):
     admin_user = User.objects.filter(is_superuser=True).first()
     if admin_user:
         admin_wallet = Wallet.objects.get(user=admin_user)
-        admin_wallet.balance += comission_amount
-        admin_wallet.save()
+        Wallet.objects.filter(pk=admin_wallet.pk).update(balance=F('balance') + comission_amount)
 
         Transaction.objects.create(
             wallet=admin_wallet,
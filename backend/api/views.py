@@ -1,22 +1,41 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
 from .serializers import (
     OrderSerializer, BidSerializer, ChatMessageSerializer,
-    ReviewSerializer, NotificationSerializer, TransactionSerializer
+    ReviewSerializer, NotificationSerializer, TransactionSerializer,
+    ArchivedOrderSerializer, ArchivedChatMessageSerializer, order_queryset,
 )
-from asgiref.sync import async_to_sync
+from asgiref.sync import async_to_sync, sync_to_async
 from channels.layers import get_channel_layer
-from accounts.models import Customer, Chef, Order, Bid, ChatMessage, Review, Notification, Wallet, Transaction
+from accounts.models import (
+    Customer, Chef, Order, Bid, ChatMessage, Review, Notification, Wallet, Transaction,
+    ArchivedOrder, ArchivedBid, ArchivedChatMessage, CATEGORY_BITS, DIETARY_BITS,
+)
 from .permissions import IsCustomer, IsChef, IsAmdin
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Q, Avg, Count, F, Sum
+from django.db.models import Q, Avg, F, OuterRef, Subquery, Sum
 from django.utils import timezone
 from django.db import models
 from datetime import timedelta
-from pprint import pprint
-from .utils import credit_chef_wallet
+import asyncio
+import logging
+from . import archive, exports, facets, order_state, pricing, ranking, schedule, sync
+from .async_api import alist, async_api_view
+from .caching import cached_view
+from .images import image_variant_urls
+from .throttling import PlaceBidThrottle
+from .fast_serializers import FastOrderSerializer, FastBidSerializer, FastTransactionSerializer
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
+from .conditional import (
+    conditional_json, open_orders_watermark, order_detail_watermark,
+    chef_profile_watermark, top_chefs_watermark
+)
+
+logger = logging.getLogger(__name__)
 
 
 @api_view(['POST'])
@@ -33,36 +52,78 @@ def create_order(request):
 
 @api_view(['GET'])
 @permission_classes([IsCustomer])
+@cached_view(lambda request: [f'user:{request.user.pk}:orders'])
 def customer_orders(request):
     customer = Customer.objects.get(user=request.user)
-    orders = Order.objects.filter(customer=customer)
+    orders = order_queryset().filter(customer=customer)
     serializer = OrderSerializer(orders, many=True)
     return Response(serializer.data)
 
-@api_view(['GET'])
-@permission_classes([IsChef])
-def open_orders(request):
-    orders = Order.objects.filter(status='open')
+@async_api_view(['GET'], permission_classes=[IsChef])
+@conditional_json(open_orders_watermark)
+async def open_orders(request):
+    if settings.FAST_LIST_SERIALIZERS:
+        orders = Order.objects.filter(status='open')
+        return Response(await sync_to_async(FastOrderSerializer().serialize)(orders))
+    orders = await alist(order_queryset().filter(status='open'))
     serializer = OrderSerializer(orders, many=True)
     return Response(serializer.data)
 
 
+@async_api_view(['GET'], permission_classes=[IsChef])
+async def browse_orders(request):
+    """
+    Open orders filtered by ?category=meat,seafood&dietary=halal (any of the
+    tags within a facet, every facet), newest first, with per-tag counts.
+    """
+    params = request.query_params
+    try:
+        selected = facets.parse_selection(params)
+        page = await sync_to_async(facets.browse_open_orders)(selected, params.get('cursor'), params.get('limit'))
+    except ValueError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # The index can trail other workers by a refresh, so closed orders are dropped here
+    if settings.FAST_LIST_SERIALIZERS:
+        orders = Order.objects.filter(id__in=page.order_ids, status='open')
+        data = await sync_to_async(FastOrderSerializer().serialize)(orders)
+    else:
+        orders = await alist(order_queryset().filter(id__in=page.order_ids, status='open'))
+        data = OrderSerializer(orders, many=True).data
+    by_id = {item['id']: item for item in data}
+    return Response({
+        'count': page.count,
+        'facets': page.facets,
+        'results': [by_id[order_id] for order_id in page.order_ids if order_id in by_id],
+        'cursor': page.cursor,
+        'has_more': page.has_more,
+    })
+
+
 @api_view(['GET'])
 @permission_classes([IsChef])
 def orders(request): # Get all orders
-    orders = Order.objects.all()
+    orders = order_queryset()
     serializer = OrderSerializer(orders, many=True)
-    pprint(serializer.data)
+    logger.debug("orders: returning %d orders", len(serializer.data))
     return Response(serializer.data)
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def order_detail(request, pk): # Get order details
-    order = Order.objects.get(id=pk)
+@async_api_view(['GET'], permission_classes=[IsAuthenticated])
+@conditional_json(order_detail_watermark)
+async def order_detail(request, pk): # Get order details
+    order = await order_queryset().filter(id=pk).afirst()
+    if order is None:
+        # Old finished orders live in the archive under the same id
+        return Response(await sync_to_async(archived_order_detail)(pk))
     serializer = OrderSerializer(order)
     return Response(serializer.data)
 
 
+def archived_order_detail(pk):
+    archived = get_object_or_404(ArchivedOrder.objects.select_related('customer', 'accepted_chef__user', 'image_asset'), id=pk)
+    return ArchivedOrderSerializer(archived).data
+
+
 
 @api_view(['GET'])
 @permission_classes([IsChef])
@@ -74,6 +135,7 @@ def chef_bids(request):
 
 @api_view(['POST'])
 @permission_classes([IsChef])
+@throttle_classes([PlaceBidThrottle])
 def place_bid(request, order_id):
     """
     Allows a chef to place a bid on an open order.
@@ -97,9 +159,14 @@ def place_bid(request, order_id):
 
     serializer = BidSerializer(data=data)
     if serializer.is_valid():
+        busy_with = schedule.conflicts(
+            chef.id, *schedule.window(order.preferred_delivery_time, serializer.validated_data['delivery_estimate']))
+        if busy_with:
+            return Response({'detail': 'You are already fully booked around this delivery time.',
+                             'conflicting_orders': busy_with}, status=status.HTTP_409_CONFLICT)
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
-    print(f"Serializer errors: {serializer.errors}")
+    logger.debug("place_bid rejected: order=%s chef=%s errors=%s", order.id, chef.id, serializer.errors)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -110,9 +177,64 @@ def order_bids(request, order_id):
     if order.customer.user != request.user:
         return Response({'error': 'Not authorized'}, status=403)
     bids = order.bids.all()
-    serializer = BidSerializer(bids, many=True)
-    print(f"Bid Serializer data: {serializer.data}")
-    return Response(serializer.data)
+    if settings.FAST_LIST_SERIALIZERS:
+        data = FastBidSerializer().serialize(bids)
+    else:
+        data = BidSerializer(bids, many=True).data
+    logger.debug("order_bids: order=%s bids=%d", order.id, len(data))
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsCustomer])
+def ranked_bids(request, order_id):
+    """
+    The order's best pending bids (?k=, default 10), each with its score and
+    the per-component breakdown it was ranked on.
+    """
+    order = get_object_or_404(Order, id=order_id)
+    if order.customer.user != request.user:
+        return Response({'error': 'Not authorized'}, status=403)
+    try:
+        k = min(int(request.query_params.get('k', 10)), 100)
+    except ValueError:
+        return Response({'detail': 'k must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    top, total = ranking.top_bids(order, max(k, 1))
+    bids = Bid.objects.filter(id__in=[ranked.bid_id for ranked in top])
+    if settings.FAST_LIST_SERIALIZERS:
+        serialized = FastBidSerializer().serialize(bids)
+    else:
+        serialized = BidSerializer(bids, many=True).data
+    by_id = {bid['id']: bid for bid in serialized}
+
+    return Response({
+        'order': order.id,
+        'total_bids': total,
+        'weights': ranking.get_weights(),
+        'results': [
+            {
+                'rank': position,
+                'score': ranked.score,
+                'breakdown': ranked.breakdown,
+                'bid': by_id[ranked.bid_id],
+            }
+            # A bid withdrawn since the ranking was cached is simply skipped
+            for position, ranked in enumerate(top, start=1) if ranked.bid_id in by_id
+        ],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsChef])
+def price_suggestion(request, order_id):
+    """
+    The price range bids were accepted at on similar orders: same food
+    categories, region and budget band where there is enough history.
+    """
+    order = get_object_or_404(Order.objects.select_related('customer'), id=order_id)
+    # None until a first bid has been accepted anywhere
+    return Response({'order': order.id, 'max_budget': order.max_budget, 'suggestion': pricing.suggest(order)})
 
 
 @api_view(['POST'])
@@ -129,14 +251,16 @@ def accept_bid(request, bid_id):
     if order.status != 'open':
         return Response({'detail': 'This order is no longer open for bidding.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    bid.status = 'accepted'
-    bid.save()
-
-    Bid.objects.filter(order=order).exclude(id=bid.id).update(status='declined')
-
-    order.accepted_chef = bid.chef
-    order.status = 'accepted'
-    order.save()
+    try:
+        order = order_state.accept_bid(bid)
+    except order_state.InvalidTransition as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except order_state.StaleOrder:
+        return Response({'detail': 'This order was updated by another request. Please refresh and try again.'},
+                        status=status.HTTP_409_CONFLICT)
+    except order_state.ChefUnavailable:
+        return Response({'detail': 'This chef is fully booked around your delivery time. Please pick another bid.'},
+                        status=status.HTTP_409_CONFLICT)
 
     # # Notify chef (real-time)
     # channel_layer = get_channel_layer()
@@ -176,8 +300,14 @@ def fulfill_order(request, order_id):
                         status=status.HTTP_403_FORBIDDEN)
 
     # Update the order status
-    order.status = 'delivered'
-    order.save()
+    try:
+        order_state.fulfill(order)
+    except order_state.InvalidTransition:
+        return Response({'detail': f"An order that is '{order.status}' cannot be marked as delivered."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    except order_state.StaleOrder:
+        return Response({'detail': 'This order was updated by another request. Please refresh and try again.'},
+                        status=status.HTTP_409_CONFLICT)
 
     # Optionally notify the customer via WebSocket signal
     """
@@ -210,19 +340,15 @@ def mark_order_complete(request, order_id):
     if not accepted_bid:
         return Response({'detail': 'No accepted bid found for this order.'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # Mark as completed 
-    order.status = 'completed'
-    order.save()
-
-    # Credit chef and admin wallets 
-    result = credit_chef_wallet(accepted_bid.chef.user, accepted_bid.proposed_price, order.id)
-
-    # Create or update review placeholder 
-    review, created = Review.objects.get_or_create(
-        order=order, 
-        customer=order.customer, 
-        chef=accepted_bid.chef
-    )
+    # Mark as completed, credit chef and admin wallets and create the review placeholder
+    try:
+        result, review = order_state.complete(order, accepted_bid)
+    except order_state.InvalidTransition:
+        return Response({'detail': f"An order that is '{order.status}' cannot be completed."},
+                        status=status.HTTP_400_BAD_REQUEST)
+    except order_state.StaleOrder:
+        return Response({'detail': 'This order was updated by another request. Please refresh and try again.'},
+                        status=status.HTTP_409_CONFLICT)
 
     serializer = ReviewSerializer(review)
     return Response({
@@ -235,64 +361,89 @@ def mark_order_complete(request, order_id):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_view(lambda request: [f'user:{request.user.pk}:wallet'])
 def get_wallet_details(request):
     try:
         wallet = Wallet.objects.get(user=request.user)
         transactions = wallet.transactions.all().order_by('-created_at')
 
+        if settings.FAST_LIST_SERIALIZERS:
+            transaction_data = FastTransactionSerializer().serialize(transactions)
+        else:
+            transaction_data = TransactionSerializer(transactions, many=True).data
         data = {
             "balance": wallet.balance,
-            "transactions": TransactionSerializer(transactions, many=True).data
+            "transactions": transaction_data
         }
         return Response(data)
     except Wallet.DoesNotExist:
         return Response({"error": "Wallet not found"}, status=404)
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def top_chefs(request):
-    # Aggregate chef stats
-    chefs = Chef.objects.annotate(
-        avg_rating=Avg('reviews__rating'),
-        completed_orders=Count(
-            'accepted_orders',
-            filter=Q(bids__order__status='completed'),
-            distinct=True
-        ),
-        total_bids=Count('bids', distinct=True),
+@async_api_view(['GET'], permission_classes=[AllowAny])
+@conditional_json(top_chefs_watermark)
+async def top_chefs(request):
+    # ?category=...&dietary=... narrow the list, as in browse_orders
+    try:
+        selected = facets.parse_selection(request.query_params)
+    except ValueError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    # Aggregate chef stats, each in its own subquery: joining reviews, orders and
+    # bids together multiplies their rows per chef before DISTINCT can count them
+    chefs = facets.filter_by_tags(Chef.objects.all(), selected).select_related('user__profile_image_asset').annotate(
+        avg_rating=Subquery(
+            Review.objects.filter(chef=OuterRef('pk')).values('chef').annotate(avg=Avg('rating')).values('avg')),
+        total_reviews=archive.chef_count_subquery(Review.objects.all(), 'chef'),
+        completed_orders=archive.chef_count_subquery(Order.objects.filter(status='completed'), 'accepted_chef')
+        + archive.chef_count_subquery(ArchivedOrder.objects.filter(status='completed'), 'accepted_chef'),
+        total_bids=archive.chef_count_subquery(Bid.objects.all(), 'chef')
+        + archive.chef_count_subquery(ArchivedBid.objects.all(), 'chef'),
     ).annotate(
         success_rate=F('completed_orders') * 100.0 / F('total_bids')
     ).order_by('-avg_rating', '-success_rate', '-completed_orders')[:20]
 
     data = []
-    for chef in chefs:
+    for chef in await alist(chefs):
         data.append({
             "id": chef.id,
             "name": chef.full_name,
             "specialty": chef.specialty,
+            "categories": CATEGORY_BITS.decode(chef.categories),
+            "dietary_tags": DIETARY_BITS.decode(chef.dietary_tags),
             "bio": chef.bio,
+            "profile_image": image_variant_urls(chef.user.profile_image_asset),
             "rating": round(chef.avg_rating or 0, 1),
             "success_rate": round(chef.success_rate or 0, 1),
             "completed_orders": chef.completed_orders,
-            "total_reviews": chef.reviews.all().count(),
-            "total_bids": chef.bids.all().count()
+            "total_reviews": chef.total_reviews,
+            "total_bids": chef.total_bids
         })
-    print(f"Top chefs data: {data}")
+    logger.debug("top_chefs: %d chefs", len(data))
     return Response(data)
 
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def chef_profile(request, chef_id):
-    chef = get_object_or_404(Chef, id=chef_id)
-    reviews = Review.objects.filter(chef=chef).select_related("customer").order_by("-created_at")
+@async_api_view(["GET"], permission_classes=[AllowAny])
+@conditional_json(chef_profile_watermark)
+async def chef_profile(request, chef_id):
+    # None of these depend on each other, so they are issued together
+    chef, reviews, rating, accepted, archived = await asyncio.gather(
+        Chef.objects.select_related('user__profile_image_asset').filter(id=chef_id).afirst(),
+        alist(Review.objects.filter(chef_id=chef_id).select_related("customer").order_by("-created_at")),
+        Review.objects.filter(chef_id=chef_id).aaggregate(Avg("rating")),
+        Order.objects.filter(accepted_chef_id=chef_id).acount(),
+        ArchivedOrder.objects.filter(accepted_chef_id=chef_id).acount(),
+    )
+    if chef is None:
+        raise Http404("No Chef matches the given query.")
 
     data = {
         "id": chef.id,
         "name": chef.full_name,
         "bio": chef.bio,
         "specialty": chef.specialty,
-        "rating": round(chef.reviews.aggregate(Avg("rating"))["rating__avg"] or 0, 1),
-        "completed_orders": chef.accepted_orders.all().count(),
+        "categories": CATEGORY_BITS.decode(chef.categories),
+        "dietary_tags": DIETARY_BITS.decode(chef.dietary_tags),
+        "profile_image": image_variant_urls(chef.user.profile_image_asset),
+        "rating": round(rating["rating__avg"] or 0, 1),
+        "completed_orders": accepted + archived,
         "reviews": [
             {
                 "id": r.id,
@@ -323,8 +474,11 @@ def chef_stats(request):
         created_at__date=today
     ).aggregate(total=models.Sum('amount'))['total'] or 0
 
-    total_bids_all_time = Bid.objects.filter(chef=chef).count()
-    total_completed_orders = Order.objects.filter(accepted_chef=chef, status='completed').distinct().count()
+    archived = archive.archived_chef_counts([chef.id])[chef.id]
+    total_bids_all_time = Bid.objects.filter(chef=chef).count() + archived.bids
+    total_completed_orders = (
+        Order.objects.filter(accepted_chef=chef, status='completed').distinct().count() + archived.completed
+    )
     success_rate = round((total_completed_orders / total_bids_all_time) * 100, 2) if total_bids_all_time else 0
 
     wallet = Wallet.objects.filter(user=request.user).first()
@@ -344,6 +498,39 @@ def chef_stats(request):
     }
     return Response(data)
 
+@api_view(['GET'])
+@permission_classes([IsChef])
+def chef_availability(request):
+    """
+    The chef's commitments between ?from= and ?to= (dates or datetimes,
+    default the next SCHEDULE_HORIZON_DAYS) and the slots where they can
+    still take orders, optionally only those of at least ?minutes=.
+    """
+    chef = get_object_or_404(Chef, user=request.user)
+    params = request.query_params
+    try:
+        start = exports.parse_bound(params.get('from')) or timezone.now()
+        end = exports.parse_bound(params.get('to'), end=True) \
+            or start + timedelta(days=getattr(settings, 'SCHEDULE_HORIZON_DAYS', 7))
+        minimum = timedelta(minutes=int(params.get('minutes', 0)))
+    except ValueError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    if not start < end <= start + timedelta(days=31):
+        return Response({'detail': 'to must be after from, and at most 31 days later.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    commitments, slots = schedule.agenda(chef.id, start, end)
+    return Response({
+        'capacity': schedule.capacity(),
+        'from': start,
+        'to': end,
+        'commitments': [{'order': c.order_id, 'start': c.start, 'end': c.end} for c in commitments],
+        'available': [
+            {'start': slot_start, 'end': slot_end, 'free': free}
+            for slot_start, slot_end, free in slots if slot_end - slot_start >= minimum
+        ],
+    })
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def admin_dashboard(request):
@@ -369,9 +556,31 @@ def admin_dashboard(request):
             for t in latest_commissions
         ],
     }
-    print(f"Data: {data}")
+    logger.debug("admin_dashboard: total_commission=%s transactions=%s", total_commission, total_transactions)
     return Response(data)
 
+
+# GET /exports/<dataset>.<fmt>?since=YYYY-MM-DD&until=YYYY-MM-DD
+@api_view(['GET'])
+@permission_classes([IsAmdin])
+def export_data(request, dataset, fmt):
+    """Streams orders, bids or transactions as CSV or NDJSON, filtered on created_at."""
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        return Response({'detail': 'Unknown export.'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        since = exports.parse_bound(request.query_params.get('since'))
+        until = exports.parse_bound(request.query_params.get('until'), end=True)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    chunks = exports.export_chunks(dataset, fmt, since, until)
+    if isinstance(request._request, ASGIRequest):
+        chunks = exports.aiter_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    logger.debug("export_data: dataset=%s fmt=%s since=%s until=%s", dataset, fmt, since, until)
+    return response
+
 @api_view(['POST'])
 def send_message(request):
     data = request.data
@@ -390,22 +599,27 @@ def send_message(request):
 def list_user_chats(request):
     chats = ChatMessage.objects.filter(
         Q(sender=request.user)
-    ).order_by('-timestamp')
+    ).select_related('sender').order_by('-timestamp')
     serializer = ChatMessageSerializer(chats, many=True, context={'request': request})
-    print(f"Serializer data: {serializer.data}")
+    logger.debug("list_user_chats: user=%s messages=%d", request.user.id, len(serializer.data))
     return Response(serializer.data)
 
 
 @api_view(['GET'])
+@cached_view(lambda request, order_id: [f'order:{order_id}:chat'], per_user=False)
 def get_chat_messages(request, order_id):
-    messages = ChatMessage.objects.filter(order_id=order_id).order_by('timestamp')
-    serializer = ChatMessageSerializer(messages, many=True)
-    return Response(serializer.data)
+    # One serializer per kind: building one per message rebuilds its fields every time
+    hot, archived = ChatMessageSerializer(), ArchivedChatMessageSerializer()
+    data = []
+    for message in archive.chat_history(order_id):
+        serializer = archived if isinstance(message, ArchivedChatMessage) else hot
+        data.append(serializer.to_representation(message))
+    return Response(data)
 
 @api_view(['POST'])
 @permission_classes([IsCustomer])
 def submit_review(request, order_id):
-    print("Data received in review request: ", request.data)
+    logger.debug("submit_review: order=%s fields=%s", order_id, list(request.data))
     try:
         review = Review.objects.get(order__id=order_id, customer__user=request.user)
     except Review.DoesNotExist:
@@ -420,8 +634,25 @@ def submit_review(request, order_id):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['GET'])
-def get_notifications(request):
-    notifications = Notification.objects.filter(user=request.user).order_by('-created_at')
+@async_api_view(['GET'])
+@cached_view(lambda request: [f'user:{request.user.pk}:notifications'])
+async def get_notifications(request):
+    notifications = await alist(Notification.objects.filter(user=request.user).order_by('-created_at'))
     serializer = NotificationSerializer(notifications, many=True)
     return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync_changes(request):
+    """
+    Everything of the caller's that changed since the watermarks in
+    ?orders=&bids=&chat=&notifications=&transactions=&tombstones= (each as
+    returned by the previous sync; omit one to get that feed from the start).
+    """
+    params = request.query_params
+    try:
+        data = sync.changes(request.user, sync.parse_watermarks(params), params.get('limit'))
+    except ValueError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
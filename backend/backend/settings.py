@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -104,9 +105,109 @@ DATABASES = {
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
-    ]
+    ],
+    # orjson-backed when installed, otherwise identical to DRF's JSON classes
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Serve open orders, order bids and wallet transactions through the
+# precompiled serializers in api/fast_serializers.py (same JSON output)
+FAST_LIST_SERIALIZERS = os.getenv('FAST_LIST_SERIALIZERS', 'false').lower() == 'true'
+
+# Component weights for ranked bids (see api/ranking.py)
+BID_RANKING_WEIGHTS = {'price': 0.35, 'delivery': 0.25, 'rating': 0.25, 'completion': 0.15}
+
+# Chef matching for new orders (see api/matching.py): how many chefs get the
+# order pushed to them, how far ahead of the general broadcast, and how
+# often each worker re-reads changed chefs into its feature matrix
+CHEF_MATCHING_WEIGHTS = {'specialty': 0.35, 'distance': 0.2, 'rating': 0.2, 'activity': 0.15, 'workload': 0.1}
+MATCHING_TOP_N = int(os.getenv('MATCHING_TOP_N', 20))
+MATCHING_HEAD_START_SECONDS = float(os.getenv('MATCHING_HEAD_START_SECONDS', 0))
+MATCHING_REFRESH_SECONDS = int(os.getenv('MATCHING_REFRESH_SECONDS', 30))
+# Faceted open order browsing (api/facets.py)
+FACETS_REFRESH_SECONDS = float(os.getenv('FACETS_REFRESH_SECONDS', 5))
+FACETS_PAGE_SIZE = 30
+# Suggested bid prices (api/pricing.py): prices a segment needs before it is used,
+# and the max_budget band edges
+PRICING_MIN_SAMPLES = int(os.getenv('PRICING_MIN_SAMPLES', 20))
+PRICING_BUDGET_BANDS = [500, 1000, 2000, 5000, 10000, 20000]
+# Admin changelists (accounts/admin.py): above this many rows, unfiltered pages show the
+# database's row estimate and filtered pages stop counting here
+ADMIN_EXACT_COUNT_LIMIT = int(os.getenv('ADMIN_EXACT_COUNT_LIMIT', 10000))
+# Replay log of ws/orders/ events (api/events.py): events kept, the most a reconnecting
+# client is replayed before being told to resync, and how often old events are pruned
+REALTIME_LOG_SIZE = int(os.getenv('REALTIME_LOG_SIZE', 10000))
+REALTIME_REPLAY_MAX_EVENTS = 500
+REALTIME_PRUNE_EVERY = 100
+# Mobile sync (api/sync.py): rows per feed per request, how recent a write has to be
+# to wait for the next sync, and how long deletions are remembered
+SYNC_PAGE_SIZE = 200
+SYNC_SETTLE_SECONDS = 2
+SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', 30))
+# Chef schedules (api/schedule.py): orders a chef can cook at the same time, how often
+# each worker re-reads other workers' changes, and the default availability window
+CHEF_CONCURRENT_ORDERS = int(os.getenv('CHEF_CONCURRENT_ORDERS', 2))
+SCHEDULE_REFRESH_SECONDS = float(os.getenv('SCHEDULE_REFRESH_SECONDS', 5))
+SCHEDULE_HORIZON_DAYS = 7
+
+# Open orders are auto-cancelled this long after their preferred delivery
+# time by the `expire_orders` command, in batches of ORDER_EXPIRY_BATCH_SIZE
+ORDER_EXPIRY_GRACE_MINUTES = int(os.getenv('ORDER_EXPIRY_GRACE_MINUTES', 0))
+ORDER_EXPIRY_BATCH_SIZE = int(os.getenv('ORDER_EXPIRY_BATCH_SIZE', 500))
+
+# Hot/cold archival by the `archive_data` command (see api/archive.py)
+ARCHIVE_ORDERS_AFTER_DAYS = int(os.getenv('ARCHIVE_ORDERS_AFTER_DAYS', 180))
+ARCHIVE_CHATS_AFTER_DAYS = int(os.getenv('ARCHIVE_CHATS_AFTER_DAYS', 90))
+ARCHIVE_NOTIFICATIONS_AFTER_DAYS = int(os.getenv('ARCHIVE_NOTIFICATIONS_AFTER_DAYS', 30))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', 500))
+
+# Token-bucket limits (see api/throttling.py). rate is tokens per second;
+# on sockets, action picks what happens over the limit: drop the message,
+# delay it by up to max_delay seconds, or close the socket
+RATE_LIMITS = {
+    'chat_message': {'rate': 1.0, 'burst': 5, 'action': os.getenv('CHAT_RATE_LIMIT_ACTION', 'drop'), 'max_delay': 2.0},
+    'chat_history': {'rate': 2.0, 'burst': 10},
+    'socket_resume': {'rate': 0.2, 'burst': 5},
+    'place_bid': {'rate': 0.2, 'burst': 3},
+}
+
+# Messages per chat history page sent over the chat socket (see api/chat.py)
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv('CHAT_HISTORY_PAGE_SIZE', 30))
+
+# Caches (rate limit buckets, rendered responses, rankings) are per process
+# unless a shared Redis cache is configured, as multi-node deployments need.
+# Local memory evicts least recently used entries past CACHE_MAX_ENTRIES;
+# give Redis a maxmemory with maxmemory-policy allkeys-lru for the same.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))},
+    }
+}
+if os.getenv('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_CACHE_URL'),
+        }
+    }
+
+# Default TTL (seconds) of entries cached by api/caching.py; writes invalidate
+# them sooner through their tags
+CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 300))
+# Rendered responses are only cached with a shared (Redis) cache: the local
+# memory one never sees invalidations from expire_orders, archive_data or
+# other workers. Set CACHE_RESPONSES=true/false to force it on or off.
+CACHE_RESPONSES = {'true': True, 'false': False}.get(os.getenv('CACHE_RESPONSES', '').lower())
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -126,6 +227,34 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Per-endpoint request metrics, scraped from /metrics/
+# When set, scrapers must send "Authorization: Bearer <METRICS_TOKEN>";
+# unset, only staff sessions and scrapers on localhost may read it
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Logging
+# Debug messages from the api app are skipped entirely unless LOG_LEVEL=DEBUG
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            'format': 'time=%(asctime)s level=%(levelname)s logger=%(name)s msg="%(message)s"',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        'api': {'handlers': ['console'], 'level': os.getenv('LOG_LEVEL', 'INFO'), 'propagate': False},
+        'accounts': {'handlers': ['console'], 'level': os.getenv('LOG_LEVEL', 'INFO'), 'propagate': False},
+    },
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -143,6 +272,13 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (order photos, profile images and their generated variants)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Threads used to resize uploads off the request thread (see api/images.py)
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 2))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -151,11 +287,18 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 CORS_ALLOW_ALL_ORIGINS=True
 
 # Email configuration 
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# Use 'django.core.mail.backends.filebased.EmailBackend' to write mail to EMAIL_FILE_PATH instead
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 # EMAIL_USE_SSL = True
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
-DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
\ No newline at end of file
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+# Outbox worker (python manage.py send_emails)
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = 30  # seconds, doubled after each failed attempt
\ No newline at end of file